@@ -40,7 +40,7 @@ export const AuthProvider = ({ children }) => {
       localStorage.setItem('user', JSON.stringify(data.user));
       
       // Connect to WebSocket
-      socketService.connect(data.user.id);
+      socketService.connect(data.token);
       
       return { success: true };
     } catch (error) {
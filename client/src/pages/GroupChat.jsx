@@ -20,15 +20,16 @@ function GroupChat() {
     socketService.joinGroupRoom(user.id, groupId)
 
     // Listen for new group messages
-    socketService.onNewGroupMessage((message) => {
+    const handleNewGroupMessage = (message) => {
       console.log('📨 New group message:', message)
       setMessages(prev => [...prev, message])
-    })
+    }
+    socketService.onNewGroupMessage(handleNewGroupMessage)
 
     return () => {
       // Leave group room and stop listening when unmounting
       socketService.leaveGroupRoom(user.id, groupId)
-      socketService.offNewGroupMessage()
+      socketService.offNewGroupMessage(handleNewGroupMessage)
     }
   }, [groupId, user.id])
 
@@ -10,7 +10,10 @@ function Messages() {
   const [messages, setMessages] = useState([])
   const [users, setUsers] = useState([])
   const [selectedUser, setSelectedUser] = useState(null)
-  const [conversation, setConversation] = useState([])
+  // The pages loaded so far, oldest first, and the cursor for the page before them
+  const [history, setHistory] = useState({ messages: [], hasMore: false, nextCursor: null })
+  const conversation = history.messages
+  const [loadingOlder, setLoadingOlder] = useState(false)
   const [newMessage, setNewMessage] = useState('')
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
@@ -52,12 +55,13 @@ useEffect(() => {
 // Listen for real-time messages and connection status via WebSocket
 useEffect(() => {
   // Listen for new messages
-  socketService.onNewMessage((message) => {
+  const handleNewMessage = (message) => {
     console.log('📨 New message received:', message);
     if (selectedUser && (message.sender_id === selectedUser.id || message.recipient_id === selectedUser.id)) {
       selectUser(selectedUser);
     }
-  });
+  };
+  socketService.onNewMessage(handleNewMessage);
 
   // Listen for connection status changes
   if (socketService.socket) {
@@ -79,7 +83,7 @@ useEffect(() => {
   }
 
   return () => {
-    socketService.offNewMessage();
+    socketService.offNewMessage(handleNewMessage);
     // Clean up listeners
     if (socketService.socket) {
       socketService.socket.off('connect');
@@ -90,12 +94,12 @@ useEffect(() => {
   };
 }, [selectedUser]);
 // Auto-scroll to bottom only when new messages arrive
+const lastMessageId = conversation[conversation.length - 1]?.id
 useEffect(() => {
-  const lastMessage = conversation[conversation.length - 1]
-  if (lastMessage) {
+  if (lastMessageId) {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }
-}, [conversation.length]) // Only trigger when length changes, not content
+}, [lastMessageId]) // Not when older pages are prepended
 
   const fetchUsers = async () => {
     try {
@@ -118,11 +122,25 @@ useEffect(() => {
   }
 
   const selectUser = async (user) => {
+    // Refreshing the open conversation keeps any older pages already loaded
+    const refreshing = selectedUser?.id === user.id
     setSelectedUser(user)
-    setLoading(true)
+    if (!refreshing) {
+      setLoading(true)
+    }
     try {
       const data = await messageAPI.getConversation(user.id)
-      setConversation(data.messages)
+      const newest = { messages: data.messages, hasMore: data.has_more, nextCursor: data.next_cursor }
+      setHistory(prev => {
+        const overlap = refreshing && data.messages.length > 0
+          ? prev.messages.findIndex(m => m.id === data.messages[0].id)
+          : -1
+        // No overlap means more than a page arrived since: start again from the newest page
+        if (overlap === -1) {
+          return newest
+        }
+        return { ...prev, messages: [...prev.messages.slice(0, overlap), ...data.messages] }
+      })
       setError('')
     } catch (err) {
       setError('Failed to load conversation')
@@ -132,6 +150,27 @@ useEffect(() => {
     }
   }
 
+  const loadOlder = async () => {
+    if (!history.hasMore || loadingOlder) return
+    setLoadingOlder(true)
+    try {
+      const data = await messageAPI.getConversation(selectedUser.id, history.nextCursor)
+      setHistory(prev => {
+        const loaded = new Set(prev.messages.map(m => m.id))
+        return {
+          messages: [...data.messages.filter(m => !loaded.has(m.id)), ...prev.messages],
+          hasMore: data.has_more,
+          nextCursor: data.next_cursor
+        }
+      })
+    } catch (err) {
+      setError('Failed to load older messages')
+      console.error(err)
+    } finally {
+      setLoadingOlder(false)
+    }
+  }
+
 const sendMessage = async (e) => {
   e.preventDefault()
   if (!newMessage.trim() || !selectedUser) return
@@ -238,7 +277,27 @@ const sendMessage = async (e) => {
                 ) : conversation.length === 0 ? (
                   <p style={{ textAlign: 'center', color: '#666' }}>No messages yet. Start the conversation!</p>
                 ) : (
-                conversation.map(msg => (
+                <>
+                {history.hasMore && (
+                  <div style={{ textAlign: 'center', marginBottom: '15px' }}>
+                    <button
+                      onClick={loadOlder}
+                      disabled={loadingOlder}
+                      style={{
+                        padding: '6px 12px',
+                        backgroundColor: '#6c757d',
+                        color: 'white',
+                        border: 'none',
+                        borderRadius: '4px',
+                        cursor: loadingOlder ? 'default' : 'pointer',
+                        fontSize: '14px'
+                      }}
+                    >
+                      {loadingOlder ? 'Loading...' : 'Load older messages'}
+                    </button>
+                  </div>
+                )}
+                {conversation.map(msg => (
                 <div
                     key={msg.id}
                     style={{
@@ -270,6 +329,7 @@ const sendMessage = async (e) => {
                         if (window.confirm('Delete this message?')) {
                             try {
                             await messageAPI.delete(msg.id)
+                            setHistory(prev => ({ ...prev, messages: prev.messages.filter(m => m.id !== msg.id) }))
                             selectUser(selectedUser)
                             } catch (err) {
                             setError('Failed to delete message')
@@ -290,7 +350,8 @@ const sendMessage = async (e) => {
                     </button>
                     )}
                 </div>
-                ))
+                ))}
+                </>
                 )}
                 <div ref={messagesEndRef} />
               </div>
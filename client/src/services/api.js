@@ -169,8 +169,10 @@ export const messageAPI = {
     return handleResponse(response);
   },
 
-  getConversation: async (userId) => {
-    const response = await fetch(`${API_URL}/users/${userId}/messages`, {
+  // Newest page by default; pass a page's next_cursor as `before` for the one older than it
+  getConversation: async (userId, before) => {
+    const query = before ? `?before=${encodeURIComponent(before)}` : '';
+    const response = await fetch(`${API_URL}/users/${userId}/messages${query}`, {
       headers: getAuthHeaders(),
     });
     return handleResponse(response);
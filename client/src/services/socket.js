@@ -5,12 +5,37 @@ const SOCKET_URL = 'http://127.0.0.1:5000';
 class SocketService {
   constructor() {
     this.socket = null;
+    // Highest ids seen, sent on (re)join so the server only replays what we missed
+    this.lastMessageId = null;
+    this.lastGroupMessageId = null;
   }
 
-  connect(userId) {
+  joinPayload() {
+    // No user id: the server joins the rooms of the user the token belongs to
+    return {
+      ...(this.lastMessageId !== null && { last_message_id: this.lastMessageId }),
+      ...(this.lastGroupMessageId !== null && { last_group_message_id: this.lastGroupMessageId }),
+    };
+  }
+
+  trackMessageId(message) {
+    if (message?.id && message.id > (this.lastMessageId ?? 0)) {
+      this.lastMessageId = message.id;
+    }
+  }
+
+  trackGroupMessageId(message) {
+    if (message?.id && message.id > (this.lastGroupMessageId ?? 0)) {
+      this.lastGroupMessageId = message.id;
+    }
+  }
+
+  // The server authenticates the socket once, at connect, with the same JWT the REST API takes
+  connect(token) {
     if (this.socket?.connected) return;
 
     this.socket = io(SOCKET_URL, {
+      auth: { token },
       transports: ['websocket', 'polling'],
       reconnection: true,
       reconnectionAttempts: 5,
@@ -21,7 +46,7 @@ class SocketService {
 
     this.socket.on('connect', () => {
       console.log('✅ Connected to WebSocket server');
-      this.socket.emit('join', { user_id: userId });
+      this.socket.emit('join', this.joinPayload());
     });
 
     this.socket.on('disconnect', (reason) => {
@@ -33,7 +58,7 @@ class SocketService {
 
     this.socket.on('reconnect', (attemptNumber) => {
       console.log(`🔄 Reconnected after ${attemptNumber} attempts`);
-      this.socket.emit('join', { user_id: userId });
+      this.socket.emit('join', this.joinPayload());
     });
 
     this.socket.on('reconnect_attempt', (attemptNumber) => {
@@ -55,6 +80,23 @@ class SocketService {
     this.socket.on('connect_error', (error) => {
       console.error('Connection error:', error);
     });
+
+    this.socket.on('new_message', (message) => this.trackMessageId(message));
+    this.socket.on('new_group_message', (message) => this.trackGroupMessageId(message));
+
+    this.socket.on('catch_up_complete', (data) => {
+      console.log(`📥 Caught up on ${data.replayed} missed messages`);
+    });
+
+    this.socket.on('rate_limited', (data) => {
+      console.warn(`⏳ ${data.event} rate limited, retry in ${data.retry_after}s`);
+    });
+
+    // We fell behind and the server dropped messages: rejoin from the last ids we saw to replay them
+    this.socket.on('resync', (data) => {
+      console.log(`🔁 Resyncing after ${data.dropped} dropped messages`);
+      this.socket.emit('join', this.joinPayload());
+    });
   }
 
   disconnect() {
@@ -80,9 +122,9 @@ class SocketService {
     }
   }
 
-  offNewMessage() {
+  offNewMessage(callback) {
     if (this.socket) {
-      this.socket.off('new_message');
+      this.socket.off('new_message', callback);
     }
   }
 
@@ -122,9 +164,9 @@ class SocketService {
     }
   }
 
-  offNewGroupMessage() {
+  offNewGroupMessage(callback) {
     if (this.socket) {
-      this.socket.off('new_group_message');
+      this.socket.off('new_group_message', callback);
     }
   }
 }
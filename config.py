@@ -1,7 +0,0 @@
-import os
-
-class Config:
-    SECRET_KEY = 'dev-secret-key-change-later'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///app.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JWT_SECRET_KEY = 'jwt-secret-key-change-later'
\ No newline at end of file
@@ -1,160 +1,204 @@
-from flask import Flask
+"""
+Application factory: `create_app(config)` builds an app and its SocketIO server.
+
+Every app gets its own services (blocking pool, caches, indexes, write-behind
+queue, ...) in app.extensions, so several can live in one process. Nothing
+touches the database while an app is built: the schema comes from migrations
+(`flask --app app db upgrade`, which also brings a database made by the old
+create_all() at import up to date) and the in-memory indexes fill on first use.
+Background maintenance and the bcrypt workers are only started by the servers,
+`python serve.py` (production) and `python app.py` (debug), through
+start_background_tasks().
+"""
+import os
+from flask import Flask, current_app
 from flask_restful import Api, Resource
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from datetime import datetime
-from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
+from flask_socketio import SocketIO
 from models import db
 from config import Config
-from resources.auth import RegisterResource, LoginResource
-from resources.user import UserListResource, UserResource
-from resources.group import GroupListResource, GroupResource, GroupMembersResource
-from resources.message import MessageListResource, ConversationResource, MessageResource
-
-
-app = Flask(__name__)
-app.config.from_object(Config)
+from blocking import BlockingPool
+from delivery import DeliveryTracker
+from read_receipts import ReadReceiptCoalescer
+from unread import UnreadReconciler, reconcile_unread_counts
+from user_cache import UserCache, user_cache
+from directory import DirectoryIndex
+from memberships import MembershipIndex, group_memberships
+from message_bus import create_client_manager
+from auth_cache import CachingJWTManager
+from passwords import PasswordHasher, password_hasher
+from db_profile import init_pool_options, init_db_profile, init_thread_engine
+from serialization import output_json
+from archive import MessageArchiver, message_archiver, archive_messages
+from metrics import registry, timed_resource, instrument_engine, metrics_view
+from logs import init_logging
+from write_behind import MessageWriter
+from rate_limit import RateLimiter, message_rate_limiter
+from backpressure import OutboundLimiter, outbound_limiter, bounded
+from events import register_events
 
-CORS(app, resources={r"/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins="*")
-jwt = JWTManager(app)
-api = Api(app)
-
-db.init_app(app)
+migrate = Migrate(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
 
 # Test endpoint
 class HelloWorld(Resource):
     def get(self):
         return {'message': 'Hello World! MessageMe API is running!'}, 200
 
-api.add_resource(HelloWorld, '/')
-api.add_resource(RegisterResource, '/auth/register')
-api.add_resource(LoginResource, '/auth/login')
-api.add_resource(UserListResource, '/users')
-api.add_resource(UserResource, '/users/<int:user_id>')
-api.add_resource(GroupListResource, '/groups')
-api.add_resource(GroupResource, '/groups/<int:group_id>')
-api.add_resource(GroupMembersResource, '/groups/<int:group_id>/members')
-api.add_resource(MessageListResource, '/messages')
-api.add_resource(ConversationResource, '/users/<int:other_user_id>/messages')
-api.add_resource(MessageResource, '/messages/<int:message_id>')
-
-# WebSocket Events
-@socketio.on('connect')
-def handle_connect():
-    print('Client connected')
-    emit('connection_response', {'status': 'Connected to MessageMe!'})
-
-@socketio.on('disconnect')
-def handle_disconnect():
-    print('Client disconnected')
-
-@socketio.on('join')
-def handle_join(data):
-    user_id = data.get('user_id')
-    if user_id:
-        join_room(f'user_{user_id}')
-        print(f'User {user_id} joined their room')
-
-@socketio.on('send_message')
-def handle_send_message(data):
-    """Handle incoming message from client"""
-    try:
-        sender_id = data.get('sender_id')
-        recipient_id = data.get('recipient_id')
-        content = data.get('content')
-        
-        print(f'Message from user {sender_id} to user {recipient_id}: {content}')
-        
-        # Save message to database
-        from models import Message
-        new_message = Message(
-            sender_id=sender_id,
-            recipient_id=recipient_id,
-            content=content
-        )
-        db.session.add(new_message)
-        db.session.commit()
-        
-        # Prepare message data
-        message_data = {
-            'id': new_message.id,
-            'sender_id': new_message.sender_id,
-            'recipient_id': new_message.recipient_id,
-            'content': new_message.content,
-            'timestamp': new_message.timestamp.isoformat()
-        }
-        
-        # Send to recipient's room
-        emit('new_message', message_data, room=f'user_{recipient_id}')
-        
-        # Also send back to sender for confirmation
-        emit('message_sent', message_data)
-        
-        print(f'Message saved and sent!')
-        
-    except Exception as e:
-        print(f'Error sending message: {e}')
-        emit('message_error', {'error': str(e)})
-
-@socketio.on('join_group')
-def handle_join_group(data):
-    """User joins a group room"""
-    group_id = data.get('group_id')
-    user_id = data.get('user_id')
-    
-    if group_id:
-        join_room(f'group_{group_id}')
-        print(f'User {user_id} joined group room {group_id}')
-        emit('joined_group', {'group_id': group_id}, room=f'user_{user_id}')
-
-@socketio.on('leave_group')
-def handle_leave_group(data):
-    """User leaves a group room"""
-    group_id = data.get('group_id')
-    user_id = data.get('user_id')
-    
-    if group_id:
-        leave_room(f'group_{group_id}')
-        print(f'User {user_id} left group room {group_id}')
-
-@socketio.on('send_group_message')
-def handle_send_group_message(data):
-    """Handle incoming group message from client"""
-    try:
-        sender_id = data.get('sender_id')
-        group_id = data.get('group_id')
-        content = data.get('content')
-        
-        print(f'Group message from user {sender_id} to group {group_id}: {content}')
-        
-        # For now, we'll just broadcast the message
-        # (You could save to a GroupMessage table if you create one)
-        
-        # Get sender info
-        from models import User
-        sender = User.query.get(sender_id)
-        
-        # Prepare message data
-        message_data = {
-            'group_id': group_id,
-            'sender_id': sender_id,
-            'sender_username': sender.username if sender else 'Unknown',
-            'content': content,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        # Broadcast to everyone in the group room
-        emit('new_group_message', message_data, room=f'group_{group_id}')
-        
-        print(f'Group message broadcasted!')
-        
-    except Exception as e:
-        print(f'Error sending group message: {e}')
-        emit('message_error', {'error': str(e)})
-
-with app.app_context():
-    db.create_all()
+# Cache counters for monitoring
+class StatsResource(Resource):
+    def get(self):
+        return {
+            'user_cache': user_cache.stats(),
+            'password_hasher': password_hasher.stats(),
+            'group_memberships': group_memberships.stats(),
+            'rate_limiter': message_rate_limiter.stats(),
+            'outbound': outbound_limiter.stats()
+        }, 200
+
+def db_pools():
+    pools = [('primary', db.engine)]
+    if 'db_read_engine' in current_app.extensions:
+        pools.append(('read', current_app.extensions['db_read_engine']))
+    if 'db_thread_engine' in current_app.extensions:
+        pools.append(('thread', current_app.extensions['db_thread_engine']))
+    return pools
+
+# Gauges are read while /metrics is being served, so current_app is the scraped app
+registry.gauge('messageme_user_cache_entries', 'Profiles held in the user cache',
+               lambda: user_cache.stats()['size'])
+registry.gauge('messageme_password_hash_inflight', 'bcrypt jobs queued or running',
+               lambda: password_hasher.stats()['inflight'])
+registry.gauge('messageme_db_connections_checked_out', 'Connections in use, by pool',
+               lambda: [({'pool': name}, engine.pool.checkedout()) for name, engine in db_pools()])
+registry.gauge('messageme_group_memberships', 'Memberships held in the group membership index',
+               lambda: group_memberships.stats()['memberships'])
+registry.gauge('messageme_outbound_lagging_connections', 'Connections over OUTBOUND_QUEUE_LIMIT',
+               lambda: outbound_limiter.stats()['lagging'])
+
+def register_resources(api):
+    # Imported when an app is built, not when app.py is
+    from resources.auth import RegisterResource, LoginResource
+    from resources.user import UserListResource, UserResource
+    from resources.group import GroupListResource, GroupResource, GroupMembersResource, GroupMessagesResource, GroupReadResource
+    from resources.message import MessageListResource, ConversationResource, ConversationListResource, MessageSearchResource, ConversationReadResource, UnreadCountResource, MessageResource
+
+    api.add_resource(HelloWorld, '/')
+    api.add_resource(StatsResource, '/stats')
+    api.add_resource(RegisterResource, '/auth/register')
+    api.add_resource(LoginResource, '/auth/login')
+    api.add_resource(UserListResource, '/users')
+    api.add_resource(UserResource, '/users/<int:user_id>')
+    api.add_resource(GroupListResource, '/groups')
+    api.add_resource(GroupResource, '/groups/<int:group_id>')
+    api.add_resource(GroupMembersResource, '/groups/<int:group_id>/members')
+    api.add_resource(GroupMessagesResource, '/groups/<int:group_id>/messages')
+    api.add_resource(GroupReadResource, '/groups/<int:group_id>/read')
+    api.add_resource(MessageListResource, '/messages')
+    api.add_resource(ConversationResource, '/users/<int:other_user_id>/messages')
+    api.add_resource(MessageResource, '/messages/<int:message_id>')
+    api.add_resource(ConversationListResource, '/conversations')
+    api.add_resource(MessageSearchResource, '/messages/search')
+    api.add_resource(ConversationReadResource, '/users/<int:other_user_id>/messages/read')
+    api.add_resource(UnreadCountResource, '/unread')
+
+def init_indexes(app):
+    """The app's in-memory indexes, filled from its database on first use, off the event loop"""
+    from models import User, Group, user_groups
+    pool = app.extensions['blocking_pool']
+
+    def rows(*columns):
+        return lambda: pool.run_in_app_context(lambda: db.session.query(*columns).all())
+
+    indexes = [
+        ('user_directory', DirectoryIndex(app.config['DIRECTORY_TTL']), (User.id, User.username)),
+        ('group_directory', DirectoryIndex(app.config['DIRECTORY_TTL']), (Group.id, Group.name)),
+        ('group_memberships', MembershipIndex(app.config['MEMBERSHIP_TTL']), (user_groups.c.user_id, user_groups.c.group_id))
+    ]
+    for name, index, columns in indexes:
+        index.set_loader(rows(*columns))
+        app.extensions[name] = index
+
+def register_commands(app):
+    @app.cli.command('reconcile-unread')
+    def reconcile_unread_command():
+        """Recount unread messages and repair drifted counters"""
+        repaired = reconcile_unread_counts()
+        print(f'Repaired {repaired} unread counters')
+
+    @app.cli.command('archive-messages')
+    def archive_messages_command():
+        """Move messages past MESSAGE_RETENTION_DAYS into the archive tables now"""
+        moved = archive_messages(message_archiver.cutoff(), message_archiver.batch_size)
+        print(f'Archived {moved} messages')
+
+def create_app(config=None):
+    """
+    Build the app. Settings layer as: Config defaults, then MESSAGEME_*
+    environment variables, then `config` (an object or a dict), so tests can
+    point an instance at their own database.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.from_prefixed_env('MESSAGEME')
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+    init_logging(app)
+
+    CORS(app, resources={r"/*": {"origins": "*"}})
+    socketio = SocketIO(
+        app,
+        cors_allowed_origins="*",
+        async_mode=app.config['ASYNC_MODE'],
+        # Deliveries go through the outbound limiter (backpressure.py)
+        client_manager=create_client_manager(app.config['SOCKETIO_MESSAGE_QUEUE'], app.config['SOCKETIO_CHANNEL'],
+                                             extend=bounded)
+    )
+    register_events(socketio)
+    CachingJWTManager(app)
+    # Every resource gets latency and per-request SQL metrics
+    api = Api(app, decorators=[timed_resource])
+    # Fast JSON encoding (orjson when available) for every resource response
+    api.representation('application/json')(output_json)
+    register_resources(api)
+    # Prometheus scrape endpoint (plain text, so not a flask_restful resource)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    init_pool_options(app)
+    db.init_app(app)
+    migrate.init_app(app, db, render_as_batch=True)
+    init_db_profile(app, db)
+    init_thread_engine(app, db, socketio.async_mode)
+    with app.app_context():
+        instrument_engine(db.engine, 'primary')
+    if 'db_read_engine' in app.extensions:
+        instrument_engine(app.extensions['db_read_engine'], 'read')
+    if 'db_thread_engine' in app.extensions:
+        instrument_engine(app.extensions['db_thread_engine'], 'thread')
+    # Each registers itself in app.extensions; the module-level names resolve through current_app
+    BlockingPool(app, socketio)
+    PasswordHasher(app)
+    MessageWriter(app, socketio)
+    DeliveryTracker(app, socketio)
+    ReadReceiptCoalescer(app, socketio)
+    UnreadReconciler(app, socketio)
+    MessageArchiver(app, socketio)
+    UserCache(app)
+    RateLimiter(app)
+    OutboundLimiter(app, socketio)
+    init_indexes(app)
+    register_commands(app)
+    return app
+
+def start_background_tasks(app):
+    """Fork the bcrypt workers and start the periodic jobs; for processes that serve requests"""
+    app.extensions['password_hasher'].start()
+    app.extensions['unread_reconciler'].start()
+    app.extensions['message_archiver'].start()
 
 if __name__ == '__main__':
-    socketio.run(app, debug=True, port=5000)
\ No newline at end of file
+    app = create_app()
+    start_background_tasks(app)
+    app.extensions['socketio'].run(app, debug=True, port=5000)
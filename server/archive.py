@@ -0,0 +1,258 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import Column, Index, MetaData, Table, func, select
+from models import db, Message, ConversationSummary, ArchivePartition
+from pagination import keyset_page, decode_cursor
+from blocking import blocking_pool, os_lock
+from extensions import app_service
+from search import index_archive_partition
+
+logger = logging.getLogger(__name__)
+
+# Archive tables live outside db.metadata so create_all never touches them
+archive_metadata = MetaData()
+_metadata_lock = os_lock()
+
+
+def partition_name(timestamp):
+    return f'messages_archive_{timestamp.year:04d}{timestamp.month:02d}'
+
+
+def partition_table(name):
+    """Table object for an archive partition: same columns as messages, conversation index only"""
+    with _metadata_lock:
+        table = archive_metadata.tables.get(name)
+        if table is None:
+            table = Table(
+                name, archive_metadata,
+                *[Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False)
+                  for c in Message.__table__.columns],
+                Index(f'ix_{name}_conversation', 'sender_id', 'recipient_id', 'timestamp')
+            )
+        return table
+
+
+def _month_bounds(timestamp):
+    start = datetime(timestamp.year, timestamp.month, 1)
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def _get_partition(timestamp):
+    """Catalog row for the month containing timestamp, creating its table if needed"""
+    name = partition_name(timestamp)
+    partition = ArchivePartition.query.get(name)
+    if partition is None:
+        partition_table(name).create(bind=db.session.connection(), checkfirst=True)
+        index_archive_partition(name)
+        period_start, period_end = _month_bounds(timestamp)
+        partition = ArchivePartition(name=name, period_start=period_start, period_end=period_end, message_count=0)
+        db.session.add(partition)
+    return partition
+
+
+def archive_messages(cutoff, batch_size=1000):
+    """
+    Move read messages older than cutoff out of the hot table into monthly partitions.
+
+    Works oldest first in batches, each copied and deleted in one transaction,
+    so the write lock is only held briefly and readers (snapshot-isolated under
+    WAL) see every message exactly once. Messages a conversation summary points
+    at stay put so the inbox keeps its previews, and unread ones stay until
+    they're read, so marking as read and the unread counters only ever need
+    the hot table. Returns how many were moved.
+    """
+    pinned = select(ConversationSummary.last_message_id).where(
+        ConversationSummary.last_message_id.isnot(None)
+    )
+    hot = Message.__table__
+    moved = 0
+    while True:
+        rows = db.session.query(*hot.columns).filter(
+            hot.c.timestamp < cutoff,
+            hot.c.is_read == True,
+            hot.c.id.notin_(pinned)
+        ).order_by(hot.c.timestamp, hot.c.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(partition_name(row.timestamp), []).append(row)
+
+        try:
+            for name, batch in by_month.items():
+                partition = _get_partition(batch[0].timestamp)
+                db.session.execute(partition_table(name).insert(), [row._asdict() for row in batch])
+                partition.message_count += len(batch)
+                partition.archived_before = max(partition.archived_before or cutoff, cutoff)
+            # Search follows them: the partition's triggers index them in messages_archive_fts
+            # and the hot table's delete trigger drops them from messages_fts
+            db.session.execute(hot.delete().where(hot.c.id.in_([row.id for row in rows])))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(rows)
+    return moved
+
+
+def archive_tables(since=None):
+    """The archive partitions that may hold messages from `since` on, newest first"""
+    partitions = ArchivePartition.query
+    if since is not None:
+        partitions = partitions.filter(ArchivePartition.period_end > since)
+    return [partition_table(p.name) for p in partitions.order_by(ArchivePartition.period_start.desc())]
+
+
+def find_archived(message_id):
+    """(partition, row) for an archived message, or None; one primary-key lookup per partition"""
+    for partition in ArchivePartition.query.order_by(ArchivePartition.period_start.desc()):
+        table = partition_table(partition.name)
+        row = db.session.query(*table.columns).filter(table.c.id == message_id).first()
+        if row:
+            return partition, row
+    return None
+
+
+def delete_archived(partition, message_id):
+    """Delete one message from its partition. The caller commits"""
+    table = partition_table(partition.name)
+    db.session.execute(table.delete().where(table.c.id == message_id))
+    partition.message_count = ArchivePartition.message_count - 1
+
+
+def unarchive_latest(user_id, peer_id):
+    """
+    Move the newest archived message between two users back into the hot
+    table, for a summary whose last hot message is being deleted. Returns
+    its row, or None if they have no archived history. The caller commits.
+    """
+    for partition in ArchivePartition.query.order_by(ArchivePartition.period_start.desc()):
+        table = partition_table(partition.name)
+        candidates = [
+            db.session.query(*table.columns).filter(
+                table.c.sender_id == sender_id, table.c.recipient_id == recipient_id
+            ).order_by(table.c.timestamp.desc(), table.c.id.desc()).first()
+            for sender_id, recipient_id in [(user_id, peer_id), (peer_id, user_id)]
+        ]
+        candidates = [row for row in candidates if row]
+        if candidates:
+            row = max(candidates, key=lambda r: (r.timestamp, r.id))
+            delete_archived(partition, row.id)
+            db.session.execute(Message.__table__.insert().values(**row._asdict()))
+            return row
+    return None
+
+
+def archive_boundary():
+    """Everything archived is older than this; None if nothing has been archived"""
+    return db.session.query(func.max(ArchivePartition.archived_before)).scalar()
+
+
+def conversation_page(user_id, other_user_id, columns, before=None, after=None, limit=50):
+    """
+    keyset_page over a conversation, hot table first.
+
+    Archive partitions are only read when the page reaches past the archive
+    boundary, newest month first (oldest first when paging forward), stopping
+    as soon as older partitions can no longer affect the page. `columns` are
+    message column names; returns (rows_ascending, has_more) like keyset_page.
+    """
+    position = decode_cursor(after or before) if (after or before) else None
+
+    def branches(table):
+        selected = [table.c[name] for name in columns]
+        return [
+            db.session.query(*selected).filter(table.c.sender_id == user_id, table.c.recipient_id == other_user_id),
+            db.session.query(*selected).filter(table.c.sender_id == other_user_id, table.c.recipient_id == user_id)
+        ]
+
+    hot = Message.__table__
+    rows, has_more = keyset_page(branches(hot), hot.c.timestamp, hot.c.id, before=before, after=after, limit=limit)
+
+    boundary = archive_boundary()
+    if boundary is None:
+        return rows, has_more
+    if after and position[0] >= boundary:
+        return rows, has_more
+    if not after and has_more and rows[0].timestamp >= boundary:
+        return rows, has_more
+
+    partitions = ArchivePartition.query
+    if after:
+        partitions = partitions.filter(ArchivePartition.period_end > position[0])
+        partitions = partitions.order_by(ArchivePartition.period_start.asc())
+    else:
+        if position:
+            partitions = partitions.filter(ArchivePartition.period_start <= position[0])
+        partitions = partitions.order_by(ArchivePartition.period_start.desc())
+
+    rows = list(rows)
+    for partition in partitions.all():
+        table = partition_table(partition.name)
+        part_rows, part_more = keyset_page(
+            branches(table), table.c.timestamp, table.c.id,
+            before=before, after=after, limit=limit
+        )
+        rows.extend(part_rows)
+        has_more = has_more or part_more
+
+        # Once more than a page lies on this side of the partition edge, nothing further out matters
+        if after:
+            covered = sum(1 for r in rows if r.timestamp < partition.period_end)
+        else:
+            covered = sum(1 for r in rows if r.timestamp >= partition.period_start)
+        if covered > limit:
+            break
+
+    rows.sort(key=lambda r: (r.timestamp, r.id))
+    if len(rows) > limit:
+        has_more = True
+        rows = rows[:limit] if after else rows[-limit:]
+    return rows, has_more
+
+
+class MessageArchiver:
+    """Runs archive_messages in the background every ARCHIVE_INTERVAL seconds"""
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.retention_days = 0
+        self.interval = 3600
+        self.batch_size = 1000
+        self._started = False
+        if app is not None and socketio is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.extensions['message_archiver'] = self
+        self.retention_days = app.config.get('MESSAGE_RETENTION_DAYS', self.retention_days)
+        self.interval = app.config.get('ARCHIVE_INTERVAL', self.interval)
+        self.batch_size = app.config.get('ARCHIVE_BATCH_SIZE', self.batch_size)
+
+    def cutoff(self):
+        return datetime.utcnow() - timedelta(days=self.retention_days)
+
+    def start(self):
+        if self._started or not self.retention_days or not self.interval:
+            return
+        self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self.socketio.sleep(self.interval)
+                try:
+                    moved = blocking_pool.run_in_app_context(archive_messages, self.cutoff(), self.batch_size)
+                    if moved:
+                        logger.info('Archived %d messages older than %d days', moved, self.retention_days)
+                except Exception as e:
+                    logger.error('Error archiving messages: %s', e)
+
+
+message_archiver = app_service('message_archiver')
@@ -0,0 +1,112 @@
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from flask_jwt_extended import JWTManager
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+from user_cache import user_cache
+from blocking import os_lock
+from extensions import app_service
+
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that remembers tokens it has already verified.
+
+    Decoding a token parses it three times and checks its signature; a client
+    sends the same token on every request, so verified claims are kept in a
+    small LRU for up to JWT_CACHE_TTL seconds (never past the token's own exp).
+    The current user is resolved through the user profile cache, and deleted
+    users are revoked via revoke_identity() so their cached tokens stop working.
+    Sockets authenticate once, at connect, through verify().
+    """
+
+    def __init__(self, app=None):
+        self.max_size = 10000
+        self.ttl = 60
+        self.revocation_ttl = 900
+        self._tokens = OrderedDict()   # encoded token -> (expires_at, claims)
+        self._revoked = {}             # identity -> revoked until
+        self._lock = os_lock()
+        super().__init__(app)
+
+    def init_app(self, app, add_context_processor=False):
+        super().init_app(app, add_context_processor)
+        self.max_size = app.config.get('JWT_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('JWT_CACHE_TTL', self.ttl)
+        # Revocations only need to outlive the longest-lived access token
+        expires = app.config.get('JWT_ACCESS_TOKEN_EXPIRES', timedelta(minutes=15))
+        if isinstance(expires, timedelta):
+            self.revocation_ttl = expires.total_seconds()
+
+        self.user_lookup_loader(self._lookup_user)
+        self.token_in_blocklist_loader(self._is_revoked)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        cacheable = csrf_value is None and not allow_expired
+        now = time.time()
+
+        if cacheable:
+            with self._lock:
+                entry = self._tokens.get(encoded_token)
+                if entry and entry[0] > now:
+                    self._tokens.move_to_end(encoded_token)
+                    return entry[1]
+
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+
+        if cacheable:
+            expires_at = min(now + self.ttl, claims.get('exp', now + self.ttl))
+            with self._lock:
+                self._tokens[encoded_token] = (expires_at, claims)
+                self._tokens.move_to_end(encoded_token)
+                while len(self._tokens) > self.max_size:
+                    self._tokens.popitem(last=False)
+        return claims
+
+    def verify(self, encoded_token):
+        """
+        The identity of a valid access token, or None: the same checks a
+        @jwt_required resource makes (signature, expiry, revocation, user
+        still exists), for tokens that don't arrive in a header.
+        """
+        if not isinstance(encoded_token, str) or not encoded_token:
+            return None
+        try:
+            claims = self._decode_jwt_from_config(encoded_token)
+        except (JWTExtendedException, PyJWTError):
+            return None
+        if claims.get('type') != 'access' or self._is_revoked(None, claims):
+            return None
+        if self._lookup_user(None, claims) is None:
+            return None
+        return claims.get('sub')
+
+    def revoke_identity(self, identity):
+        """Reject every token for this identity from now on (e.g. the user was deleted)"""
+        with self._lock:
+            self._revoked[identity] = time.time() + self.revocation_ttl
+            for token, (_, claims) in list(self._tokens.items()):
+                if claims.get('sub') == identity:
+                    del self._tokens[token]
+        user_cache.invalidate(identity)
+
+    def _is_revoked(self, jwt_header, jwt_data):
+        identity = jwt_data.get('sub')
+        with self._lock:
+            revoked_until = self._revoked.get(identity)
+            if revoked_until is None:
+                return False
+            if revoked_until > time.time():
+                return True
+            del self._revoked[identity]
+            return False
+
+    def _lookup_user(self, jwt_header, jwt_data):
+        # Request-scoped: flask_jwt_extended stores the result for get_current_user().
+        # Returning None (no such user) makes the request fail with 401.
+        return user_cache.get(jwt_data.get('sub'))
+
+
+# JWTManager.init_app registers itself under this key
+jwt_manager = app_service('flask-jwt-extended')
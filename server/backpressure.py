@@ -0,0 +1,189 @@
+import time
+import socketio
+from metrics import socket_throttled, room_fanout
+from blocking import os_lock
+from extensions import app_service
+
+# Read-state events: while a connection is backed up only the newest per key is kept
+COALESCE = {'messages_read': 'reader_id', 'conversation_read': 'user_id'}
+# Message events: dropped while backed up; the client replays them after `resync`
+DROP = {'new_message', 'new_group_message'}
+
+
+class BoundedManager(socketio.Manager):
+    """
+    Client manager that checks with the app's OutboundLimiter before delivering.
+
+    Manager.emit is where every emit, to a sid, a room or everyone, becomes
+    one send per local recipient (message-queue managers call it with what
+    they receive), so it's the one place a lagging connection can be skipped.
+    Only droppable and coalescable events are checked; everything else, and
+    anything with a callback, goes straight through. For the same reason the
+    fan-out histogram is recorded here: on every worker that delivers, not
+    just the one that emitted.
+    """
+    limiter = None
+
+    def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        skip = list(skip_sid) if isinstance(skip_sid, list) else [skip_sid]
+        if self.limiter is None or callback or (event not in DROP and event not in COALESCE):
+            # Every connected sid is also in the None room, so this covers broadcasts too
+            sids = self.rooms.get(namespace, {}).get(to or room, {})
+            self._observe_fanout(event, len(sids) - sum(1 for sid in skip if sid in sids))
+            return super().emit(event, data, namespace, room=room, skip_sid=skip_sid,
+                                callback=callback, to=to, **kwargs)
+
+        reached = 0
+        for sid, eio_sid in self.get_participants(namespace, to or room):
+            if sid in skip:
+                continue
+            if self.limiter.hold(sid, eio_sid, event, data, namespace):
+                skip.append(sid)
+            else:
+                reached += 1
+        self._observe_fanout(event, reached)
+        return super().emit(event, data, namespace, room=room, skip_sid=skip, to=to, **kwargs)
+
+    @staticmethod
+    def _observe_fanout(event, reached):
+        # With a message queue every worker sees every emit; only those with recipients count
+        if reached:
+            room_fanout.observe(reached, event=event)
+
+
+def bounded(manager_class):
+    """manager_class with BoundedManager's emit; the `extend` hook of create_client_manager"""
+    if issubclass(manager_class, BoundedManager):
+        return manager_class
+    if manager_class is socketio.Manager:
+        return BoundedManager
+    # Message-queue managers deliver through super().emit, which now lands in BoundedManager
+    return type(f'Bounded{manager_class.__name__}', (manager_class, BoundedManager), {})
+
+
+class OutboundLimiter:
+    """
+    Bounded outbound queue per connection.
+
+    Every packet for a socket waits in its Engine.IO queue until the client
+    reads it, so a slow consumer in a busy room makes that queue, and our
+    memory, grow without limit. Once `queue_limit` packets are waiting the
+    connection counts as lagging: message events are dropped, read-state
+    events are coalesced, and acks/errors still go out. When the queue is
+    back under half the limit, held read-state is sent and, if anything was
+    dropped, one `resync` event with the count; the client re-sends `join`
+    with its last ids and gets the gap through the usual replay.
+
+    Works through the server's BoundedManager (create_app builds the client
+    manager with bounded()). The fast path is one qsize() per recipient of a
+    droppable or coalescable event.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.queue_limit = 0
+        self.flush_interval = 0.25
+        self._held = {}   # sid -> {'eio_sid', 'namespace', 'events': {(event, key): data}, 'dropped': count}
+        self._lock = os_lock()
+        self._worker_started = False
+        if app is not None and socketio is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.extensions['outbound_limiter'] = self
+        self.queue_limit = app.config.get('OUTBOUND_QUEUE_LIMIT', self.queue_limit)
+        self.flush_interval = app.config.get('OUTBOUND_FLUSH_INTERVAL_MS', 250) / 1000.0
+        if not self.queue_limit:
+            return
+
+        manager = socketio.server.manager
+        if not isinstance(manager, BoundedManager):
+            raise RuntimeError('OUTBOUND_QUEUE_LIMIT needs a client manager built with backpressure.bounded')
+        manager.limiter = self
+
+    def hold(self, sid, eio_sid, event, data, namespace='/'):
+        """For BoundedManager: True if event is held back from sid (dropped or coalesced) because it's lagging"""
+        if sid not in self._held:
+            socket = self.socketio.server.eio.sockets.get(eio_sid)
+            if socket is None or socket.queue.qsize() < self.queue_limit:
+                return False
+
+        replaced = False
+        with self._lock:
+            # Once lagging, hold everything droppable until the resync, so the client's
+            # last-seen ids never skip past a message it didn't get
+            held = self._held.setdefault(sid, {'eio_sid': eio_sid, 'namespace': namespace, 'events': {}, 'dropped': 0})
+            if event in DROP:
+                held['dropped'] += 1
+            else:
+                key = (event, data.get(COALESCE[event]) if isinstance(data, dict) else None)
+                replaced = key in held['events']
+                held['events'][key] = data
+            start = not self._worker_started
+            self._worker_started = True
+
+        if event in DROP:
+            socket_throttled.inc(event=event, reason='dropped')
+        elif replaced:
+            socket_throttled.inc(event=event, reason='coalesced')
+        if start:
+            self.socketio.start_background_task(self._run)
+        return True
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                self.socketio.server.logger.error('Error flushing held events: %s', e)
+
+    def flush(self):
+        """Release connections that have drained below the low-water mark"""
+        eio = self.socketio.server.eio
+        ready = []
+        with self._lock:
+            for sid in list(self._held):
+                socket = eio.sockets.get(self._held[sid]['eio_sid'])
+                if socket is None:
+                    del self._held[sid]
+                elif socket.queue.qsize() <= self.queue_limit // 2:
+                    ready.append((sid, self._held.pop(sid)))
+
+        # Straight to the local socket, not relayed through the message queue
+        for sid, held in ready:
+            if held['dropped']:
+                self.socketio.emit('resync', {'dropped': held['dropped']}, to=sid,
+                                   namespace=held['namespace'], ignore_queue=True)
+            for (event, _), data in held['events'].items():
+                self.socketio.emit(event, data, to=sid, namespace=held['namespace'], ignore_queue=True)
+
+    def wait_for_room(self, sid, timeout=5):
+        """Yield until sid's queue is under the low-water mark (or timeout), for bulk senders like replay"""
+        if not self.queue_limit:
+            self.socketio.sleep(0)
+            return
+        eio = self.socketio.server.eio
+        eio_sid = self.socketio.server.manager.eio_sid_from_sid(sid, '/')
+        deadline = time.monotonic() + timeout
+        while True:
+            socket = eio.sockets.get(eio_sid)
+            if socket is None or time.monotonic() > deadline:
+                return
+            if sid not in self._held and socket.queue.qsize() <= self.queue_limit // 2:
+                self.socketio.sleep(0)
+                return
+            self.socketio.sleep(self.flush_interval)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lagging': len(self._held),
+                'held_packets': sum(len(held['events']) for held in self._held.values())
+            }
+
+
+outbound_limiter = app_service('outbound_limiter')
@@ -0,0 +1,346 @@
+"""
+Load test for the REST and Socket.IO hot paths.
+
+Seeds a throwaway SQLite database with Faker data, then drives the real app
+through the Flask and Socket.IO test clients: conversation history, the
+message list and user directory over REST, and send_message /
+send_group_message over the socket. Prints JSON with throughput, p50/p99
+latency and peak RSS per scenario. Pass --baseline with an earlier result to
+get the change against it; --fail-over PCT exits non-zero on a regression.
+
+    cd server && python -m benchmarks.load --users 500 --messages 20000 --out run.json
+    cd server && python -m benchmarks.load --baseline run.json --fail-over 15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--group-size', type=int, default=25)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--group-messages', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=300, help='timed calls per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--listeners', type=int, default=5, help='extra sockets in the rooms being sent to')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--out', help='also write the JSON result here')
+    parser.add_argument('--baseline', help='earlier JSON result to compare against')
+    parser.add_argument('--fail-over', type=float,
+                        help='exit 1 if any p99 rises or throughput falls by more than this percent vs the baseline')
+    return parser.parse_args()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, elapsed, extra=None):
+    latencies = sorted(latencies)
+    result = {
+        'count': len(latencies),
+        'throughput_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3)
+    }
+    result.update(extra or {})
+    return result
+
+
+def peak_rss_mib():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def seed(app, args):
+    """Fill the database; returns the ids the scenarios need"""
+    from faker import Faker
+    from models import db, User, Group, Message, GroupMessage, user_groups
+    from conversations import record_messages
+
+    fake = Faker()
+    Faker.seed(args.seed)
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+
+    with app.app_context():
+        users = [User(
+            username=fake.unique.user_name(),
+            email=fake.unique.email(),
+            # Never checked here; seeding shouldn't pay for bcrypt
+            password_hash='$2b$04$' + 'x' * 53
+        ) for _ in range(args.users)]
+        db.session.add_all(users)
+        groups = [Group(name=fake.unique.catch_phrase(), description=fake.sentence()) for _ in range(args.groups)]
+        db.session.add_all(groups)
+        db.session.flush()
+        user_ids = [u.id for u in users]
+        group_ids = [g.id for g in groups]
+
+        # Skewed like real traffic: a third of all messages belong to one busy conversation
+        hot_pair = (user_ids[0], user_ids[1])
+
+        members = {}
+        for group_id in group_ids:
+            members[group_id] = rng.sample(user_ids, min(args.group_size, len(user_ids)))
+        # The socket scenarios send to the first group as hot_pair[0] and listen as hot_pair[1],
+        # so both have to be members
+        first = members[group_ids[0]]
+        members[group_ids[0]] = list(hot_pair) + [u for u in first if u not in hot_pair][:len(first) - 2]
+        for group_id in group_ids:
+            db.session.execute(user_groups.insert(), [
+                {'user_id': user_id, 'group_id': group_id, 'last_read_message_id': 0}
+                for user_id in members[group_id]
+            ])
+
+        start = now - timedelta(days=30)
+        step = timedelta(days=30) / max(args.messages, 1)
+        for offset in range(0, args.messages, 1000):
+            batch = []
+            for i in range(offset, min(offset + 1000, args.messages)):
+                sender, recipient = hot_pair if i % 3 == 0 else rng.sample(user_ids, 2)
+                if i % 2:
+                    sender, recipient = recipient, sender
+                batch.append(Message(sender_id=sender, recipient_id=recipient,
+                                     content=fake.sentence(nb_words=12), timestamp=start + step * i))
+            db.session.add_all(batch)
+            db.session.flush()
+            record_messages(batch)
+
+        db.session.add_all([GroupMessage(
+            group_id=group_id,
+            sender_id=rng.choice(members[group_id]),
+            content=fake.sentence(nb_words=12),
+            timestamp=start + step * i
+        ) for i, group_id in ((i, rng.choice(group_ids)) for i in range(args.group_messages))])
+        db.session.commit()
+
+        group_id = group_ids[0]
+        return {
+            'user_id': hot_pair[0],
+            'peer_id': hot_pair[1],
+            'group_id': group_id,
+            'group_members': members[group_id],
+            'search_terms': [u.username[:3] for u in rng.sample(users, min(20, len(users)))]
+        }
+
+
+def time_calls(fn, count, warmup):
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - started
+
+
+def rest_scenarios(app, ids, args):
+    from flask_jwt_extended import create_access_token
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity=ids["user_id"])}'}
+
+    def get(url):
+        def call(i):
+            response = client.get(url(i) if callable(url) else url, headers=headers)
+            assert response.status_code == 200, (response.status_code, response.data[:200])
+        return call
+
+    terms = ids['search_terms']
+    scenarios = {
+        'rest.conversation_history': get(f'/users/{ids["peer_id"]}/messages'),
+        'rest.message_list': get('/messages?days=7'),
+        'rest.user_list': get('/users'),
+        'rest.user_search': get(lambda i: f'/users?search={terms[i % len(terms)]}'),
+        'rest.user_search_index': get(lambda i: f'/users?mode=index&search={terms[i % len(terms)]}')
+    }
+
+    results = {}
+    for name, call in scenarios.items():
+        latencies, elapsed = time_calls(call, args.requests, args.warmup)
+        results[name] = summarize(latencies, elapsed)
+    return results
+
+
+def socket_scenarios(app, socketio, ids, args):
+    from flask_jwt_extended import create_access_token
+
+    results = {}
+    user_id, peer_id, group_id = ids['user_id'], ids['peer_id'], ids['group_id']
+
+    def connect(as_user):
+        # Sockets authenticate at connect with the same access token the REST API takes
+        with app.app_context():
+            token = create_access_token(identity=as_user)
+        return socketio.test_client(app, auth={'token': token})
+
+    sender = connect(user_id)
+    sender.emit('join', {})
+    listeners = []
+    for i in range(args.listeners):
+        member = ids['group_members'][i % len(ids['group_members'])]
+        listener = connect(peer_id if i == 0 else member)
+        listener.emit('join', {})
+        listeners.append(listener)
+    sender.emit('join_group', {'group_id': group_id})
+    for client in [sender] + listeners:
+        client.get_received()
+
+    # send_message is write-behind: the handler only queues, so time the handler and,
+    # separately, how long until every message_sent ack (post-commit) has arrived
+    def send_message(i):
+        sender.emit('send_message', {'sender_id': user_id, 'recipient_id': peer_id, 'content': f'bench {i}'})
+
+    total = args.requests + args.warmup
+    started = time.perf_counter()
+    latencies, handler_elapsed = time_calls(send_message, args.requests, args.warmup)
+    acked = 0
+    deadline = time.time() + 30
+    while acked < total and time.time() < deadline:
+        acked += sum(1 for packet in sender.get_received() if packet['name'] == 'message_sent')
+        if acked < total:
+            time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    results['socket.send_message'] = summarize(latencies, handler_elapsed, {
+        'acked': acked,
+        'acked_per_s': round(acked / elapsed, 1)
+    })
+
+    for client in listeners:
+        client.get_received()
+
+    # send_group_message commits inside the handler, so handler time is end-to-end
+    def send_group_message(i):
+        sender.emit('send_group_message', {'sender_id': user_id, 'group_id': group_id, 'content': f'bench {i}'})
+
+    latencies, elapsed = time_calls(send_group_message, args.requests, args.warmup)
+    delivered = sum(
+        1 for packet in listeners[0].get_received() if packet['name'] == 'new_group_message'
+    ) if listeners else 0
+    results['socket.send_group_message'] = summarize(latencies, elapsed, {
+        'fanout_sockets': len(listeners) + 1,
+        'delivered_to_first_listener': delivered
+    })
+
+    for client in [sender] + listeners:
+        client.disconnect()
+    return results
+
+
+def compare(results, baseline, fail_over):
+    """Annotate each scenario with its change vs the baseline; returns the regressions"""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        change = {}
+        for key, worse_when in (('throughput_per_s', 'lower'), ('p50_ms', 'higher'), ('p99_ms', 'higher')):
+            if before.get(key) and current.get(key) is not None:
+                pct = round((current[key] - before[key]) / before[key] * 100, 1)
+                change[f'{key}_change_pct'] = pct
+                # Without --fail-over the changes are only reported
+                if fail_over is None or key == 'p50_ms':
+                    continue
+                regressed = pct < -fail_over if worse_when == 'lower' else pct > fail_over
+                if regressed:
+                    regressions.append(f'{name} {key} {pct:+}%')
+        current['vs_baseline'] = change
+    return regressions
+
+
+def main():
+    args = parse_args()
+
+    # Temp DB, threading mode for the test clients, no external message queue, no
+    # background archiving, and no per-user rate limits (every scenario sends as one user)
+    tmp = tempfile.TemporaryDirectory()
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmp.name, "bench.db")}',
+        'ASYNC_MODE': os.environ.get('MESSAGEME_ASYNC_MODE', 'threading'),
+        'SOCKETIO_MESSAGE_QUEUE': None,
+        'MESSAGE_RETENTION_DAYS': 0,
+        'MESSAGE_RATE_PER_SECOND': 0,
+        'GROUP_MESSAGE_RATE_PER_SECOND': 0
+    }
+
+    # Keep anything printed along the way out of the JSON on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        from app import create_app
+        app = create_app(settings)
+        socketio = app.extensions['socketio']
+        startup = time.perf_counter() - started
+
+        from flask_migrate import upgrade
+        with app.app_context():
+            upgrade()
+
+        started = time.perf_counter()
+        ids = seed(app, args)
+        seeding = time.perf_counter() - started
+
+        results = {}
+        results.update(rest_scenarios(app, ids, args))
+        results.update(socket_scenarios(app, socketio, ids, args))
+
+    output = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'async_mode': socketio.async_mode,
+            'params': {key: value for key, value in vars(args).items()
+                       if key not in ('out', 'baseline', 'fail_over')},
+            'startup_s': round(startup, 3),
+            'seed_s': round(seeding, 3)
+        },
+        'results': results,
+        'peak_rss_mib': peak_rss_mib()
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.fail_over)
+        if baseline.get('peak_rss_mib'):
+            output['peak_rss_change_pct'] = round(
+                (output['peak_rss_mib'] - baseline['peak_rss_mib']) / baseline['peak_rss_mib'] * 100, 1
+            )
+        output['regressions'] = regressions
+
+    text = json.dumps(output, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    tmp.cleanup()
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Full ORM hydration vs column projection for the list endpoints.
+
+Fills a throwaway SQLite database and times the query + row-to-dict step of
+GET /messages and GET /users both ways: the old ORM query (entities, with
+joinedload for usernames) and the column-tuple query the resources use now.
+Prints JSON with the best time and peak Python heap for each.
+
+    cd server && python -m benchmarks.projection --rows 10000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy.orm import aliased, joinedload
+from config import Config
+from models import db, User, Message
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+
+def populate(rows):
+    """Two users exchanging `rows` messages, plus `rows` other users for the directory"""
+    users = [User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x' * 60)
+             for i in range(rows + 2)]
+    db.session.add_all(users)
+    db.session.flush()
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    db.session.add_all([
+        Message(
+            sender_id=users[i % 2].id,
+            recipient_id=users[(i + 1) % 2].id,
+            content=f'message number {i} ' * 4,
+            timestamp=start + timedelta(seconds=i)
+        ) for i in range(rows)
+    ])
+    db.session.commit()
+    return users[0].id
+
+
+def messages_orm(user_id):
+    messages = Message.query.options(
+        joinedload(Message.sender),
+        joinedload(Message.recipient)
+    ).filter(
+        (Message.sender_id == user_id) | (Message.recipient_id == user_id)
+    ).order_by(Message.timestamp.desc()).all()
+    return [{
+        'id': m.id,
+        'sender_id': m.sender_id,
+        'sender_username': m.sender.username,
+        'recipient_id': m.recipient_id,
+        'recipient_username': m.recipient.username,
+        'content': m.content,
+        'timestamp': m.timestamp.isoformat(),
+        'is_read': m.is_read,
+        'is_mine': m.sender_id == user_id
+    } for m in messages]
+
+
+def messages_columns(user_id):
+    sender = aliased(User)
+    recipient = aliased(User)
+    messages = db.session.query(
+        Message.id,
+        Message.sender_id,
+        sender.username.label('sender_username'),
+        Message.recipient_id,
+        recipient.username.label('recipient_username'),
+        Message.content,
+        Message.timestamp,
+        Message.is_read
+    ).outerjoin(
+        sender, sender.id == Message.sender_id
+    ).outerjoin(
+        recipient, recipient.id == Message.recipient_id
+    ).filter(
+        (Message.sender_id == user_id) | (Message.recipient_id == user_id)
+    ).order_by(Message.timestamp.desc()).all()
+    return [{
+        'id': m.id,
+        'sender_id': m.sender_id,
+        'sender_username': m.sender_username,
+        'recipient_id': m.recipient_id,
+        'recipient_username': m.recipient_username,
+        'content': m.content,
+        'timestamp': m.timestamp,
+        'is_read': m.is_read,
+        'is_mine': m.sender_id == user_id
+    } for m in messages]
+
+
+def users_orm(user_id):
+    return [{'id': u.id, 'username': u.username, 'email': u.email} for u in User.query.all()]
+
+
+def users_columns(user_id):
+    return [row._asdict() for row in db.session.query(User.id, User.username, User.email)]
+
+
+def measure(fn, user_id, repeat):
+    """Best wall time over `repeat` runs, then peak heap for one traced run"""
+    best = None
+    for _ in range(repeat):
+        db.session.remove()
+        started = time.perf_counter()
+        count = len(fn(user_id))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    db.session.remove()
+    tracemalloc.start()
+    fn(user_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+
+    return {
+        'rows': count,
+        'best_ms': round(best * 1000, 2),
+        'per_10k_rows_ms': round(best * 1000 * 10000 / max(count, 1), 2),
+        'peak_heap_kib': round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            user_id = populate(args.rows)
+
+            results = {}
+            for name, before, after in [
+                ('GET /messages', messages_orm, messages_columns),
+                ('GET /users', users_orm, users_columns)
+            ]:
+                orm = measure(before, user_id, args.repeat)
+                columns = measure(after, user_id, args.repeat)
+                results[name] = {
+                    'orm': orm,
+                    'columns': columns,
+                    'speedup': round(orm['best_ms'] / max(columns['best_ms'], 0.001), 2),
+                    'heap_ratio': round(orm['peak_heap_kib'] / max(columns['peak_heap_kib'], 0.1), 2)
+                }
+            db.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Worker cold start: time from a fresh interpreter to an app that can serve.
+
+Seeds a throwaway SQLite database (users, groups, memberships), then starts
+--runs fresh Python processes that each import app, call create_app() and
+serve a first request, timing every step. Prints JSON with the median and
+worst of each, since a rolling restart waits on its slowest worker.
+
+    cd server && python -m benchmarks.startup --users 50000 --groups 2000 --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app()
+built = time.perf_counter()
+response = app.test_client().get('/')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'create_app_s': built - imported,
+    'first_request_s': served - built,
+    'total_s': served - started
+}))
+'''
+
+
+def seed(uri, args):
+    """Migrate a fresh database and fill it with plain rows"""
+    from flask_migrate import upgrade
+    from app import create_app
+    from models import db, User, Group, user_groups
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'MESSAGE_RETENTION_DAYS': 0})
+    with app.app_context():
+        upgrade()
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x' * 60,
+             'unread_count': 0, 'version': 1}
+            for i in range(args.users)
+        ])
+        db.session.execute(Group.__table__.insert(), [
+            {'name': f'group {i}', 'description': '', 'version': 1} for i in range(args.groups)
+        ])
+        db.session.execute(user_groups.insert(), [
+            {'user_id': (g * args.group_size + m) % args.users + 1, 'group_id': g + 1, 'last_read_message_id': 0}
+            for g in range(args.groups) for m in range(min(args.group_size, args.users))
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--group-size', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = f'sqlite:///{os.path.join(tmp, "startup.db")}'
+        seed(uri, args)
+
+        env = dict(os.environ, MESSAGEME_SQLALCHEMY_DATABASE_URI=uri, MESSAGEME_MESSAGE_RETENTION_DAYS='0',
+                   MESSAGEME_LOG_LEVEL='WARNING')
+        env.setdefault('MESSAGEME_ASYNC_MODE', 'threading')
+        env.pop('MESSAGEME_SOCKETIO_MESSAGE_QUEUE', None)
+        runs = []
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, '-c', CHILD], env=env, capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        'params': vars(args),
+        'results': {
+            key: {
+                'median_ms': round(statistics.median(run[key] for run in runs) * 1000, 1),
+                'max_ms': round(max(run[key] for run in runs) * 1000, 1)
+            } for key in runs[0]
+        }
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
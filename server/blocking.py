@@ -0,0 +1,111 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import g
+from extensions import app_service
+
+
+def os_lock(reentrant=False):
+    """
+    A real OS lock (or RLock), even after eventlet/gevent monkey-patching.
+
+    State shared between greenlets and blocking-pool threads needs one: a
+    green lock can only be waited on from the event loop's own thread, so a
+    pool thread that finds it taken hangs or fails with "Cannot switch to a
+    different thread". Greenlets may hold an OS lock only around code that
+    never yields, or a second greenlet waiting on it stalls the whole loop.
+    """
+    name = 'RLock' if reentrant else 'allocate_lock'
+    # Nothing can be patched by a library that was never imported; don't pay to import it
+    if 'eventlet' in sys.modules:
+        from eventlet import patcher
+        if patcher.is_monkey_patched('thread'):
+            return getattr(patcher.original('_thread'), name)()
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return monkey.get_original('_thread', name)()
+    return threading.RLock() if reentrant else threading.Lock()
+
+
+class BlockingPool:
+    """
+    Bounded pool of OS threads for work that would otherwise block the server.
+
+    Under eventlet/gevent every connection shares one OS thread, so a bcrypt
+    hash or a SQLite commit on it stalls every socket on the process. run()
+    hands such calls to a real thread and parks only the calling greenlet.
+    In threading mode it simply caps how many run at once.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.async_mode = 'threading'
+        self.size = 16
+        self.green_threads = False
+        self._executor = None
+        if app is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio=None):
+        self.app = app
+        app.extensions['blocking_pool'] = self
+        self.size = app.config.get('BLOCKING_POOL_SIZE', self.size)
+        if socketio is not None:
+            self.async_mode = socketio.async_mode
+
+        if self.async_mode == 'eventlet':
+            from eventlet import tpool, patcher
+            tpool.set_num_threads(self.size)
+            self.green_threads = patcher.is_monkey_patched('thread')
+        elif self.async_mode == 'gevent':
+            import gevent
+            from gevent import monkey
+            gevent.get_hub().threadpool.maxsize = self.size
+            self.green_threads = monkey.is_module_patched('threading')
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='blocking')
+
+    def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) on the pool and wait for its result"""
+        if self.async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(fn, *args, **kwargs)
+        if self.async_mode == 'gevent':
+            import gevent
+            return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+        return self._executor.submit(fn, *args, **kwargs).result()
+
+    def wait(self, future):
+        """
+        Wait for a concurrent.futures.Future without stalling the event loop.
+
+        Once threading is monkey-patched the future's condition is green, so
+        waiting on it just parks this greenlet (and must not happen on a pool
+        thread, which can't be woken from the hub). Unpatched, the wait goes to
+        the pool instead.
+        """
+        if self.async_mode in ('eventlet', 'gevent') and not self.green_threads:
+            return self.run(future.result)
+        return future.result()
+
+    def run_in_app_context(self, fn, *args, **kwargs):
+        """
+        Like run(), but inside a fresh app context with its own DB session.
+
+        fn must return plain values, not ORM objects: its session is removed
+        before the result is handed back.
+        """
+        def call():
+            with self.app.app_context():
+                from models import db
+                # Routes its queries to the pool threads' own engine (db_profile.RoutingSession)
+                g.blocking_pool = True
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    db.session.remove()
+        return self.run(call)
+
+
+blocking_pool = app_service('blocking_pool')
@@ -1,7 +1,109 @@
 import os
 
 class Config:
+    """
+    Defaults. Deployments override any of them with a MESSAGEME_<KEY>
+    environment variable (parsed as JSON where possible, so numbers stay
+    numbers), e.g. MESSAGEME_SQLALCHEMY_DATABASE_URI or MESSAGEME_DB_POOL_SIZE,
+    and create_app(config) overrides both.
+    """
     SECRET_KEY = 'dev-secret-key-change-later'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    JWT_SECRET_KEY = 'jwt-secret-key-change-later'
\ No newline at end of file
+    JWT_SECRET_KEY = 'jwt-secret-key-change-later'
+    # Let flask_restful pass JWT errors through so they become 401s, not 500s
+    PROPAGATE_EXCEPTIONS = True
+
+    # Log threshold (DEBUG includes a line per message)
+    LOG_LEVEL = 'INFO'
+
+    # SQLite production profile: pragmas applied to every new connection, and the
+    # connection pool (sized to cover BLOCKING_POOL_SIZE plus request workers)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,        # KiB, i.e. 64 MB of page cache per connection
+        'mmap_size': 268435456,      # 256 MB
+        'busy_timeout': 5000,        # ms to wait on the write lock before failing
+        'temp_store': 'MEMORY'
+    }
+    # Applied only to databases that get a real pool: in-memory SQLite shares one connection
+    DB_POOL_SIZE = 20
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_TIMEOUT = 10
+    # Separate read-only pool for list/history reads (0 keeps everything on one pool)
+    SQLITE_READ_POOL_SIZE = 10
+    SQLITE_READ_MAX_OVERFLOW = 10
+
+    # Conversation history paging
+    MESSAGE_PAGE_SIZE = 50
+    MESSAGE_PAGE_MAX = 200
+
+    # Socket message write-behind: flush after this many messages or this many ms
+    MESSAGE_BATCH_SIZE = 100
+    MESSAGE_BATCH_INTERVAL_MS = 20
+
+    # In-process user profile cache
+    USER_CACHE_SIZE = 10000
+    USER_CACHE_TTL = 300
+
+    # Group membership index: seconds a membership is trusted before it's re-checked
+    # against the database (another worker may have removed it)
+    MEMBERSHIP_TTL = 60
+
+    # Directory type-ahead (?mode=index on /users and /groups)
+    DIRECTORY_SEARCH_LIMIT = 20
+    DIRECTORY_SEARCH_MAX = 100
+    # Seconds before a worker reloads its directory index, to pick up users and groups
+    # created or renamed on other workers
+    DIRECTORY_TTL = 60
+
+    # Cross-process Socket.IO fan-out: memory://, unix:///path/to/sock or redis://...
+    # Leave unset to run a single process with in-memory rooms
+    SOCKETIO_MESSAGE_QUEUE = None
+    SOCKETIO_CHANNEL = 'messageme'
+
+    # Serving: 'eventlet', 'gevent' or 'threading' (unset lets Flask-SocketIO pick what's installed)
+    ASYNC_MODE = None
+    HOST = '0.0.0.0'
+    PORT = 5000
+    # OS threads for bcrypt and DB commits, so they don't block the event loop
+    BLOCKING_POOL_SIZE = 16
+
+    # Reconnect catch-up: replay missed events in batches of this size, up to a cap
+    REPLAY_BATCH_SIZE = 100
+    REPLAY_MAX_MESSAGES = 1000
+
+    # Per-user token buckets for socket sends: up to BURST at once, refilled at PER_SECOND
+    # (a PER_SECOND of 0 turns that limit off)
+    MESSAGE_RATE_BURST = 20
+    MESSAGE_RATE_PER_SECOND = 5
+    GROUP_MESSAGE_RATE_BURST = 10
+    GROUP_MESSAGE_RATE_PER_SECOND = 2
+
+    # Outbound backpressure: packets a connection may have waiting before message events
+    # are dropped (and replayed after a resync) and read-state is coalesced; 0 disables
+    OUTBOUND_QUEUE_LIMIT = 500
+    OUTBOUND_FLUSH_INTERVAL_MS = 250
+
+    # Read receipts: coalesce mark_read events for this long before writing and notifying
+    READ_RECEIPT_DELAY_MS = 500
+
+    # Retention: read messages older than this many days move to monthly archive tables
+    # (0 disables), checked every ARCHIVE_INTERVAL seconds, ARCHIVE_BATCH_SIZE rows per transaction
+    MESSAGE_RETENTION_DAYS = 365
+    ARCHIVE_INTERVAL = 3600
+    ARCHIVE_BATCH_SIZE = 1000
+
+    # Seconds between background repairs of the unread counters (0 disables)
+    UNREAD_RECONCILE_INTERVAL = 3600
+
+    # Verified-token cache (seconds; entries never outlive the token's exp)
+    JWT_CACHE_SIZE = 10000
+    JWT_CACHE_TTL = 60
+
+    # Password hashing: bcrypt cost (existing hashes are upgraded on login when this changes),
+    # worker processes, and how many jobs may wait before requests get a 503
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_HASH_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+    PASSWORD_HASH_QUEUE_LIMIT = 64
\ No newline at end of file
@@ -0,0 +1,110 @@
+from sqlalchemy import case, func
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Message, ConversationSummary
+from unread import adjust_unread
+from archive import unarchive_latest
+
+
+def record_message(message):
+    """
+    Fold a newly added message into both participants' conversation summaries.
+
+    Must run inside the same transaction as the message insert (after a flush,
+    so the message has its id and timestamp). The recipient's unread count is
+    bumped; the sender's side just moves its last-message pointer.
+    """
+    record_messages([message])
+
+
+def record_messages(messages):
+    """
+    Same as record_message for a batch, with one upsert per (user, peer) pair
+    touched rather than one per message.
+    """
+    # (user_id, peer_id) -> [newest message, unread increment]
+    updates = {}
+    for message in messages:
+        sides = [
+            (message.sender_id, message.recipient_id, 0),
+            (message.recipient_id, message.sender_id, 1)
+        ]
+        for user_id, peer_id, unread in sides:
+            entry = updates.setdefault((user_id, peer_id), [message, 0])
+            if message.id > entry[0].id:
+                entry[0] = message
+            entry[1] += unread
+
+    table = ConversationSummary.__table__
+    for (user_id, peer_id), (latest, unread) in updates.items():
+        stmt = insert(table).values(
+            user_id=user_id,
+            peer_id=peer_id,
+            last_message_id=latest.id,
+            last_message_at=latest.timestamp,
+            unread_count=unread,
+            version=1
+        )
+        # Only move the pointer forward, in case an older message is recorded late
+        is_newer = stmt.excluded.last_message_id > table.c.last_message_id
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.peer_id],
+            set_={
+                'last_message_id': case((is_newer, stmt.excluded.last_message_id), else_=table.c.last_message_id),
+                'last_message_at': case((is_newer, stmt.excluded.last_message_at), else_=table.c.last_message_at),
+                'unread_count': table.c.unread_count + unread,
+                'version': table.c.version + 1
+            }
+        )
+        db.session.execute(stmt)
+
+    adjust_unread({
+        user_id: unread for (user_id, _), (_, unread) in updates.items() if unread
+    })
+
+
+def forget_message(message):
+    """
+    Update both summaries for a message that is about to be deleted.
+
+    Only the summaries that point at this message need a new last message,
+    which is found with one bounded index lookup per direction. `message`
+    may be an archived row (never a summary's last message).
+    """
+    for user_id, peer_id in [(message.sender_id, message.recipient_id),
+                             (message.recipient_id, message.sender_id)]:
+        summary = ConversationSummary.query.get((user_id, peer_id))
+        if not summary:
+            continue
+        summary.version = ConversationSummary.version + 1
+
+        if user_id == message.recipient_id and not message.is_read:
+            # Atomic, like every other counter update, so a concurrent batch insert isn't lost
+            summary.unread_count = func.max(ConversationSummary.unread_count - 1, 0)
+            adjust_unread({user_id: -1})
+
+        if summary.last_message_id == message.id:
+            latest = _latest_message(user_id, peer_id, exclude_id=message.id)
+            if latest is None:
+                # The rest of the conversation may be archived: bring its newest message back
+                latest = unarchive_latest(user_id, peer_id)
+            if latest:
+                summary.last_message_id = latest.id
+                summary.last_message_at = latest.timestamp
+            else:
+                db.session.delete(summary)
+
+
+def _latest_message(user_id, peer_id, exclude_id=None):
+    """Newest message between two users, one index lookup per direction"""
+    candidates = []
+    for sender_id, recipient_id in [(user_id, peer_id), (peer_id, user_id)]:
+        query = Message.query.filter_by(sender_id=sender_id, recipient_id=recipient_id)
+        if exclude_id is not None:
+            query = query.filter(Message.id != exclude_id)
+        latest = query.order_by(Message.timestamp.desc(), Message.id.desc()).first()
+        if latest:
+            candidates.append(latest)
+
+    if not candidates:
+        return None
+    return max(candidates, key=lambda m: (m.timestamp, m.id))
@@ -0,0 +1,176 @@
+from functools import wraps
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util.queue import Queue
+from blocking import os_lock
+
+
+class RoutingSession(Session):
+    """
+    db.session that sends reads from read_only() views to the read-only pool,
+    and everything blocking pool jobs run to the pool threads' own engine
+    (when there is one, see init_thread_engine).
+
+    Anything else flushed, or run outside a read_only() view (socket
+    handlers, writes), stays on the primary engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if g.get('blocking_pool'):
+                engine = current_app.extensions.get('db_thread_engine')
+                if engine is not None:
+                    return engine
+            elif not self._flushing and g.get('read_only'):
+                engine = current_app.extensions.get('db_read_engine')
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(fn):
+    """Run a view's queries on the read-only pool (when one is configured)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            g.read_only = False
+    return wrapper
+
+
+def _pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return set_pragmas
+
+
+def _in_memory(url):
+    """True for SQLite databases that live in memory rather than in a file"""
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
+def init_pool_options(app):
+    """
+    Add DB_POOL_SIZE/DB_MAX_OVERFLOW/DB_POOL_TIMEOUT to SQLALCHEMY_ENGINE_OPTIONS.
+
+    Only file-backed and server databases get a sized QueuePool; in-memory
+    SQLite runs on a single StaticPool connection, which rejects those
+    arguments. Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS win.
+    """
+    if _in_memory(make_url(app.config['SQLALCHEMY_DATABASE_URI'])):
+        return
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    }
+
+
+def init_db_profile(app, db):
+    """
+    Apply the SQLite production profile to db's engine.
+
+    Every new connection gets SQLITE_PRAGMAS (WAL, synchronous, cache and
+    mmap sizes, busy timeout). With SQLITE_READ_POOL_SIZE > 0 a second,
+    read-only pool is opened on the same file for read_only() views; in WAL
+    mode its readers never wait on the writer. Other databases are left alone.
+    """
+    with app.app_context():
+        engine = db.engine
+    url = engine.url
+    if url.get_backend_name() != 'sqlite' or _in_memory(url):
+        return
+
+    pragmas = app.config.get('SQLITE_PRAGMAS', {})
+    event.listen(engine, 'connect', _pragma_listener(pragmas))
+
+    read_pool_size = app.config.get('SQLITE_READ_POOL_SIZE', 0)
+    if not read_pool_size:
+        return
+
+    # Same file, opened with mode=ro so nothing routed here can write.
+    # journal_mode is a property of the file, set by the primary, so it's skipped
+    database = url.database if url.query.get('uri') else f'file:{url.database}'
+    read_url = url.set(database=database, query={**url.query, 'mode': 'ro', 'uri': 'true'})
+    read_engine = create_engine(
+        read_url,
+        pool_size=read_pool_size,
+        max_overflow=app.config.get('SQLITE_READ_MAX_OVERFLOW', 0),
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        connect_args={'check_same_thread': False}
+    )
+    read_pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    event.listen(read_engine, 'connect', _pragma_listener(read_pragmas))
+    app.extensions['db_read_engine'] = read_engine
+
+
+class _OSThreadQueue(Queue):
+    """The pool's connection queue, waiting on unpatched locks"""
+
+    def __init__(self, maxsize=0, use_lifo=False):
+        super().__init__(maxsize, use_lifo)
+        from eventlet import patcher
+        threading = patcher.original('threading')
+        self.mutex = threading.RLock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.not_full = threading.Condition(self.mutex)
+
+
+class OSThreadQueuePool(QueuePool):
+    """QueuePool for OS threads in a process where eventlet has patched threading"""
+    _queue_class = _OSThreadQueue
+
+    def __init__(self, creator, **kwargs):
+        super().__init__(creator, **kwargs)
+        self._overflow_lock = os_lock()
+        # The first connect (dialect setup) is serialized on a lock of its own, green unless set here
+        self.dispatch.connect.for_modify(self.dispatch)._exec_once_mutex = os_lock()
+
+
+def init_thread_engine(app, db, async_mode):
+    """
+    Open a second pool on db's database for blocking pool jobs under eventlet.
+
+    Once eventlet has patched threading, the primary pool's queue and locks are
+    green, and the blocking pool's threads (eventlet's tpool) can't wait on
+    them: a checkout that has to wait hangs or fails with "Cannot switch to a
+    different thread". Those jobs get this pool instead, sized to the blocking
+    pool and locked with real OS locks; RoutingSession sends their reads and
+    writes here.
+    """
+    if async_mode != 'eventlet':
+        return
+    from eventlet import patcher
+    if not patcher.is_monkey_patched('thread'):
+        return
+    with app.app_context():
+        engine = db.engine
+    url = engine.url
+    if _in_memory(url):
+        return
+
+    sqlite = url.get_backend_name() == 'sqlite'
+    thread_engine = create_engine(
+        url,
+        poolclass=OSThreadQueuePool,
+        pool_size=app.config.get('BLOCKING_POOL_SIZE', 16),
+        max_overflow=0,
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        connect_args={'check_same_thread': False} if sqlite else {}
+    )
+    if sqlite:
+        event.listen(thread_engine, 'connect', _pragma_listener(app.config.get('SQLITE_PRAGMAS', {})))
+    app.extensions['db_thread_engine'] = thread_engine
+    # Mappers otherwise configure on first use, under SQLAlchemy's (green) module-level lock
+    configure_mappers()
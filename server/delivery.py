@@ -0,0 +1,200 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import joinedload
+from models import db, Message, GroupMessage, DeliveryCursor, user_groups
+from blocking import blocking_pool, os_lock
+from backpressure import outbound_limiter
+from extensions import app_service
+
+
+class DeliveryTracker:
+    """
+    Per-connection delivered-up-to cursors, and catch-up replay on reconnect.
+
+    Each joined socket has a cursor for direct messages and one for group
+    messages. Replay and live direct-message pushes advance it; when the socket
+    disconnects the cursor is saved to delivery_cursors so a client that lost
+    its own state can still resume from where the server left off.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.batch_size = 100
+        self.max_replay = 1000
+        self._connections = {}   # sid -> {'user_id', 'message_id', 'group_message_id'}
+        self._user_sids = {}     # user_id -> {sid}
+        self._lock = os_lock()
+        if app is not None and socketio is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.extensions['delivery_tracker'] = self
+        self.batch_size = app.config.get('REPLAY_BATCH_SIZE', self.batch_size)
+        self.max_replay = app.config.get('REPLAY_MAX_MESSAGES', self.max_replay)
+
+    def connect(self, sid, user_id, last_message_id=None, last_group_message_id=None, resume=False):
+        """
+        Register a joined socket and start replaying what it missed.
+
+        Replay starts after the ids the client sends; with `resume` any id it
+        didn't send comes from the saved cursor instead. A fresh client that
+        loads history over REST sends neither and gets no replay.
+        """
+        if resume and (last_message_id is None or last_group_message_id is None):
+            saved = blocking_pool.run_in_app_context(_load_cursor, user_id)
+            if saved:
+                if last_message_id is None:
+                    last_message_id = saved[0]
+                if last_group_message_id is None:
+                    last_group_message_id = saved[1]
+
+        with self._lock:
+            self._connections[sid] = {
+                'user_id': user_id,
+                'message_id': last_message_id or 0,
+                'group_message_id': last_group_message_id or 0
+            }
+            self._user_sids.setdefault(user_id, set()).add(sid)
+
+        if last_message_id is not None or last_group_message_id is not None:
+            self.socketio.start_background_task(
+                self._replay, sid, user_id, last_message_id, last_group_message_id
+            )
+
+    def disconnect(self, sid):
+        """Forget the socket, saving its cursors for the next reconnect"""
+        with self._lock:
+            cursor = self._connections.pop(sid, None)
+            if cursor is None:
+                return
+            sids = self._user_sids.get(cursor['user_id'])
+            if sids is not None:
+                sids.discard(sid)
+                if not sids:
+                    del self._user_sids[cursor['user_id']]
+
+        blocking_pool.run_in_app_context(
+            _save_cursor, cursor['user_id'], cursor['message_id'], cursor['group_message_id']
+        )
+
+    def delivered(self, user_id, message_id):
+        """Note that a direct message was pushed live to every socket of user_id"""
+        with self._lock:
+            for sid in self._user_sids.get(user_id, ()):
+                cursor = self._connections[sid]
+                if message_id > cursor['message_id']:
+                    cursor['message_id'] = message_id
+
+    def _advance(self, sid, key, value):
+        with self._lock:
+            cursor = self._connections.get(sid)
+            if cursor and value > cursor[key]:
+                cursor[key] = value
+
+    def _replay(self, sid, user_id, last_message_id, last_group_message_id):
+        """Push missed events to one socket in batches, up to max_replay in total"""
+        with self.app.app_context():
+            sent = 0
+            truncated = False
+            streams = [
+                ('new_message', 'message_id', _missed_messages, last_message_id),
+                ('new_group_message', 'group_message_id', _missed_group_messages, last_group_message_id)
+            ]
+
+            for event, key, fetch, after_id in streams:
+                if after_id is None:
+                    continue
+                while True:
+                    if sent >= self.max_replay:
+                        truncated = True
+                        break
+                    limit = min(self.batch_size, self.max_replay - sent)
+                    batch = blocking_pool.run_in_app_context(fetch, user_id, after_id, limit)
+                    for payload in batch:
+                        self.socketio.emit(event, payload, to=sid)
+                    if batch:
+                        after_id = batch[-1]['id']
+                        self._advance(sid, key, after_id)
+                    sent += len(batch)
+                    if len(batch) < limit:
+                        break
+                    # Let other sockets get a turn between batches, and this one drain its queue
+                    outbound_limiter.wait_for_room(sid)
+
+            with self._lock:
+                cursor = dict(self._connections.get(sid) or {})
+            self.socketio.emit('catch_up_complete', {
+                'replayed': sent,
+                'truncated': truncated,
+                'last_message_id': cursor.get('message_id'),
+                'last_group_message_id': cursor.get('group_message_id')
+            }, to=sid)
+
+
+def _missed_messages(user_id, after_id, limit):
+    messages = Message.query.filter(
+        Message.recipient_id == user_id,
+        Message.id > after_id
+    ).order_by(Message.id).limit(limit).all()
+
+    return [{
+        'id': m.id,
+        'sender_id': m.sender_id,
+        'recipient_id': m.recipient_id,
+        'content': m.content,
+        'timestamp': m.timestamp.isoformat(),
+        'replayed': True
+    } for m in messages]
+
+
+def _missed_group_messages(user_id, after_id, limit):
+    group_ids = db.session.query(user_groups.c.group_id).filter(user_groups.c.user_id == user_id)
+    messages = GroupMessage.query.options(
+        joinedload(GroupMessage.sender)
+    ).filter(
+        GroupMessage.group_id.in_(group_ids),
+        GroupMessage.id > after_id
+    ).order_by(GroupMessage.id).limit(limit).all()
+
+    return [{
+        'id': m.id,
+        'group_id': m.group_id,
+        'sender_id': m.sender_id,
+        'sender_username': m.sender.username if m.sender else 'Unknown',
+        'content': m.content,
+        'timestamp': m.timestamp.isoformat(),
+        'replayed': True
+    } for m in messages]
+
+
+def _load_cursor(user_id):
+    cursor = DeliveryCursor.query.get(user_id)
+    if not cursor:
+        return None
+    return cursor.last_message_id, cursor.last_group_message_id
+
+
+def _save_cursor(user_id, last_message_id, last_group_message_id):
+    table = DeliveryCursor.__table__
+    stmt = insert(table).values(
+        user_id=user_id,
+        last_message_id=last_message_id,
+        last_group_message_id=last_group_message_id
+    )
+    # Several sockets for one user may close in any order; keep the furthest point
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            'last_message_id': func.max(table.c.last_message_id, stmt.excluded.last_message_id),
+            'last_group_message_id': func.max(table.c.last_group_message_id, stmt.excluded.last_group_message_id),
+            'updated_at': func.current_timestamp()
+        }
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+
+
+delivery_tracker = app_service('delivery_tracker')
@@ -0,0 +1,124 @@
+import bisect
+import heapq
+import time
+from extensions import app_service
+from lazy_index import LazyIndex
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DirectoryIndex(LazyIndex):
+    """
+    In-memory name index for type-ahead search over users or groups.
+
+    Keeps a sorted (name, id) list so every prefix is one contiguous bisect
+    range, plus trigram posting sets so substring matches of 3+ characters
+    only have to check names that share all of the query's trigrams.
+    Matching is case-insensitive; results rank exact > prefix > substring.
+    With a loader set, the index fills itself on the first search rather
+    than at startup, and reloads once it's `ttl` seconds old: each worker
+    only sees the writes it handles itself, so this is how names added or
+    changed on other workers show up.
+    """
+
+    def __init__(self, ttl=60):
+        super().__init__()
+        self.ttl = ttl
+        self._names = {}      # id -> lowercased name
+        self._sorted = []     # [(lowercased name, id)]
+        self._trigrams = {}   # trigram -> {id}
+
+    def _expired(self):
+        return self.ttl is not None and self._loader is not None and time.monotonic() - self._loaded_at >= self.ttl
+
+    def _fill(self, rows):
+        """(id, name) rows"""
+        self._names = {}
+        self._trigrams = {}
+        for row_id, name in rows:
+            name = name.lower()
+            self._names[row_id] = name
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, set()).add(row_id)
+        self._sorted = sorted((name, row_id) for row_id, name in self._names.items())
+
+    def add(self, row_id, name):
+        """Index a new row, or re-index one that was renamed"""
+        with self._lock:
+            # Already committed, so a load that's reading will pick it up or re-apply it
+            self._note_missed(self.add, row_id, name)
+            if not self._loaded:
+                return
+            self._unindex(row_id)
+            name = name.lower()
+            self._names[row_id] = name
+            bisect.insort(self._sorted, (name, row_id))
+            for gram in _trigrams(name):
+                self._trigrams.setdefault(gram, set()).add(row_id)
+
+    def remove(self, row_id):
+        with self._lock:
+            self._note_missed(self.remove, row_id)
+            if self._loaded:
+                self._unindex(row_id)
+
+    def _unindex(self, row_id):
+        name = self._names.pop(row_id, None)
+        if name is None:
+            return
+        i = bisect.bisect_left(self._sorted, (name, row_id))
+        if i < len(self._sorted) and self._sorted[i] == (name, row_id):
+            del self._sorted[i]
+        for gram in _trigrams(name):
+            ids = self._trigrams.get(gram)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self._trigrams[gram]
+
+    def search(self, term, limit):
+        """Up to `limit` ids matching term, best first"""
+        term = term.lower()
+        if not term or limit <= 0:
+            return []
+
+        self._ensure_loaded()
+        with self._lock:
+            exact, prefix = [], []
+            # Names starting with term sort contiguously from here, exact match first
+            i = bisect.bisect_left(self._sorted, (term,))
+            while i < len(self._sorted) and len(exact) + len(prefix) < limit:
+                name, row_id = self._sorted[i]
+                if not name.startswith(term):
+                    break
+                (exact if name == term else prefix).append(row_id)
+                i += 1
+
+            results = exact + prefix
+            if len(results) >= limit or len(term) < 3:
+                return results[:limit]
+
+            # Substring matches: intersect posting sets, smallest first
+            postings = [self._trigrams.get(gram, set()) for gram in _trigrams(term)]
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates &= ids
+                if not candidates:
+                    break
+
+            seen = set(results)
+            # Only the first few in name order are needed, not every candidate sorted
+            substring = heapq.nsmallest(limit - len(results), (
+                (self._names[row_id], row_id) for row_id in candidates
+                if row_id not in seen and term in self._names[row_id]
+            ))
+            results.extend(row_id for _, row_id in substring)
+            return results[:limit]
+
+
+# One of each per app, built by create_app
+user_directory = app_service('user_directory')
+group_directory = app_service('group_directory')
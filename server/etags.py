@@ -0,0 +1,40 @@
+import hashlib
+from flask import request, Response
+from werkzeug.http import quote_etag
+from datetime import datetime
+from models import db, ListVersion
+
+
+def make_etag(*parts):
+    """Opaque validator built from whatever versions identify a representation"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def etag_headers(etag):
+    # private: responses depend on the caller; no-cache: always revalidate, which is cheap
+    return {'ETag': quote_etag(etag, weak=True), 'Cache-Control': 'private, no-cache'}
+
+
+def not_modified(etag):
+    """A bodyless 304 if the client's If-None-Match already has etag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.headers.update(etag_headers(etag))
+    return response
+
+
+def list_version(name):
+    """(version, updated_at) of a listing: one primary-key lookup however big the listing is"""
+    row = db.session.query(ListVersion.version, ListVersion.updated_at).filter_by(name=name).first()
+    return tuple(row) if row else None
+
+
+def bump_list_version(name):
+    """Move a listing's version; call inside the transaction that changes the listing"""
+    updated = db.session.query(ListVersion).filter_by(name=name).update(
+        {'version': ListVersion.version + 1, 'updated_at': datetime.utcnow()},
+        synchronize_session=False
+    )
+    if not updated:
+        db.session.add(ListVersion(name=name))
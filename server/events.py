@@ -0,0 +1,212 @@
+import logging
+from flask import request, session
+from flask_socketio import emit, join_room, leave_room
+from group_history import save_group_message
+from blocking import blocking_pool
+from delivery import delivery_tracker
+from read_receipts import read_receipts
+from write_behind import message_writer
+from memberships import group_memberships, check_membership
+from user_cache import user_cache
+from payloads import parse_id, parse_cursor
+from auth_cache import jwt_manager
+from rate_limit import throttle
+from metrics import timed_event
+
+logger = logging.getLogger(__name__)
+
+
+def current_user_id():
+    """The user this socket authenticated as when it connected"""
+    return session.get('user_id')
+
+
+@timed_event('connect')
+def handle_connect(auth=None):
+    """Authenticate with the access token in the connect payload: io(URL, {auth: {token}})"""
+    token = auth.get('token') if isinstance(auth, dict) else None
+    # Cached, but a miss verifies the user against the database
+    user_id = parse_id(blocking_pool.run_in_app_context(jwt_manager.verify, token))
+    if user_id is None:
+        # Refused, without counting as a handler error
+        logger.info('Refused unauthenticated socket connection')
+        return False
+    
+    # Every handler acts as this user; ids in event payloads are never trusted for identity
+    session['user_id'] = user_id
+    logger.info('User %s connected', user_id)
+    emit('connection_response', {'status': 'Connected to MessageMe!'})
+
+
+@timed_event('disconnect')
+def handle_disconnect(reason=None):
+    delivery_tracker.disconnect(request.sid)
+    logger.info('Client disconnected')
+
+
+@timed_event('join')
+def handle_join(data):
+    """Join the user's room and all their group rooms; on reconnect, replay what was missed since the given ids"""
+    user_id = current_user_id()
+    if user_id:
+        join_room(f'user_{user_id}')
+        # Subscribe to every group up front instead of one join_group round trip per group
+        group_ids = group_memberships.groups_of(user_id)
+        for group_id in group_ids:
+            join_room(f'group_{group_id}')
+        logger.info('User %s joined their room and %d group rooms', user_id, len(group_ids))
+        delivery_tracker.connect(
+            request.sid,
+            user_id,
+            last_message_id=parse_cursor(data.get('last_message_id')),
+            last_group_message_id=parse_cursor(data.get('last_group_message_id')),
+            resume=bool(data.get('resume'))
+        )
+
+
+@timed_event('send_message')
+def handle_send_message(data):
+    """Handle incoming message from client"""
+    sender_id = current_user_id()
+    recipient_id = parse_id(data.get('recipient_id'))
+    content = data.get('content')
+    
+    if not recipient_id or not content:
+        emit('message_error', {'error': 'Missing required fields'})
+        return
+    
+    if data.get('sender_id') is not None and parse_id(data.get('sender_id')) != sender_id:
+        emit('message_error', {'error': 'Cannot send as another user'})
+        return
+    
+    if not isinstance(content, str):
+        emit('message_error', {'error': 'Content must be text'})
+        return
+    
+    if sender_id == recipient_id:
+        emit('message_error', {'error': 'Cannot message yourself'})
+        return
+    
+    if throttle('send_message'):
+        return
+    
+    # Check recipient exists: a cache hit is answered here, only a miss queries on the pool
+    recipient = user_cache.cached(recipient_id)
+    if recipient is None:
+        recipient = blocking_pool.run_in_app_context(user_cache.load, recipient_id)
+    if recipient is None:
+        emit('message_error', {'error': 'Recipient not found', 'recipient_id': recipient_id})
+        return
+    
+    logger.debug('Message from user %s to user %s', sender_id, recipient_id)
+    
+    # Queued for the next batch insert; new_message/message_sent go out once it's committed
+    message_writer.submit(sender_id, recipient_id, content, request.sid)
+
+
+@timed_event('mark_read')
+def handle_mark_read(data):
+    """Mark messages from peer_id as read up to up_to_id (debounced into one write and one event)"""
+    user_id = current_user_id()
+    peer_id = parse_id(data.get('peer_id'))
+    up_to_id = data.get('up_to_id')
+    
+    if not user_id or not peer_id:
+        emit('message_error', {'error': 'Missing required fields'})
+        return
+    
+    # Checked here: one bad value would otherwise fail the shared flush for everyone
+    if up_to_id is not None:
+        up_to_id = parse_id(up_to_id)
+        if up_to_id is None:
+            emit('message_error', {'error': 'Invalid up_to_id'})
+            return
+    
+    read_receipts.submit(user_id, peer_id, up_to_id)
+
+
+@timed_event('join_group')
+def handle_join_group(data):
+    """User joins a group room (members only)"""
+    group_id = parse_id(data.get('group_id'))
+    user_id = current_user_id()
+    
+    if group_id:
+        if not check_membership(user_id, group_id):
+            emit('message_error', {'error': 'Not in group', 'group_id': group_id})
+            return
+        join_room(f'group_{group_id}')
+        logger.info('User %s joined group room %s', user_id, group_id)
+        emit('joined_group', {'group_id': group_id}, room=f'user_{user_id}')
+
+
+@timed_event('leave_group')
+def handle_leave_group(data):
+    """User leaves a group room"""
+    group_id = parse_id(data.get('group_id'))
+    user_id = current_user_id()
+    
+    if group_id:
+        leave_room(f'group_{group_id}')
+        logger.info('User %s left group room %s', user_id, group_id)
+
+
+@timed_event('send_group_message')
+def handle_send_group_message(data):
+    """Handle incoming group message from client"""
+    try:
+        sender_id = current_user_id()
+        group_id = parse_id(data.get('group_id'))
+        content = data.get('content')
+        
+        if not group_id or not content:
+            emit('message_error', {'error': 'Missing required fields'})
+            return
+        
+        if data.get('sender_id') is not None and parse_id(data.get('sender_id')) != sender_id:
+            emit('message_error', {'error': 'Cannot send as another user'})
+            return
+        
+        if not isinstance(content, str):
+            emit('message_error', {'error': 'Content must be text'})
+            return
+        
+        if throttle('send_group_message'):
+            return
+        
+        if not check_membership(sender_id, group_id):
+            emit('message_error', {'error': 'Not in group', 'group_id': group_id})
+            return
+        
+        logger.debug('Group message from user %s to group %s', sender_id, group_id)
+        
+        # Store one row per message (members read it through their cursor in user_groups).
+        # The commit runs on the blocking pool so it doesn't stall other sockets.
+        message_data = blocking_pool.run_in_app_context(save_group_message, sender_id, group_id, content)
+        
+        # Broadcast to everyone in the group room
+        emit('new_group_message', message_data, room=f'group_{group_id}')
+        
+        logger.debug('Group message %s saved and broadcast', message_data['id'])
+        
+    except Exception:
+        logger.exception('Error sending group message')
+        emit('message_error', {'error': 'Message could not be sent', 'group_id': data.get('group_id')})
+
+
+HANDLERS = {
+    'connect': handle_connect,
+    'disconnect': handle_disconnect,
+    'join': handle_join,
+    'send_message': handle_send_message,
+    'mark_read': handle_mark_read,
+    'join_group': handle_join_group,
+    'leave_group': handle_leave_group,
+    'send_group_message': handle_send_group_message
+}
+
+
+def register_events(socketio):
+    """Attach the Socket.IO event handlers to socketio"""
+    for name, handler in HANDLERS.items():
+        socketio.on_event(name, handler)
@@ -0,0 +1,16 @@
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+
+def app_service(name):
+    """
+    Module-level handle on a per-app service.
+
+    create_app() builds one instance of each service (blocking pool, caches,
+    write-behind queue, ...) per app and keeps it in app.extensions[name];
+    the proxy returned here resolves to the instance of whichever app is
+    current, so two apps in one process never share state. Code running
+    outside a request or socket handler (background tasks) pushes its app's
+    context first.
+    """
+    return LocalProxy(lambda: current_app.extensions[name])
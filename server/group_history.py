@@ -0,0 +1,64 @@
+from sqlalchemy import func, select
+from models import db, GroupMessage, user_groups
+from user_cache import user_cache
+
+
+def get_membership(user_id, group_id):
+    """The user's user_groups row for this group, or None if they aren't a member"""
+    return db.session.execute(
+        user_groups.select().where(
+            (user_groups.c.user_id == user_id) & (user_groups.c.group_id == group_id)
+        )
+    ).first()
+
+
+def unread_count(group_id, last_read_message_id):
+    """Messages in the group past the read cursor, counted on ix_group_messages_unread"""
+    return db.session.query(func.count(GroupMessage.id)).filter(
+        GroupMessage.group_id == group_id,
+        GroupMessage.id > last_read_message_id
+    ).scalar()
+
+
+def advance_read_cursor(user_id, group_id, message_id):
+    """
+    Move a member's read cursor forward to message_id: never backwards, and
+    never past the group's newest message, so a bogus id can't mark future
+    messages read. The clamp is one max() on ix_group_messages_unread.
+    """
+    newest = select(func.max(GroupMessage.id)).where(GroupMessage.group_id == group_id).scalar_subquery()
+    target = func.min(message_id, func.coalesce(newest, 0))
+    db.session.execute(
+        user_groups.update().where(
+            (user_groups.c.user_id == user_id) &
+            (user_groups.c.group_id == group_id) &
+            (user_groups.c.last_read_message_id < target)
+        ).values(last_read_message_id=target)
+    )
+
+
+def save_group_message(sender_id, group_id, content):
+    """Store a group message and return it as the payload broadcast to the room"""
+    new_message = GroupMessage(
+        group_id=group_id,
+        sender_id=sender_id,
+        content=content
+    )
+    db.session.add(new_message)
+    db.session.flush()
+
+    # The sender has obviously seen their own message
+    advance_read_cursor(sender_id, group_id, new_message.id)
+    db.session.commit()
+
+    # Get sender info (cached, so busy rooms don't query users per message)
+    sender = user_cache.get(sender_id)
+
+    return {
+        'id': new_message.id,
+        'group_id': group_id,
+        'sender_id': sender_id,
+        'sender_username': sender['username'] if sender else 'Unknown',
+        'content': content,
+        'timestamp': new_message.timestamp.isoformat()
+    }
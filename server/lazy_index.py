@@ -0,0 +1,82 @@
+import logging
+import threading
+import time
+from blocking import os_lock
+
+logger = logging.getLogger(__name__)
+
+
+class LazyIndex:
+    """
+    Base for the in-memory indexes that fill themselves from the database.
+
+    With a loader set, the first lookup loads the index (and, where
+    _expired() says so, a later one reloads it). Writes that commit while a
+    load is reading may be missing from its rows, so subclasses pass every
+    change through _note_missed and load() re-applies them afterwards.
+    Subclasses implement _fill(rows) and do their own work under `_lock`.
+    """
+
+    def __init__(self):
+        self._lock = os_lock(reentrant=True)
+        # Green under eventlet/gevent: lookups waiting out the first load yield rather than block
+        self._load_lock = threading.Lock()
+        self._loader = None
+        self._loaded = True
+        self._loaded_at = 0
+        self._missed = None    # [(method, args)] changed while a load was reading
+
+    def set_loader(self, loader):
+        """loader() returns the rows load() takes; it's called on first use"""
+        with self._lock:
+            self._loader = loader
+            self._loaded = False
+
+    def _expired(self):
+        """Whether a loaded index should be reloaded; never, unless a subclass says so"""
+        return False
+
+    def _ensure_loaded(self):
+        if self._loaded and not self._expired():
+            return
+        refreshing = self._loaded
+        # Not under _lock: the loader waits on the blocking pool, and _lock is an OS lock.
+        # A refresh is left to whichever lookup gets here first; the rest use what's loaded
+        if not self._load_lock.acquire(blocking=not refreshing):
+            return
+        try:
+            if self._loaded and not self._expired():
+                return
+            with self._lock:
+                self._missed = []
+            try:
+                self.load(self._loader())
+            except Exception:
+                if not refreshing:
+                    raise
+                # Keep serving the old contents; the next lookup tries again
+                logger.exception('Error refreshing %s', type(self).__name__)
+            finally:
+                with self._lock:
+                    self._missed = None
+        finally:
+            self._load_lock.release()
+
+    def load(self, rows):
+        """Replace the index contents with rows"""
+        with self._lock:
+            self._loaded = True
+            self._loaded_at = time.monotonic()
+            self._fill(rows)
+            # Committed while the rows were being read, so possibly not in them
+            missed, self._missed = self._missed or [], None
+            for method, args in missed:
+                method(*args)
+
+    def _fill(self, rows):
+        raise NotImplementedError
+
+    def _note_missed(self, method, *args):
+        # A load in progress may have read its rows before this change
+        if self._missed is not None:
+            self._missed.append((method, args))
@@ -0,0 +1,32 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+
+
+def init_logging(app):
+    """
+    Leveled logging that never blocks the caller on I/O.
+
+    Every logger hands its records to a QueueHandler; a QueueListener thread
+    formats them and does the actual writes to stderr. LOG_LEVEL sets the
+    threshold (per-message chatter is DEBUG).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    # queue.Queue rather than SimpleQueue so eventlet/gevent can patch it
+    records = queue.Queue()
+    _listener = QueueListener(records, stream, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(records)]
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    _listener.start()
+    atexit.register(_listener.stop)
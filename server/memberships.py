@@ -0,0 +1,146 @@
+import time
+from blocking import blocking_pool
+from group_history import get_membership
+from extensions import app_service
+from payloads import parse_id
+from lazy_index import LazyIndex
+
+
+class MembershipIndex(LazyIndex):
+    """
+    In-memory group -> members and user -> groups index over user_groups.
+
+    Lets socket handlers authorize joins and sends, and find a user's rooms,
+    with set lookups instead of a query per event. Loaded on first lookup
+    (or by load()); the REST resources that change membership keep it in
+    step after they commit. Each worker holds its own copy, so a membership
+    is only trusted for `ttl` seconds after it was loaded or last confirmed;
+    see check_membership for misses and stale entries.
+    """
+
+    def __init__(self, ttl=60):
+        super().__init__()
+        self.ttl = ttl
+        self._members = {}     # group_id -> {user_id}
+        self._groups = {}      # user_id -> {group_id}
+        self._confirmed = {}   # (user_id, group_id) -> when confirmed, if since the load
+
+    def _fill(self, rows):
+        """(user_id, group_id) rows"""
+        self._confirmed = {}
+        self._members = {}
+        self._groups = {}
+        for user_id, group_id in rows:
+            self._members.setdefault(group_id, set()).add(user_id)
+            self._groups.setdefault(user_id, set()).add(group_id)
+
+    def add(self, user_id, group_id):
+        user_id, group_id = parse_id(user_id), parse_id(group_id)
+        with self._lock:
+            # Already committed, so a load that's reading will pick it up or re-apply it
+            self._note_missed(self.add, user_id, group_id)
+            if not self._loaded:
+                return
+            self._members.setdefault(group_id, set()).add(user_id)
+            self._groups.setdefault(user_id, set()).add(group_id)
+            self._confirmed[(user_id, group_id)] = time.monotonic()
+
+    def remove(self, user_id, group_id):
+        user_id, group_id = parse_id(user_id), parse_id(group_id)
+        with self._lock:
+            self._note_missed(self.remove, user_id, group_id)
+            if not self._loaded:
+                return
+            self._discard(self._members, group_id, user_id)
+            self._discard(self._groups, user_id, group_id)
+            self._confirmed.pop((user_id, group_id), None)
+
+    def remove_group(self, group_id):
+        """Forget a deleted group; returns its former members"""
+        with self._lock:
+            self._note_missed(self.remove_group, group_id)
+            if not self._loaded:
+                return set()
+            members = self._members.pop(parse_id(group_id), set())
+            for user_id in members:
+                self._discard(self._groups, user_id, parse_id(group_id))
+                self._confirmed.pop((user_id, parse_id(group_id)), None)
+            return members
+
+    def remove_user(self, user_id):
+        """Forget a deleted user; returns the groups they were in"""
+        with self._lock:
+            self._note_missed(self.remove_user, user_id)
+            if not self._loaded:
+                return set()
+            groups = self._groups.pop(parse_id(user_id), set())
+            for group_id in groups:
+                self._discard(self._members, group_id, parse_id(user_id))
+                self._confirmed.pop((parse_id(user_id), group_id), None)
+            return groups
+
+    def is_member(self, user_id, group_id):
+        self._ensure_loaded()
+        members = self._members.get(parse_id(group_id))
+        return members is not None and parse_id(user_id) in members
+
+    def is_fresh_member(self, user_id, group_id):
+        """is_member, and loaded or confirmed within the last `ttl` seconds"""
+        if not self.is_member(user_id, group_id):
+            return False
+        with self._lock:
+            since = self._confirmed.get((parse_id(user_id), parse_id(group_id)), self._loaded_at)
+        return time.monotonic() - since < self.ttl
+
+    def groups_of(self, user_id):
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._groups.get(parse_id(user_id), ()))
+
+    def member_count(self, group_id):
+        self._ensure_loaded()
+        return len(self._members.get(parse_id(group_id), ()))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'groups': len(self._members),
+                'memberships': sum(len(members) for members in self._members.values())
+            }
+
+    @staticmethod
+    def _discard(index, key, value):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+
+# One per app, built by create_app
+group_memberships = app_service('group_memberships')
+
+
+def check_membership(user_id, group_id):
+    """
+    Whether user_id is in group_id: O(1) from the index while the entry is fresh.
+
+    Misses and entries older than the index's ttl go to the database, to pick
+    up a join or a removal that another worker handled, and the answer is
+    written back so the next checks are in memory again.
+    """
+    user_id, group_id = parse_id(user_id), parse_id(group_id)
+    if user_id is None or group_id is None:
+        return False
+    if group_memberships.is_fresh_member(user_id, group_id):
+        return True
+    if blocking_pool.run_in_app_context(get_membership, user_id, group_id) is None:
+        group_memberships.remove(user_id, group_id)
+        return False
+    group_memberships.add(user_id, group_id)
+    return True
+
+
+def unsubscribe(socketio, user_id, group_id):
+    """Take a user's sockets out of a group room they no longer belong to, on every worker"""
+    socketio.server.manager.leave_user_room(f'user_{user_id}', f'group_{group_id}')
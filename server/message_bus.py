@@ -0,0 +1,209 @@
+"""
+Cross-process fan-out for Socket.IO rooms.
+
+Each worker only knows about the sockets connected to it, so an emit to
+`user_{id}` or `group_{id}` has to be relayed to every worker. These are
+python-socketio PubSubManager backends that do the relaying:
+
+    memory://              in-process hub, for running several servers in one process
+                           (tests drive the managers directly: Flask-SocketIO's test
+                           client refuses to run with a message queue)
+    unix:///path/to/sock   small broker process on a Unix socket, for workers on one box
+    redis://host:port/db   Redis pub/sub (needs the `redis` package)
+
+Pick one with SOCKETIO_MESSAGE_QUEUE. Start the Unix-socket broker with
+`python message_bus.py /path/to/sock` before the workers.
+"""
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import socketio
+
+
+def create_client_manager(url, channel='messageme', extend=None):
+    """
+    Client manager for the SocketIO server; without a URL rooms stay in-process.
+    `extend(manager_class)` may return a subclass to build instead.
+    """
+    extend = extend or (lambda manager_class: manager_class)
+    if not url:
+        return extend(LocalManager)()
+    if url.startswith('memory://'):
+        return extend(InProcessManager)(channel=channel)
+    if url.startswith('unix://'):
+        return extend(UnixSocketManager)(url, channel=channel)
+    if url.startswith(('redis://', 'rediss://')):
+        return extend(RedisManager)(url, channel=channel)
+    raise ValueError(f'Unsupported message queue URL: {url}')
+
+
+class UserRooms:
+    """
+    Client manager mixin: leave_user_room() on every worker, not just this one.
+
+    A user's sockets may be connected to any worker, and only that worker knows
+    their sids, so the request goes out as a leave_room message naming the
+    user's room instead of a sid; each worker resolves it against its own sockets.
+    """
+
+    def leave_user_room(self, user_room, room, namespace='/'):
+        """Take every socket in user_room out of room"""
+        self._leave_user_room(user_room, room, namespace)
+        if isinstance(self, socketio.PubSubManager):
+            self._publish({'method': 'leave_room', 'sid': None, 'user_room': user_room, 'room': room,
+                           'namespace': namespace, 'host_id': self.host_id})
+
+    def _leave_user_room(self, user_room, room, namespace):
+        for sid, _ in list(self.get_participants(namespace, user_room)):
+            socketio.Manager.leave_room(self, sid, namespace, room)
+
+    def _handle_leave_room(self, message):
+        if message.get('user_room'):
+            self._leave_user_room(message['user_room'], message.get('room'), message.get('namespace') or '/')
+        else:
+            super()._handle_leave_room(message)
+
+
+class LocalManager(UserRooms, socketio.Manager):
+    """Rooms in this process only"""
+
+
+class RedisManager(UserRooms, socketio.RedisManager):
+    """Redis pub/sub relaying, with leave_user_room"""
+
+
+class InProcessManager(UserRooms, socketio.PubSubManager):
+    """Relays between SocketIO servers living in the same process"""
+    name = 'memory'
+
+    _subscribers = {}  # channel -> [queue.Queue]
+    _lock = threading.Lock()
+
+    def __init__(self, channel='messageme', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._lock:
+                self._subscribers.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(self.channel, []))
+        for q in subscribers:
+            q.put(data)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+
+class UnixSocketManager(UserRooms, socketio.PubSubManager):
+    """
+    Relays through a broker on a Unix domain socket (see run_broker).
+
+    Messages are newline-delimited JSON. Publishing and listening use separate
+    connections so a burst of outgoing emits never waits behind reads.
+    """
+    name = 'unix'
+
+    def __init__(self, url='unix:///tmp/messageme-bus.sock', channel='messageme',
+                 write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.path = url[len('unix://'):]
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self, role):
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.path)
+        conn.sendall(f'{role} {self.channel}\n'.encode('utf-8'))
+        return conn
+
+    def _publish(self, data):
+        frame = (json.dumps(data) + '\n').encode('utf-8')
+        with self._publish_lock:
+            # One reconnect attempt if the broker went away since the last publish
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect('PUB')
+                    self._publisher.sendall(frame)
+                    return
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                    self._publisher = None
+                    if attempt:
+                        self._get_logger().error('Cannot publish to message bus at %s', self.path)
+
+    def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                conn = self._connect('SUB')
+                retry_sleep = 1
+                with conn, conn.makefile('rb') as stream:
+                    for line in stream:
+                        yield json.loads(line)
+            except OSError:
+                self._get_logger().error('Cannot reach message bus at %s, retrying in %s secs',
+                                         self.path, retry_sleep)
+            time.sleep(retry_sleep)
+            retry_sleep = min(retry_sleep * 2, 30)
+
+
+def run_broker(path):
+    """Relay every line a publisher sends to all subscribers on the same channel"""
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(128)
+
+    subscribers = {}  # channel -> {socket: write lock}
+    lock = threading.Lock()
+
+    def serve(conn):
+        stream = conn.makefile('rb')
+        try:
+            role, channel = stream.readline().decode('utf-8').split()
+        except ValueError:
+            conn.close()
+            return
+
+        if role == 'SUB':
+            with lock:
+                subscribers.setdefault(channel, {})[conn] = threading.Lock()
+            # Subscribers never send anything else; block until they hang up
+            stream.read()
+            with lock:
+                subscribers[channel].pop(conn, None)
+            conn.close()
+            return
+
+        for line in stream:
+            with lock:
+                targets = list(subscribers.get(channel, {}).items())
+            # Per-subscriber lock so concurrent publishers can't interleave partial lines
+            for target, write_lock in targets:
+                try:
+                    with write_lock:
+                        target.sendall(line)
+                except OSError:
+                    with lock:
+                        subscribers[channel].pop(target, None)
+        conn.close()
+
+    print(f'Message bus listening on {path}')
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+
+if __name__ == '__main__':
+    run_broker(sys.argv[1] if len(sys.argv) > 1 else '/tmp/messageme-bus.sock')
@@ -0,0 +1,202 @@
+import time
+from bisect import bisect_left
+from functools import wraps
+from flask import g, has_request_context, request, Response
+from sqlalchemy import event
+from werkzeug.exceptions import HTTPException
+from blocking import os_lock
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        # Updated from greenlets and from blocking-pool threads (SQL runs there)
+        self._lock = os_lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}   # label key -> [bucket counts..., +Inf count, sum]
+        self._lock = os_lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+                cumulative += series[len(self.buckets)]
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", "+Inf")])} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {series[-1]}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """
+    Prometheus-style metrics kept in process.
+
+    Counters and histograms are plain dicts behind a lock; gauges are callbacks
+    read when /metrics is scraped, so existing stats() methods can be exposed
+    without touching their hot paths.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []
+
+    def counter(self, name, documentation):
+        metric = Counter(name, documentation)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, callback):
+        """callback() returns a number, or a list of (labels dict, number)"""
+        self._gauges.append((name, documentation, callback))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, documentation, callback in self._gauges:
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} gauge'])
+            try:
+                value = callback()
+            except Exception:
+                continue
+            samples = value if isinstance(value, list) else [({}, value)]
+            for labels, number in samples:
+                lines.append(f'{name}{_format_labels(_label_key(labels))} {number}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_latency = registry.histogram(
+    'messageme_http_request_duration_seconds', 'REST request latency by resource, method and status')
+http_db_statements = registry.histogram(
+    'messageme_http_request_db_statements', 'SQL statements executed per REST request', COUNT_BUCKETS)
+http_db_time = registry.histogram(
+    'messageme_http_request_db_seconds', 'Time spent in SQL per REST request')
+socket_latency = registry.histogram(
+    'messageme_socket_event_duration_seconds', 'Socket.IO handler latency by event')
+socket_errors = registry.counter(
+    'messageme_socket_event_errors_total', 'Socket.IO handlers that raised, by event')
+db_statements = registry.counter(
+    'messageme_db_statements_total', 'SQL statements executed, by engine')
+db_time = registry.histogram(
+    'messageme_db_statement_duration_seconds', 'SQL statement latency, by engine')
+room_fanout = registry.histogram(
+    'messageme_emit_fanout_sockets', 'Sockets reached per emit on each worker that delivered it, by event',
+    COUNT_BUCKETS)
+socket_throttled = registry.counter(
+    'messageme_socket_throttled_total', 'Socket.IO events rate limited, and outbound packets dropped or coalesced')
+
+
+def timed_resource(view):
+    """Api decorator: latency and SQL cost for every flask_restful resource"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_statements = 0
+        g.db_seconds = 0.0
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = view(*args, **kwargs)
+            status = getattr(response, 'status_code', 200)
+            return response
+        except HTTPException as e:
+            status = e.code
+            raise
+        finally:
+            resource = request.endpoint or 'unknown'
+            http_latency.observe(time.perf_counter() - started, resource=resource, method=request.method, status=status)
+            http_db_statements.observe(g.db_statements, resource=resource)
+            http_db_time.observe(g.db_seconds, resource=resource)
+    return wrapper
+
+
+def timed_event(name):
+    """Wrap a Socket.IO handler (under @socketio.on) with a latency histogram"""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            except Exception:
+                socket_errors.inc(event=name)
+                raise
+            finally:
+                socket_latency.observe(time.perf_counter() - started, event=name)
+        return wrapper
+    return decorator
+
+
+def instrument_engine(engine, name):
+    """Count and time every statement on engine, globally and for the current request"""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        db_statements.inc(engine=name)
+        db_time.observe(elapsed, engine=name)
+        if has_request_context() and 'db_statements' in g:
+            g.db_statements += 1
+            g.db_seconds += elapsed
+
+
+def metrics_view():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
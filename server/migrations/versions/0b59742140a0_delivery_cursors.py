@@ -0,0 +1,41 @@
+"""Delivery cursors and the recipient index for reconnect replay
+
+Revision ID: 0b59742140a0
+Revises: 50553ba329d5
+Create Date: 2026-10-18 17:13:58.419730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b59742140a0'
+down_revision = '50553ba329d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('delivery_cursors'):
+        op.create_table('delivery_cursors',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=False),
+        sa.Column('last_group_message_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+
+    if 'ix_messages_recipient' not in {index['name'] for index in inspector.get_indexes('messages')}:
+        with op.batch_alter_table('messages', schema=None) as batch_op:
+            batch_op.create_index('ix_messages_recipient', ['recipient_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_recipient')
+
+    op.drop_table('delivery_cursors')
@@ -0,0 +1,37 @@
+"""Catalog of message archive partitions
+
+Revision ID: 438cb4ce5e1b
+Revises: d9001d6a30bb
+Create Date: 2026-10-18 17:20:31.117094
+
+This id used to belong to a single revision holding the whole schema;
+databases stamped with it already match this head.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '438cb4ce5e1b'
+down_revision = 'd9001d6a30bb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('message_archive_partitions'):
+        return
+
+    # The messages_archive_YYYYMM tables themselves are created by the archiver as needed
+    op.create_table('message_archive_partitions',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('period_end', sa.DateTime(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('archived_before', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('message_archive_partitions')
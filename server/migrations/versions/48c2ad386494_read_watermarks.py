@@ -0,0 +1,29 @@
+"""Read watermark on conversation summaries
+
+Revision ID: 48c2ad386494
+Revises: 0b59742140a0
+Create Date: 2026-10-18 17:15:26.947385
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '48c2ad386494'
+down_revision = '0b59742140a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('conversation_summaries')}
+    if 'last_read_message_id' not in columns:
+        # 0 is a safe start: marking read only ever touches messages still flagged unread
+        with op.batch_alter_table('conversation_summaries', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('last_read_message_id', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('conversation_summaries', schema=None) as batch_op:
+        batch_op.drop_column('last_read_message_id')
@@ -0,0 +1,67 @@
+"""Full-text search tables and their sync triggers (SQLite only)
+
+Revision ID: 50553ba329d5
+Revises: 6e4e7f7868b9
+Create Date: 2026-10-18 17:11:40.862207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '50553ba329d5'
+down_revision = '6e4e7f7868b9'
+branch_labels = None
+depends_on = None
+
+# External-content FTS5 tables mirroring the searchable text columns
+FTS_TABLES = [
+    ('messages_fts', 'messages', ['content']),
+    ('group_messages_fts', 'group_messages', ['content']),
+    ('groups_fts', 'groups', ['name', 'description'])
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    inspector = sa.inspect(op.get_bind())
+    # Triggers keep the FTS tables in step with every insert/update/delete,
+    # including bulk writes that bypass the ORM (batched socket inserts, query.delete())
+    for fts_table, source, columns in FTS_TABLES:
+        cols = ', '.join(columns)
+        new_cols = ', '.join(f'new.{c}' for c in columns)
+        old_cols = ', '.join(f'old.{c}' for c in columns)
+        exists = inspector.has_table(fts_table)
+        op.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} "
+            f"USING fts5({cols}, content='{source}', content_rowid='id')"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {source} BEGIN "
+            f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {source} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+            f"INSERT INTO {fts_table}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+        )
+        if not exists:
+            # Index the rows written before search existed
+            op.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for fts_table, _, _ in FTS_TABLES:
+        for suffix in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+        op.execute(f'DROP TABLE IF EXISTS {fts_table}')
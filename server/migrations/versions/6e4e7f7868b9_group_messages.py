@@ -0,0 +1,50 @@
+"""Group messages and per-member read cursors
+
+Revision ID: 6e4e7f7868b9
+Revises: 8ab693cda52b
+Create Date: 2026-10-18 17:09:15.730462
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6e4e7f7868b9'
+down_revision = '8ab693cda52b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('group_messages'):
+        op.create_table('group_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('group_messages', schema=None) as batch_op:
+            batch_op.create_index('ix_group_messages_history', ['group_id', 'timestamp'], unique=False)
+            batch_op.create_index('ix_group_messages_unread', ['group_id', 'id'], unique=False)
+
+    if 'last_read_message_id' not in {c['name'] for c in inspector.get_columns('user_groups')}:
+        with op.batch_alter_table('user_groups', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('last_read_message_id', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user_groups', schema=None) as batch_op:
+        batch_op.drop_column('last_read_message_id')
+
+    with op.batch_alter_table('group_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_messages_unread')
+        batch_op.drop_index('ix_group_messages_history')
+
+    op.drop_table('group_messages')
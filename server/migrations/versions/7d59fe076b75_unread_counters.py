@@ -0,0 +1,36 @@
+"""Per-user unread counter, backfilled from the conversation summaries
+
+Revision ID: 7d59fe076b75
+Revises: 48c2ad386494
+Create Date: 2026-10-18 17:17:03.385216
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d59fe076b75'
+down_revision = '48c2ad386494'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'unread_count' in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('users')}:
+        return
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute("""
+        UPDATE users SET unread_count = (
+            SELECT COALESCE(SUM(unread_count), 0) FROM conversation_summaries
+            WHERE conversation_summaries.user_id = users.id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('unread_count')
@@ -0,0 +1,58 @@
+"""Conversation summaries, backfilled from existing messages
+
+Revision ID: 8ab693cda52b
+Revises: cdd4e26f1dda
+Create Date: 2026-10-18 17:06:52.018345
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8ab693cda52b'
+down_revision = 'cdd4e26f1dda'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('conversation_summaries'):
+        return
+
+    op.create_table('conversation_summaries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('peer_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_id', sa.Integer(), nullable=True),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True),
+    sa.Column('unread_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['last_message_id'], ['messages.id'], ),
+    sa.ForeignKeyConstraint(['peer_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'peer_id')
+    )
+    with op.batch_alter_table('conversation_summaries', schema=None) as batch_op:
+        batch_op.create_index('ix_conversation_summaries_inbox', ['user_id', 'last_message_at'], unique=False)
+
+    # One row per direction of every existing conversation, pointing at its newest message
+    op.execute("""
+        INSERT INTO conversation_summaries (user_id, peer_id, last_message_id, unread_count)
+        SELECT user_id, peer_id, MAX(id), SUM(unread) FROM (
+            SELECT sender_id AS user_id, recipient_id AS peer_id, id, 0 AS unread FROM messages
+            UNION ALL
+            SELECT recipient_id, sender_id, id, CASE WHEN is_read THEN 0 ELSE 1 END FROM messages
+        ) AS sides
+        GROUP BY user_id, peer_id
+    """)
+    op.execute("""
+        UPDATE conversation_summaries SET last_message_at = (
+            SELECT timestamp FROM messages WHERE messages.id = conversation_summaries.last_message_id
+        )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('conversation_summaries', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversation_summaries_inbox')
+
+    op.drop_table('conversation_summaries')
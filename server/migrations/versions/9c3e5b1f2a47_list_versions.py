@@ -0,0 +1,36 @@
+"""Change counters feeding the ETag on /groups
+
+Revision ID: 9c3e5b1f2a47
+Revises: 438cb4ce5e1b
+Create Date: 2026-10-18 21:02:14.381920
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5b1f2a47'
+down_revision = '438cb4ce5e1b'
+branch_labels = None
+depends_on = None
+
+LISTS = ['groups']
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('list_versions'):
+        return
+
+    list_versions = op.create_table('list_versions',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(list_versions, [{'name': name, 'version': 1, 'updated_at': datetime.utcnow()} for name in LISTS])
+
+
+def downgrade():
+    op.drop_table('list_versions')
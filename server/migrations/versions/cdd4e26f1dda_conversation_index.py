@@ -0,0 +1,28 @@
+"""Conversation index on messages for keyset paging
+
+Revision ID: cdd4e26f1dda
+Revises: 5a4436e1fa36
+Create Date: 2026-10-18 17:04:37.551093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cdd4e26f1dda'
+down_revision = '5a4436e1fa36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('messages')}
+    if 'ix_messages_conversation' not in indexes:
+        with op.batch_alter_table('messages', schema=None) as batch_op:
+            batch_op.create_index('ix_messages_conversation', ['sender_id', 'recipient_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_conversation')
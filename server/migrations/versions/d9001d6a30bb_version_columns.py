@@ -0,0 +1,32 @@
+"""Version columns feeding the ETags on users, groups and conversations
+
+Revision ID: d9001d6a30bb
+Revises: 7d59fe076b75
+Create Date: 2026-10-18 17:18:49.602771
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9001d6a30bb'
+down_revision = '7d59fe076b75'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ['users', 'groups', 'conversation_summaries']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in VERSIONED_TABLES:
+        if 'version' not in {c['name'] for c in inspector.get_columns(table)}:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    for table in reversed(VERSIONED_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('version')
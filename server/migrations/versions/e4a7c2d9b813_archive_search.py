@@ -0,0 +1,58 @@
+"""Full-text index over archived messages (SQLite only)
+
+Revision ID: e4a7c2d9b813
+Revises: 9c3e5b1f2a47
+Create Date: 2026-10-18 22:10:37.506114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d9b813'
+down_revision = '9c3e5b1f2a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    bind = op.get_bind()
+    exists = sa.inspect(bind).has_table('messages_archive_fts')
+    # Holds its own copy of the text: the rows are spread over many partition tables
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_archive_fts "
+        "USING fts5(content, sender_id UNINDEXED, recipient_id UNINDEXED, timestamp UNINDEXED)"
+    )
+    if exists:
+        return
+
+    # Partitions archived before this revision: the same triggers the archiver adds to new ones
+    for (name,) in bind.execute(sa.text('SELECT name FROM message_archive_partitions')):
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ai AFTER INSERT ON {name} BEGIN "
+            f"INSERT INTO messages_archive_fts(rowid, content, sender_id, recipient_id, timestamp) "
+            f"VALUES (new.id, new.content, new.sender_id, new.recipient_id, new.timestamp); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ad AFTER DELETE ON {name} BEGIN "
+            f"DELETE FROM messages_archive_fts WHERE rowid = old.id; END"
+        )
+        op.execute(
+            f"INSERT INTO messages_archive_fts(rowid, content, sender_id, recipient_id, timestamp) "
+            f"SELECT id, content, sender_id, recipient_id, timestamp FROM {name}"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    bind = op.get_bind()
+    for (name,) in bind.execute(sa.text('SELECT name FROM message_archive_partitions')):
+        op.execute(f'DROP TRIGGER IF EXISTS {name}_fts_ai')
+        op.execute(f'DROP TRIGGER IF EXISTS {name}_fts_ad')
+    op.execute('DROP TABLE IF EXISTS messages_archive_fts')
@@ -1,13 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from db_profile import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Junction table for many-to-many relationship
 user_groups = db.Table('user_groups',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('group_id', db.Integer, db.ForeignKey('groups.id'), primary_key=True),
-    db.Column('joined_at', db.DateTime, default=datetime.utcnow)
+    db.Column('joined_at', db.DateTime, default=datetime.utcnow),
+    # Read cursor: everything in the group up to this GroupMessage id has been seen
+    db.Column('last_read_message_id', db.Integer, nullable=False, default=0)
 )
 
 class User(db.Model):
@@ -17,6 +20,10 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Unread direct messages across all conversations, maintained on write
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped whenever the public profile changes; feeds the ETag on /users/<id>
+    version = db.Column(db.Integer, nullable=False, default=1)
 
 class Group(db.Model):
        __tablename__ = 'groups'
@@ -24,6 +31,8 @@ class Group(db.Model):
        name = db.Column(db.String(100), nullable=False)
        description = db.Column(db.Text)
        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+       # Bumped on edits and membership changes; feeds the ETags on /groups
+       version = db.Column(db.Integer, nullable=False, default=1)
        
        # Many-to-many relationship
        members = db.relationship('User', secondary=user_groups, backref='groups')
@@ -41,9 +50,98 @@ class Message(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     is_read = db.Column(db.Boolean, default=False)
     
+    __table_args__ = (
+        # Lets a conversation page be read as one index range per direction
+        db.Index('ix_messages_conversation', 'sender_id', 'recipient_id', 'timestamp'),
+        # Reconnect catch-up: everything delivered to a user after a given id
+        db.Index('ix_messages_recipient', 'recipient_id', 'id'),
+    )
+    
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref='received_messages')
     
     def __repr__(self):
         return f'<Message from {self.sender_id} to {self.recipient_id}>'
-    
\ No newline at end of file
+
+
+class ConversationSummary(db.Model):
+    """One row per (user, peer) pair, kept current as messages are written"""
+    __tablename__ = 'conversation_summaries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    peer_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'))
+    last_message_at = db.Column(db.DateTime)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    # Read watermark: every message from the peer up to this id has been read
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+    # Bumped whenever a message is added to or removed from the conversation
+    version = db.Column(db.Integer, nullable=False, default=1)
+    
+    __table_args__ = (
+        db.Index('ix_conversation_summaries_inbox', 'user_id', 'last_message_at'),
+    )
+    
+    peer = db.relationship('User', foreign_keys=[peer_id])
+    last_message = db.relationship('Message', foreign_keys=[last_message_id])
+    
+    def __repr__(self):
+        return f'<ConversationSummary {self.user_id} with {self.peer_id}>'
+
+
+class GroupMessage(db.Model):
+    """Stored once per message; members track what they've read via user_groups"""
+    __tablename__ = 'group_messages'
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
+    sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # History paging on (timestamp, id) and unread counts on id > cursor
+        db.Index('ix_group_messages_history', 'group_id', 'timestamp'),
+        db.Index('ix_group_messages_unread', 'group_id', 'id'),
+    )
+    
+    sender = db.relationship('User', foreign_keys=[sender_id])
+    
+    def __repr__(self):
+        return f'<GroupMessage from {self.sender_id} to group {self.group_id}>'
+
+
+class ArchivePartition(db.Model):
+    """Catalog of messages_archive_YYYYMM tables, one per calendar month of old messages"""
+    __tablename__ = 'message_archive_partitions'
+    name = db.Column(db.String(64), primary_key=True)
+    period_start = db.Column(db.DateTime, nullable=False)
+    period_end = db.Column(db.DateTime, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    # Cutoff of the latest run that archived into this table; every row here is older
+    archived_before = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ArchivePartition {self.name}>'
+
+
+class ListVersion(db.Model):
+    """Change counter for a whole listing, bumped in the same transaction as any write to it"""
+    __tablename__ = 'list_versions'
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ListVersion {self.name} {self.version}>'
+
+
+class DeliveryCursor(db.Model):
+    """Highest message ids pushed to a user's sockets, saved when a connection closes"""
+    __tablename__ = 'delivery_cursors'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    last_group_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DeliveryCursor {self.user_id}>'
+
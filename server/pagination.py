@@ -0,0 +1,63 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+def encode_cursor(timestamp, row_id):
+    """Pack a (timestamp, id) position into an opaque URL-safe string"""
+    raw = f'{timestamp.isoformat()}|{row_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor made by encode_cursor, raising ValueError if it's malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def get_page_limit(args, default, maximum):
+    """Read ?limit= and clamp it to [1, maximum]"""
+    limit = args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
+
+
+def keyset_page(branches, timestamp_col, id_col, before=None, after=None, limit=50):
+    """
+    Fetch one page of rows ordered by (timestamp, id).
+
+    `branches` is a list of queries whose results are merged, e.g. the two
+    directions of a conversation. Each branch is paged on its own so SQLite
+    can walk a single index range for it; OR-ing them together instead makes
+    it sort the whole history before applying LIMIT.
+
+    Without a cursor (or with `before`) this walks backwards from the newest
+    row; with `after` it walks forwards. Either way the page comes back in
+    ascending order, along with whether more rows exist past the far edge.
+    """
+    key = tuple_(timestamp_col, id_col)
+    position = decode_cursor(after or before) if (after or before) else None
+
+    rows = []
+    for query in branches:
+        if after:
+            query = query.filter(key > position)
+            query = query.order_by(timestamp_col.asc(), id_col.asc())
+        else:
+            if before:
+                query = query.filter(key < position)
+            query = query.order_by(timestamp_col.desc(), id_col.desc())
+        rows.extend(query.limit(limit + 1).all())
+
+    ts_key, id_key = timestamp_col.key, id_col.key
+    rows.sort(key=lambda r: (getattr(r, ts_key), getattr(r, id_key)), reverse=not after)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if not after:
+        rows.reverse()
+
+    return rows, has_more
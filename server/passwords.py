@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from blocking import blocking_pool, os_lock
+from extensions import app_service
+
+
+class HasherBusy(Exception):
+    """Raised when too many hash/check jobs are already waiting"""
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def hash_rounds(password_hash):
+    """Cost factor a bcrypt hash was made with ($2b$<rounds>$...)"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    bcrypt on a dedicated process pool.
+
+    Hashing is deliberately slow CPU work; running it in request threads lets a
+    login burst starve everything else, chat delivery included. Jobs go to
+    PASSWORD_HASH_WORKERS processes, at most PASSWORD_HASH_QUEUE_LIMIT may be in
+    flight, and anything beyond that fails fast with HasherBusy.
+
+    The servers start the workers up front with start(); anywhere else (CLI
+    commands, tests) they are only forked by the first hash or check.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 2
+        self.queue_limit = 64
+        self.rejected = 0
+        self._inflight = 0
+        self._lock = os_lock()
+        self._executor = None
+        self._dummy_hash = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = self
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.queue_limit = app.config.get('PASSWORD_HASH_QUEUE_LIMIT', self.queue_limit)
+
+    def start(self):
+        """Fork the worker processes; ideally before the server has threads of its own"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            # Fork (where available) so workers don't re-import the app
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods and os.name == 'posix' else None)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self._executor.submit(int).result()
+
+    def hash(self, password):
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        return self._run(_check_password, password_hash, password)
+
+    def check_missing(self, password):
+        """
+        check() against a throwaway hash at the current cost, for a login whose
+        account doesn't exist, so response time doesn't reveal which do. Always False.
+        """
+        dummy = self._dummy_hash
+        if dummy is None or hash_rounds(dummy) != self.rounds:
+            dummy = self._dummy_hash = self.hash(os.urandom(16).hex())
+        self.check(dummy, password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inflight': self._inflight,
+                'queue_limit': self.queue_limit,
+                'rejected': self.rejected,
+                'workers': self.workers,
+                'rounds': self.rounds
+            }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._inflight >= self.queue_limit:
+                self.rejected += 1
+                raise HasherBusy()
+            self._inflight += 1
+
+        try:
+            if self._executor is None:
+                self.start()
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        # Waits without stalling an event-loop worker meanwhile
+        return blocking_pool.wait(future)
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+
+
+password_hasher = app_service('password_hasher')
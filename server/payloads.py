@@ -0,0 +1,25 @@
+def parse_id(value):
+    """
+    A positive integer id from a socket payload, or None.
+
+    Clients send ids as ints or numeric strings (route params); anything else
+    (floats, bools, lists, 'abc') is rejected rather than passed on to a query.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, int) and value > 0:
+        return value
+    return None
+
+
+def parse_cursor(value):
+    """
+    A delivered-up-to id from a join payload: 0 (replay everything) or a positive id.
+
+    None for anything else, so a bad value counts as not sent rather than being stored.
+    """
+    if value == 0 and not isinstance(value, bool):
+        return 0
+    return parse_id(value)
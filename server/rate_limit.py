@@ -0,0 +1,93 @@
+import time
+from flask import request, session
+from flask_socketio import emit
+from metrics import socket_throttled
+from blocking import os_lock
+from extensions import app_service
+
+SWEEP_INTERVAL = 60
+
+
+class RateLimiter:
+    """
+    Per-user token buckets for socket events.
+
+    Each (event, key) pair, the key being a user (or a socket), gets `burst` tokens that refill at `per_second`;
+    an event costs one token. Buckets are created on first use and swept once
+    they would be full again, so idle users cost nothing. Events without a
+    configured limit are never throttled.
+    """
+
+    def __init__(self, app=None):
+        self.limits = {}    # event -> (burst, per_second)
+        self._buckets = {}  # (event, key) -> [tokens, updated]
+        self._lock = os_lock()
+        self._last_sweep = time.monotonic()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['message_rate_limiter'] = self
+        self.limits = {
+            'send_message': (app.config['MESSAGE_RATE_BURST'], app.config['MESSAGE_RATE_PER_SECOND']),
+            'send_group_message': (app.config['GROUP_MESSAGE_RATE_BURST'], app.config['GROUP_MESSAGE_RATE_PER_SECOND'])
+        }
+
+    def retry_after(self, event, key):
+        """Spend a token; returns 0 if there was one, else seconds until the next one"""
+        limit = self.limits.get(event)
+        if not limit or not limit[1]:
+            return 0
+        burst, per_second = limit
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get((event, key))
+            if bucket is None:
+                bucket = self._buckets[(event, key)] = [burst, now]
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * per_second)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                wait = 0
+            else:
+                wait = (1 - bucket[0]) / per_second
+
+            if now - self._last_sweep > SWEEP_INTERVAL:
+                self._sweep(now)
+        return wait
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        for key, (tokens, updated) in list(self._buckets.items()):
+            burst, per_second = self.limits[key[0]]
+            if tokens + (now - updated) * per_second >= burst:
+                del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            return {'buckets': len(self._buckets)}
+
+
+message_rate_limiter = app_service('message_rate_limiter')
+
+
+def throttle(event):
+    """
+    Inside a socket handler: True if this socket's user is over its rate for event.
+
+    Keyed on the user the socket authenticated as, never on ids in the payload
+    (which would let a client pick a fresh bucket per message); a socket
+    without a user is limited on its own sid. The client is told with a
+    rate_limited event carrying retry_after (seconds), and the drop is counted.
+    """
+    user_id = session.get('user_id')
+    key = ('user', user_id) if user_id is not None else ('sid', request.sid)
+    wait = message_rate_limiter.retry_after(event, key)
+    if not wait:
+        return False
+    socket_throttled.inc(event=event, reason='rate_limit')
+    emit('rate_limited', {'event': event, 'retry_after': round(wait, 3)})
+    return True
@@ -0,0 +1,147 @@
+import logging
+from sqlalchemy import func
+from models import db, Message, ConversationSummary
+from blocking import blocking_pool, os_lock
+from unread import adjust_unread
+from extensions import app_service
+
+logger = logging.getLogger(__name__)
+
+
+def mark_conversation_read(user_id, peer_id, up_to_id=None):
+    """
+    Mark everything peer_id sent user_id, up to up_to_id, as read.
+
+    One range UPDATE over the conversation index plus one summary update,
+    however many messages it covers. Without up_to_id the whole conversation
+    is marked. Returns (watermark, unread_count), or None if there's no
+    conversation. The caller commits.
+    """
+    summary = ConversationSummary.query.get((user_id, peer_id))
+    if not summary:
+        return None
+
+    if up_to_id is None or up_to_id > summary.last_message_id:
+        up_to_id = summary.last_message_id
+    if up_to_id <= summary.last_read_message_id:
+        return summary.last_read_message_id, summary.unread_count
+
+    marked = Message.query.filter(
+        Message.sender_id == peer_id,
+        Message.recipient_id == user_id,
+        Message.id > summary.last_read_message_id,
+        Message.id <= up_to_id,
+        Message.is_read == False
+    ).update({Message.is_read: True}, synchronize_session=False)
+
+    summary.last_read_message_id = up_to_id
+    summary.unread_count = func.max(ConversationSummary.unread_count - marked, 0)
+    adjust_unread({user_id: -marked})
+    db.session.flush()
+    return summary.last_read_message_id, summary.unread_count
+
+
+class ReadReceiptCoalescer:
+    """
+    Debounces read acknowledgements.
+
+    mark_read events are folded into one pending watermark per (reader, peer);
+    every `delay_ms` the pending set is written in one transaction and each
+    peer gets a single `messages_read` event for the furthest point reached.
+    REST callers that already wrote the watermark use notify() to share the
+    debounced event.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.delay = 0.5
+        self._pending = {}   # (reader_id, peer_id) -> [up_to_id, needs_write]
+        self._lock = os_lock()
+        self._worker_started = False
+        if app is not None and socketio is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.extensions['read_receipts'] = self
+        self.delay = app.config.get('READ_RECEIPT_DELAY_MS', 500) / 1000.0
+
+    def submit(self, reader_id, peer_id, up_to_id=None):
+        """Queue a read acknowledgement to be written and announced with the next flush"""
+        self._queue(reader_id, peer_id, up_to_id, needs_write=True)
+
+    def notify(self, reader_id, peer_id, up_to_id):
+        """Queue only the messages_read event for a watermark that's already stored"""
+        self._queue(reader_id, peer_id, up_to_id, needs_write=False)
+
+    def _queue(self, reader_id, peer_id, up_to_id, needs_write):
+        with self._lock:
+            entry = self._pending.setdefault((reader_id, peer_id), [up_to_id, needs_write])
+            if up_to_id is None or entry[0] is None:
+                entry[0] = None
+            else:
+                entry[0] = max(entry[0], up_to_id)
+            entry[1] = entry[1] or needs_write
+            start = not self._worker_started
+            self._worker_started = True
+        if start:
+            self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self.socketio.sleep(self.delay)
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        try:
+            results = blocking_pool.run_in_app_context(self._write, pending)
+        except Exception as e:
+            # Don't let one bad receipt drop everyone else's: retry them one at a time
+            logger.warning('Batch of %d read receipts failed (%s), writing them one by one', len(pending), e)
+            results = {}
+            for key, entry in pending.items():
+                try:
+                    results.update(blocking_pool.run_in_app_context(self._write, {key: entry}))
+                except Exception:
+                    logger.exception('Error writing read receipt for reader %s, peer %s', *key)
+
+        for (reader_id, peer_id), (up_to_id, unread_count) in results.items():
+            # Tell the sender their messages were read, and sync the reader's other devices
+            self.socketio.emit('messages_read', {
+                'reader_id': reader_id,
+                'sender_id': peer_id,
+                'up_to_id': up_to_id
+            }, room=f'user_{peer_id}')
+            self.socketio.emit('conversation_read', {
+                'user_id': peer_id,
+                'up_to_id': up_to_id,
+                'unread_count': unread_count
+            }, room=f'user_{reader_id}')
+
+    def _write(self, pending):
+        results = {}
+        try:
+            for (reader_id, peer_id), (up_to_id, needs_write) in pending.items():
+                if needs_write:
+                    result = mark_conversation_read(reader_id, peer_id, up_to_id)
+                else:
+                    summary = ConversationSummary.query.get((reader_id, peer_id))
+                    result = (summary.last_read_message_id, summary.unread_count) if summary else None
+                if result:
+                    results[(reader_id, peer_id)] = result
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return results
+
+
+read_receipts = app_service('read_receipts')
@@ -1,10 +1,11 @@
 from flask import request
 from flask_restful import Resource
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import create_access_token
 from models import db, User
+from directory import user_directory
+from passwords import password_hasher, HasherBusy
 
-bcrypt = Bcrypt()
+BUSY_RESPONSE = {'message': 'Server busy, please try again shortly'}, 503, {'Retry-After': '1'}
 
 class LoginResource(Resource):
     def post(self):
@@ -15,7 +16,24 @@ class LoginResource(Resource):
         
         user = User.query.filter_by(email=data['email']).first()
         
-        if user and bcrypt.check_password_hash(user.password_hash, data['password']):
+        try:
+            if user is None:
+                # As slow as a wrong password, so unknown emails can't be told apart by timing
+                valid = password_hasher.check_missing(data['password'])
+            else:
+                valid = password_hasher.check(user.password_hash, data['password'])
+        except HasherBusy:
+            return BUSY_RESPONSE
+        
+        # Cost factor changed since this hash was made: upgrade it while we have the password
+        if valid and password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(data['password'])
+                db.session.commit()
+            except HasherBusy:
+                pass  # Not worth failing the login over; it'll be upgraded next time
+        
+        if valid:
             access_token = create_access_token(identity=user.id)
             return {
                 'token': access_token,
@@ -43,7 +61,10 @@ class RegisterResource(Resource):
             return {'message': 'Username already exists'}, 400
         
         # Hash password
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        try:
+            hashed_password = password_hasher.hash(data['password'])
+        except HasherBusy:
+            return BUSY_RESPONSE
         
         # Create user
         new_user = User(
@@ -54,6 +75,7 @@ class RegisterResource(Resource):
         
         db.session.add(new_user)
         db.session.commit()
+        user_directory.add(new_user.id, new_user.username)
         
         return {
             'message': 'User created successfully',
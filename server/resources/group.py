@@ -1,31 +1,78 @@
-from flask import request
+from flask import request, current_app
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Group
+from sqlalchemy import func
+from models import db, User, Group, GroupMessage, user_groups
+from pagination import keyset_page, encode_cursor, get_page_limit
+from group_history import get_membership, unread_count, advance_read_cursor
+from directory import group_directory
+from memberships import group_memberships, unsubscribe
+from db_profile import read_only
+from etags import make_etag, etag_headers, not_modified, list_version, bump_list_version
+from serialization import rows_to_dicts
+from payloads import parse_id
 
 class GroupListResource(Resource):
     @jwt_required()
+    @read_only
     def get(self):
-        """GET /groups - Get all groups with optional search"""
+        """GET /groups - Get all groups with optional search
+        
+        ?mode=index answers ?search= from the in-memory directory index, ranked
+        exact > prefix > substring (substrings need 3+ characters). ?limit=N caps results.
+        Sends an ETag; a matching If-None-Match gets a 304 without running the listing.
+        """
         search = request.args.get('search', '')
+        mode = request.args.get('mode', 'scan')
+        
+        if mode not in ('scan', 'index'):
+            return {'message': 'mode must be scan or index'}, 400
+        
+        # Every create, delete, edit and membership change bumps this in its own transaction
+        etag = make_etag('groups', list_version('groups'), sorted(request.args.items()))
+        cached = not_modified(etag)
+        if cached:
+            return cached
         
-        if search:
-            # Search by group name (case-insensitive)
-            groups = Group.query.filter(Group.name.ilike(f'%{search}%')).all()
+        # Count members for every group in one grouped subquery instead of loading each member list
+        member_counts = db.session.query(
+            user_groups.c.group_id,
+            func.count(user_groups.c.user_id).label('member_count')
+        ).group_by(user_groups.c.group_id).subquery()
+        
+        # Only the columns emitted, as plain rows
+        query = db.session.query(
+            Group.id,
+            Group.name,
+            Group.description,
+            func.coalesce(member_counts.c.member_count, 0).label('member_count'),
+            Group.created_at
+        ).outerjoin(member_counts, member_counts.c.group_id == Group.id)
+        
+        if search and mode == 'index':
+            limit = get_page_limit(
+                request.args,
+                current_app.config['DIRECTORY_SEARCH_LIMIT'],
+                current_app.config['DIRECTORY_SEARCH_MAX']
+            )
+            ids = group_directory.search(search, limit)
+            # Primary-key lookups only, then put them back in ranked order
+            by_id = {row.id: row for row in query.filter(Group.id.in_(ids)).all()}
+            groups = [by_id[i] for i in ids if i in by_id]
         else:
-            groups = Group.query.all()
+            if search:
+                # Search by group name (case-insensitive)
+                query = query.filter(Group.name.ilike(f'%{search}%'))
+            limit = request.args.get('limit', type=int)
+            if limit:
+                query = query.limit(limit)
+            groups = query.all()
         
         return {
-            'groups': [{
-                'id': g.id,
-                'name': g.name,
-                'description': g.description,
-                'member_count': len(g.members),
-                'created_at': g.created_at.isoformat()
-            } for g in groups],
+            'groups': rows_to_dicts(groups),
             'count': len(groups),
             'search': search if search else None
-        }, 200
+        }, 200, etag_headers(etag)
         
     @jwt_required()
     def post(self):
@@ -41,7 +88,9 @@ class GroupListResource(Resource):
         )
         
         db.session.add(new_group)
+        bump_list_version('groups')
         db.session.commit()
+        group_directory.add(new_group.id, new_group.name)
         
         return {
             'message': 'Group created successfully',
@@ -56,7 +105,26 @@ class GroupListResource(Resource):
 class GroupResource(Resource):
     @jwt_required()
     def get(self, group_id):
-        """GET /groups/<id> - Get specific group"""
+        """GET /groups/<id> - Get specific group
+        
+        Sends an ETag from the group's version and its members' profile versions;
+        a matching If-None-Match gets a 304 without loading the member list.
+        """
+        version, created_at = Group.query.with_entities(
+            Group.version, Group.created_at
+        ).filter_by(id=group_id).first_or_404()
+        members = db.session.query(
+            func.count(User.id),
+            func.coalesce(func.sum(User.version), 0)
+        ).join(user_groups, user_groups.c.user_id == User.id).filter(
+            user_groups.c.group_id == group_id
+        ).one()
+        
+        etag = make_etag('group', group_id, version, created_at, *members)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         group = Group.query.get_or_404(group_id)
         
         return {
@@ -69,7 +137,7 @@ class GroupResource(Resource):
                 'id': m.id,
                 'username': m.username
             } for m in group.members]
-        }, 200
+        }, 200, etag_headers(etag)
     
     @jwt_required()
     def patch(self, group_id):
@@ -82,7 +150,10 @@ class GroupResource(Resource):
         if 'description' in data:
             group.description = data['description']
         
+        group.version = Group.version + 1
+        bump_list_version('groups')
         db.session.commit()
+        group_directory.add(group.id, group.name)
         
         return {
             'message': 'Group updated successfully',
@@ -97,8 +168,14 @@ class GroupResource(Resource):
     def delete(self, group_id):
         """DELETE /groups/<id> - Delete group"""
         group = Group.query.get_or_404(group_id)
+        GroupMessage.query.filter_by(group_id=group_id).delete()
         db.session.delete(group)
+        bump_list_version('groups')
         db.session.commit()
+        group_directory.remove(group_id)
+        group_memberships.remove_group(group_id)
+        # Nobody may keep listening to a group that no longer exists (relayed to every worker)
+        current_app.extensions['socketio'].close_room(f'group_{group_id}')
         
         return {'message': 'Group deleted successfully'}, 200
     
@@ -107,14 +184,22 @@ class GroupMembersResource(Resource):
     def post(self, group_id):
         """POST /groups/<id>/members - Join a group"""
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         group = Group.query.get_or_404(group_id)
         
-        if group in user.groups:
+        if get_membership(user_id, group_id):
             return {'message': 'Already in group'}, 400
         
-        user.groups.append(group)
+        # Start the read cursor at the newest message so existing history isn't counted as unread
+        latest_id = db.session.query(func.max(GroupMessage.id)).filter_by(group_id=group_id).scalar()
+        db.session.execute(user_groups.insert().values(
+            user_id=user_id,
+            group_id=group_id,
+            last_read_message_id=latest_id or 0
+        ))
+        group.version = Group.version + 1
+        bump_list_version('groups')
         db.session.commit()
+        group_memberships.add(user_id, group_id)
         
         return {
             'message': 'Joined group successfully',
@@ -128,13 +213,129 @@ class GroupMembersResource(Resource):
     def delete(self, group_id):
         """DELETE /groups/<id>/members - Leave a group"""
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         group = Group.query.get_or_404(group_id)
         
-        if group not in user.groups:
+        if not get_membership(user_id, group_id):
             return {'message': 'Not in group'}, 400
         
-        user.groups.remove(group)
+        db.session.execute(user_groups.delete().where(
+            (user_groups.c.user_id == user_id) & (user_groups.c.group_id == group_id)
+        ))
+        group.version = Group.version + 1
+        bump_list_version('groups')
         db.session.commit()
+        group_memberships.remove(user_id, group_id)
+        unsubscribe(current_app.extensions['socketio'], user_id, group_id)
+        
+        return {'message': 'Left group successfully'}, 200
+
+
+class GroupMessagesResource(Resource):
+    @jwt_required()
+    def get(self, group_id):
+        """GET /groups/<id>/messages - Get one page of group history
+        
+        Optional query params: ?limit=N, ?before=<cursor> for older messages,
+        ?after=<cursor> for newer ones. Without a cursor the newest page is returned.
+        """
+        user_id = get_jwt_identity()
+        group = Group.query.get_or_404(group_id)
+        
+        membership = get_membership(user_id, group_id)
+        if not membership:
+            return {'message': 'Not in group'}, 403
+        
+        before = request.args.get('before')
+        after = request.args.get('after')
+        if before and after:
+            return {'message': 'Use either before or after, not both'}, 400
+        
+        limit = get_page_limit(
+            request.args,
+            current_app.config['MESSAGE_PAGE_SIZE'],
+            current_app.config['MESSAGE_PAGE_MAX']
+        )
+        
+        # Plain rows with the sender's name joined in, instead of GroupMessage + User instances
+        query = db.session.query(
+            GroupMessage.id,
+            GroupMessage.group_id,
+            GroupMessage.sender_id,
+            func.coalesce(User.username, 'Unknown').label('sender_username'),
+            GroupMessage.content,
+            GroupMessage.timestamp
+        ).outerjoin(
+            User, User.id == GroupMessage.sender_id
+        ).filter(GroupMessage.group_id == group_id)
+        
+        try:
+            messages, has_more = keyset_page(
+                [query], GroupMessage.timestamp, GroupMessage.id,
+                before=before, after=after, limit=limit
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
         
-        return {'message': 'Left group successfully'}, 200
\ No newline at end of file
+        next_cursor = None
+        if has_more and messages:
+            edge = messages[-1] if after else messages[0]
+            next_cursor = encode_cursor(edge.timestamp, edge.id)
+        
+        latest_cursor = None
+        if messages:
+            latest_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+        elif after:
+            latest_cursor = after
+        
+        return {
+            'group': {
+                'id': group.id,
+                'name': group.name
+            },
+            'messages': [{
+                'id': m.id,
+                'group_id': m.group_id,
+                'sender_id': m.sender_id,
+                'sender_username': m.sender_username,
+                'content': m.content,
+                'timestamp': m.timestamp,
+                'is_mine': m.sender_id == user_id
+            } for m in messages],
+            'last_read_message_id': membership.last_read_message_id,
+            'unread_count': unread_count(group_id, membership.last_read_message_id),
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+            'latest_cursor': latest_cursor,
+            'limit': limit
+        }, 200
+
+
+class GroupReadResource(Resource):
+    @jwt_required()
+    def post(self, group_id):
+        """POST /groups/<id>/read - Mark group messages read up to message_id"""
+        user_id = get_jwt_identity()
+        data = request.get_json()
+        
+        if not data or not data.get('message_id'):
+            return {'message': 'message_id required'}, 400
+        
+        message_id = parse_id(data['message_id'])
+        if message_id is None:
+            return {'message': 'message_id must be a positive integer'}, 400
+        
+        membership = get_membership(user_id, group_id)
+        if not membership:
+            return {'message': 'Not in group'}, 403
+        
+        # Clamped to the group's newest message
+        advance_read_cursor(user_id, group_id, message_id)
+        db.session.commit()
+        
+        membership = get_membership(user_id, group_id)
+        return {
+            'group_id': group_id,
+            'last_read_message_id': membership.last_read_message_id,
+            'unread_count': unread_count(group_id, membership.last_read_message_id)
+        }, 200
+
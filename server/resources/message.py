@@ -1,7 +1,17 @@
-from flask import request
+from flask import request, current_app, abort
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Message, User
+from sqlalchemy.orm import aliased
+from models import db, Message, User, ConversationSummary
+from conversations import record_message, forget_message
+from search import search_messages, search_groups
+from read_receipts import mark_conversation_read, read_receipts
+from user_cache import user_cache
+from pagination import encode_cursor, get_page_limit, keyset_page
+from payloads import parse_id
+from archive import conversation_page, archive_tables, find_archived, delete_archived
+from db_profile import read_only
+from etags import make_etag, etag_headers, not_modified
 
 class MessageListResource(Resource):
     @jwt_required()
@@ -12,27 +22,51 @@ class MessageListResource(Resource):
         # Get optional date parameters
         days = request.args.get('days', type=int)  # e.g., ?days=7 for last 7 days
         
-        query = Message.query.filter(
-            (Message.sender_id == user_id) | (Message.recipient_id == user_id)
-        )
-        
-        # Filter by date if provided
+        cutoff_date = None
         if days:
             from datetime import datetime, timedelta
             cutoff_date = datetime.utcnow() - timedelta(days=days)
-            query = query.filter(Message.timestamp >= cutoff_date)
         
-        messages = query.order_by(Message.timestamp.desc()).all()
+        # Just the emitted columns, usernames joined in, as plain rows (no ORM instances).
+        # The hot table, then any archive partition the date filter reaches
+        sender = aliased(User)
+        recipient = aliased(User)
+        messages = []
+        for table in [Message.__table__] + archive_tables(cutoff_date):
+            query = db.session.query(
+                table.c.id,
+                table.c.sender_id,
+                sender.username.label('sender_username'),
+                table.c.recipient_id,
+                recipient.username.label('recipient_username'),
+                table.c.content,
+                table.c.timestamp,
+                table.c.is_read
+            ).outerjoin(
+                sender, sender.id == table.c.sender_id
+            ).outerjoin(
+                recipient, recipient.id == table.c.recipient_id
+            ).filter(
+                (table.c.sender_id == user_id) | (table.c.recipient_id == user_id)
+            )
+            
+            # Filter by date if provided
+            if cutoff_date:
+                query = query.filter(table.c.timestamp >= cutoff_date)
+            
+            messages.extend(query.all())
+        
+        messages.sort(key=lambda m: (m.timestamp, m.id), reverse=True)
         
         return {
             'messages': [{
                 'id': m.id,
                 'sender_id': m.sender_id,
-                'sender_username': m.sender.username,
+                'sender_username': m.sender_username,
                 'recipient_id': m.recipient_id,
-                'recipient_username': m.recipient.username,
+                'recipient_username': m.recipient_username,
                 'content': m.content,
-                'timestamp': m.timestamp.isoformat(),
+                'timestamp': m.timestamp,
                 'is_read': m.is_read,
                 'is_mine': m.sender_id == user_id
             } for m in messages],
@@ -50,7 +84,7 @@ class MessageListResource(Resource):
             return {'message': 'Missing required fields'}, 400
         
         # Validate recipient exists
-        recipient = User.query.get(data['recipient_id'])
+        recipient = user_cache.get(data['recipient_id'])
         if not recipient:
             return {'message': 'Recipient not found'}, 404
         
@@ -65,6 +99,8 @@ class MessageListResource(Resource):
         )
         
         db.session.add(new_message)
+        db.session.flush()
+        record_message(new_message)
         db.session.commit()
         
         return {
@@ -81,46 +117,274 @@ class MessageListResource(Resource):
 
 class ConversationResource(Resource):
     @jwt_required()
+    @read_only
     def get(self, other_user_id):
-        """GET /users/<id>/messages - Get conversation with specific user"""
+        """GET /users/<id>/messages - Get one page of the conversation with a specific user
+        
+        Optional query params: ?limit=N, ?before=<cursor> for older messages,
+        ?after=<cursor> for newer ones. Without a cursor the newest page is returned.
+        Sends an ETag; a matching If-None-Match gets a 304 from one summary lookup.
+        """
         user_id = get_jwt_identity()
         
         # Validate other user exists
-        other_user = User.query.get(other_user_id)
+        other_user = user_cache.get(other_user_id)
         if not other_user:
             return {'message': 'User not found'}, 404
         
-        messages = Message.query.filter(
-            ((Message.sender_id == user_id) & (Message.recipient_id == other_user_id)) |
-            ((Message.sender_id == other_user_id) & (Message.recipient_id == user_id))
-        ).order_by(Message.timestamp.asc()).all()
+        before = request.args.get('before')
+        after = request.args.get('after')
+        if before and after:
+            return {'message': 'Use either before or after, not both'}, 400
+        
+        limit = get_page_limit(
+            request.args,
+            current_app.config['MESSAGE_PAGE_SIZE'],
+            current_app.config['MESSAGE_PAGE_MAX']
+        )
+        
+        # The summary's version moves on every insert or delete in the conversation;
+        # last_message_at keeps a recreated summary from matching an old ETag
+        summary = db.session.query(
+            ConversationSummary.version,
+            ConversationSummary.last_message_id,
+            ConversationSummary.last_message_at
+        ).filter_by(user_id=user_id, peer_id=other_user_id).first()
+        etag = make_etag(
+            'conversation', user_id, other_user_id, other_user['username'],
+            tuple(summary) if summary else None, before, after, limit
+        )
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
+        # One range scan on ix_messages_conversation per direction, as plain column rows.
+        # Archive partitions are only read once the page runs past the archive boundary
+        try:
+            messages, has_more = conversation_page(
+                user_id, other_user_id, ('id', 'sender_id', 'content', 'timestamp'),
+                before=before, after=after, limit=limit
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        
+        # Keep paging in the direction we came from: older for before/no cursor, newer for after
+        next_cursor = None
+        if has_more and messages:
+            edge = messages[-1] if after else messages[0]
+            next_cursor = encode_cursor(edge.timestamp, edge.id)
+        
+        # Cursor a client can poll with ?after= to pick up anything newer
+        latest_cursor = None
+        if messages:
+            latest_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+        elif after:
+            latest_cursor = after
         
         return {
             'conversation_with': {
-                'id': other_user.id,
-                'username': other_user.username
+                'id': other_user['id'],
+                'username': other_user['username']
             },
             'messages': [{
                 'id': m.id,
                 'sender_id': m.sender_id,
                 'content': m.content,
-                'timestamp': m.timestamp.isoformat(),
+                'timestamp': m.timestamp,
                 'is_mine': m.sender_id == user_id
-            } for m in messages]
-        }, 200
+            } for m in messages],
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+            'latest_cursor': latest_cursor,
+            'limit': limit
+        }, 200, etag_headers(etag)
     
+class UnreadCountResource(Resource):
+    @jwt_required()
+    def get(self):
+        """GET /unread - Unread direct message count for the dashboard badge"""
+        user_id = get_jwt_identity()
+        
+        # Maintained on write, so this is a primary-key lookup
+        unread_count = db.session.query(User.unread_count).filter(User.id == user_id).scalar()
+        if unread_count is None:
+            return {'message': 'User not found'}, 404
+        
+        return {'unread_count': unread_count}, 200
+
+
+class ConversationReadResource(Resource):
+    @jwt_required()
+    def post(self, other_user_id):
+        """POST /users/<id>/messages/read - Mark messages from a user as read
+        
+        Optional body: {"up_to_id": N}. Without it the whole conversation is marked.
+        """
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        up_to_id = data.get('up_to_id')
+        
+        if up_to_id is not None:
+            up_to_id = parse_id(up_to_id)
+            if up_to_id is None:
+                return {'message': 'up_to_id must be a positive integer'}, 400
+        
+        result = mark_conversation_read(user_id, other_user_id, up_to_id)
+        if result is None:
+            return {'message': 'Conversation not found'}, 404
+        db.session.commit()
+        
+        last_read_message_id, unread_count = result
+        # The sender hears about it through the debounced messages_read event
+        read_receipts.notify(user_id, other_user_id, last_read_message_id)
+        
+        return {
+            'user_id': other_user_id,
+            'last_read_message_id': last_read_message_id,
+            'unread_count': unread_count
+        }, 200
+
+
+class MessageSearchResource(Resource):
+    @jwt_required()
+    def get(self):
+        """GET /messages/search?q=term - Full-text search over the current user's messages
+        
+        Covers direct messages the user sent or received and messages in groups they
+        belong to, best match first. Paginate with ?limit=N&offset=M.
+        """
+        user_id = get_jwt_identity()
+        query = request.args.get('q', '').strip()
+        
+        if not query:
+            return {'message': 'Search query required'}, 400
+        
+        limit = get_page_limit(
+            request.args,
+            current_app.config['MESSAGE_PAGE_SIZE'],
+            current_app.config['MESSAGE_PAGE_MAX']
+        )
+        offset = max(0, request.args.get('offset', 0, type=int))
+        
+        hits, has_more = search_messages(user_id, query, limit, offset)
+        groups = search_groups(query, limit) if offset == 0 else []
+        
+        return {
+            'messages': [{
+                'id': h['id'],
+                'type': h['type'],
+                'sender_id': h['sender_id'],
+                'recipient_id': h['recipient_id'],
+                'group_id': h['group_id'],
+                'content': h['content'],
+                'snippet': h['snippet'],
+                'timestamp': h['timestamp'].isoformat(),
+                'is_mine': h['sender_id'] == user_id
+            } for h in hits],
+            'groups': [{
+                'id': g['id'],
+                'name': g['name'],
+                'description': g['description']
+            } for g in groups],
+            'count': len(hits),
+            'has_more': has_more,
+            'limit': limit,
+            'offset': offset,
+            'search': query
+        }, 200
+
+
+class ConversationListResource(Resource):
+    @jwt_required()
+    def get(self):
+        """GET /conversations - Get the current user's conversations, most recent first
+        
+        Optional query params: ?limit=N, ?before=<cursor> for the page after the previous one.
+        """
+        user_id = get_jwt_identity()
+        
+        limit = get_page_limit(
+            request.args,
+            current_app.config['MESSAGE_PAGE_SIZE'],
+            current_app.config['MESSAGE_PAGE_MAX']
+        )
+        
+        # Reads only the summary rows, so cost tracks number of conversations, not messages.
+        # Selects just the columns emitted, as plain rows rather than three ORM objects each
+        query = db.session.query(
+            ConversationSummary.peer_id,
+            User.username,
+            ConversationSummary.unread_count,
+            ConversationSummary.last_message_at,
+            Message.id,
+            Message.sender_id,
+            Message.content,
+            Message.timestamp
+        ).outerjoin(
+            User, User.id == ConversationSummary.peer_id
+        ).outerjoin(
+            Message, Message.id == ConversationSummary.last_message_id
+        ).filter(
+            ConversationSummary.user_id == user_id
+        )
+        
+        # Keyset paging on (last_message_at, peer_id), newest first, walking ix_conversation_summaries_inbox
+        try:
+            summaries, has_more = keyset_page(
+                [query], ConversationSummary.last_message_at, ConversationSummary.peer_id,
+                before=request.args.get('before'), limit=limit
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        summaries.reverse()
+        
+        next_cursor = None
+        if has_more and summaries:
+            next_cursor = encode_cursor(summaries[-1].last_message_at, summaries[-1].peer_id)
+        
+        return {
+            'conversations': [{
+                'user': {
+                    'id': s.peer_id,
+                    'username': s.username
+                },
+                'last_message': {
+                    'id': s.id,
+                    'sender_id': s.sender_id,
+                    'content': s.content,
+                    'timestamp': s.timestamp,
+                    'is_mine': s.sender_id == user_id
+                } if s.id else None,
+                'unread_count': s.unread_count
+            } for s in summaries],
+            'count': len(summaries),
+            'has_more': has_more,
+            'next_cursor': next_cursor
+        }, 200
+
+
 class MessageResource(Resource):
     @jwt_required()
     def delete(self, message_id):
         """DELETE /messages/<id> - Delete message"""
         user_id = get_jwt_identity()
-        message = Message.query.get_or_404(message_id)
+        message = db.session.get(Message, message_id)
+        partition = None
+        if message is None:
+            # Not in the hot table: it may have been archived
+            partition, message = find_archived(message_id) or (None, None)
+            if message is None:
+                abort(404)
         
         # Only sender can delete their message
         if message.sender_id != user_id:
             return {'message': 'Unauthorized'}, 403
         
-        db.session.delete(message)
+        forget_message(message)
+        if partition is None:
+            db.session.delete(message)
+        else:
+            delete_archived(partition, message_id)
         db.session.commit()
         
         return {'message': 'Message deleted successfully'}, 200
\ No newline at end of file
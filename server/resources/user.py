@@ -1,26 +1,55 @@
-from flask import request
+from flask import request, current_app
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User
+from models import db, User, Group, user_groups
+from user_cache import user_cache
+from directory import user_directory
+from memberships import group_memberships
+from pagination import get_page_limit
+from auth_cache import jwt_manager
+from etags import make_etag, etag_headers, not_modified, bump_list_version
+from serialization import rows_to_dicts
+from db_profile import read_only
 
 class UserListResource(Resource):
     @jwt_required()
+    @read_only
     def get(self):
-        """GET /users - Get all users with optional search"""
+        """GET /users - Get all users with optional search
+        
+        ?mode=index answers ?search= from the in-memory directory index, ranked
+        exact > prefix > substring (substrings need 3+ characters). ?limit=N caps results.
+        """
         search = request.args.get('search', '')
+        mode = request.args.get('mode', 'scan')
+        
+        if mode not in ('scan', 'index'):
+            return {'message': 'mode must be scan or index'}, 400
         
-        if search:
-            # Search by username (case-insensitive)
-            users = User.query.filter(User.username.ilike(f'%{search}%')).all()
+        # Only the emitted columns, as plain rows: no identity map, no password_hash
+        query = db.session.query(User.id, User.username, User.email)
+        
+        if search and mode == 'index':
+            limit = get_page_limit(
+                request.args,
+                current_app.config['DIRECTORY_SEARCH_LIMIT'],
+                current_app.config['DIRECTORY_SEARCH_MAX']
+            )
+            ids = user_directory.search(search, limit)
+            # Primary-key lookups only, then put them back in ranked order
+            by_id = {u.id: u for u in query.filter(User.id.in_(ids)).all()}
+            users = [by_id[i] for i in ids if i in by_id]
         else:
-            users = User.query.all()
+            if search:
+                # Search by username (case-insensitive)
+                query = query.filter(User.username.ilike(f'%{search}%'))
+            limit = request.args.get('limit', type=int)
+            if limit:
+                query = query.limit(limit)
+            users = query.all()
         
         return {
-            'users': [{
-                'id': u.id,
-                'username': u.username,
-                'email': u.email
-            } for u in users],
+            'users': rows_to_dicts(users),
             'count': len(users),
             'search': search if search else None
         }, 200    
@@ -29,14 +58,27 @@ class UserListResource(Resource):
 class UserResource(Resource):
     @jwt_required()
     def get(self, user_id):
-        """GET /users/<id> - Get specific user (protected route)"""
+        """GET /users/<id> - Get specific user (protected route)
+        
+        Sends an ETag; a matching If-None-Match gets a 304 from a one-column lookup.
+        """
+        # created_at too, so a reused id never matches an old ETag
+        version, created_at = User.query.with_entities(
+            User.version, User.created_at
+        ).filter_by(id=user_id).first_or_404()
+        
+        etag = make_etag('user', user_id, version, created_at)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         user = User.query.get_or_404(user_id)
         return {
             'id': user.id,
             'username': user.username,
             'email': user.email,
             'created_at': user.created_at.isoformat()
-        }, 200
+        }, 200, etag_headers(etag)
     
     @jwt_required()
     def patch(self, user_id):
@@ -64,7 +106,10 @@ class UserResource(Resource):
                 return {'message': 'Email already taken'}, 400
             user.email = data['email']
         
+        user.version = User.version + 1
         db.session.commit()
+        user_cache.invalidate(user_id)
+        user_directory.add(user.id, user.username)
         
         return {
             'message': 'User updated successfully',
@@ -85,7 +130,17 @@ class UserResource(Resource):
             return {'message': 'Unauthorized'}, 403
         
         user = User.query.get_or_404(user_id)
+        # Their memberships go with them (through Group.members), so the groups they were in change
+        left = Group.query.filter(
+            Group.id.in_(db.session.query(user_groups.c.group_id).filter(user_groups.c.user_id == user_id))
+        ).update({'version': Group.version + 1}, synchronize_session=False)
+        if left:
+            bump_list_version('groups')
         db.session.delete(user)
         db.session.commit()
+        # Also drops the profile from user_cache
+        jwt_manager.revoke_identity(user_id)
+        user_directory.remove(user_id)
+        group_memberships.remove_user(user_id)
         
         return {'message': 'User deleted successfully'}, 200
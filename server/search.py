@@ -0,0 +1,112 @@
+from sqlalchemy import text
+from models import db
+
+# messages_fts, group_messages_fts and groups_fts are external-content FTS5 tables
+# created (with their sync triggers) by migration 50553ba329d5_full_text_search.
+# messages_archive_fts (e4a7c2d9b813_archive_search) holds archived messages' text.
+
+
+def index_archive_partition(name):
+    """
+    Keep messages_archive_fts in step with an archive partition, as the hot
+    table's triggers do for messages_fts. Called when the partition is created.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO messages_archive_fts(rowid, content, sender_id, recipient_id, timestamp) "
+        f"VALUES (new.id, new.content, new.sender_id, new.recipient_id, new.timestamp); END"
+    ))
+    connection.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS {name}_fts_ad AFTER DELETE ON {name} BEGIN "
+        f"DELETE FROM messages_archive_fts WHERE rowid = old.id; END"
+    ))
+
+
+def build_match_query(raw):
+    """
+    Turn free text from a user into a safe FTS5 MATCH expression.
+
+    Every term is quoted so punctuation can't be read as query syntax, terms
+    are ANDed, and the last one is a prefix so partially typed words match.
+    """
+    terms = [t.replace('"', '""') for t in raw.split() if t.strip('"')]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_messages(user_id, raw_query, limit, offset=0):
+    """
+    Ranked hits across direct messages the user sent or received, archived
+    ones included, and messages in groups they belong to. Returns (hits,
+    has_more), best match first.
+    """
+    match = build_match_query(raw_query)
+    if not match:
+        return [], False
+
+    # Pull enough from each source to cover this page, then merge by rank
+    window = offset + limit + 1
+    params = {'match': match, 'user_id': user_id, 'window': window}
+
+    direct = db.session.execute(text("""
+        SELECT m.id, m.sender_id, m.recipient_id, NULL AS group_id, m.content, m.timestamp,
+               bm25(messages_fts) AS rank,
+               snippet(messages_fts, 0, '[', ']', '...', 12) AS snippet
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        WHERE messages_fts MATCH :match
+          AND (m.sender_id = :user_id OR m.recipient_id = :user_id)
+        ORDER BY rank
+        LIMIT :window
+    """).columns(timestamp=db.DateTime), params).mappings().all()
+
+    # Archived direct messages: the index carries the columns, since the rows are spread over partitions
+    archived = db.session.execute(text("""
+        SELECT a.rowid AS id, a.sender_id, a.recipient_id, NULL AS group_id, a.content, a.timestamp,
+               bm25(messages_archive_fts) AS rank,
+               snippet(messages_archive_fts, 0, '[', ']', '...', 12) AS snippet
+        FROM messages_archive_fts a
+        WHERE messages_archive_fts MATCH :match
+          AND (a.sender_id = :user_id OR a.recipient_id = :user_id)
+        ORDER BY rank
+        LIMIT :window
+    """).columns(timestamp=db.DateTime), params).mappings().all()
+
+    group = db.session.execute(text("""
+        SELECT gm.id, gm.sender_id, NULL AS recipient_id, gm.group_id, gm.content, gm.timestamp,
+               bm25(group_messages_fts) AS rank,
+               snippet(group_messages_fts, 0, '[', ']', '...', 12) AS snippet
+        FROM group_messages_fts
+        JOIN group_messages gm ON gm.id = group_messages_fts.rowid
+        JOIN user_groups ug ON ug.group_id = gm.group_id AND ug.user_id = :user_id
+        WHERE group_messages_fts MATCH :match
+        ORDER BY rank
+        LIMIT :window
+    """).columns(timestamp=db.DateTime), params).mappings().all()
+
+    hits = [dict(row, type='direct') for row in direct + archived] + [dict(row, type='group') for row in group]
+    hits.sort(key=lambda h: h['rank'])
+    page = hits[offset:offset + limit]
+    return page, len(hits) > offset + limit
+
+
+def search_groups(raw_query, limit):
+    """Groups whose name or description match, best match first"""
+    match = build_match_query(raw_query)
+    if not match:
+        return []
+
+    return db.session.execute(text("""
+        SELECT g.id, g.name, g.description, bm25(groups_fts) AS rank
+        FROM groups_fts
+        JOIN groups g ON g.id = groups_fts.rowid
+        WHERE groups_fts MATCH :match
+        ORDER BY rank
+        LIMIT :limit
+    """), {'match': match, 'limit': limit}).mappings().all()
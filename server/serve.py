@@ -0,0 +1,29 @@
+"""
+Production entry point: `python serve.py`
+
+Runs the app on an event-loop server (eventlet by default, or gevent with
+MESSAGEME_ASYNC_MODE=gevent) so idle websockets cost a greenlet each instead of an OS
+thread. Blocking work goes through blocking.blocking_pool. `python app.py`
+is still the debug server for development. Run `flask --app app db upgrade`
+before the first start and after every deploy that adds a migration.
+"""
+import os
+
+os.environ.setdefault('MESSAGEME_ASYNC_MODE', 'eventlet')
+
+# Sockets, threads and time must be patched before anything else imports them
+if os.environ['MESSAGEME_ASYNC_MODE'] == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif os.environ['MESSAGEME_ASYNC_MODE'] == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import create_app, start_background_tasks
+
+app = create_app()
+socketio = app.extensions['socketio']
+
+if __name__ == '__main__':
+    start_background_tasks(app)
+    socketio.run(app, host=app.config['HOST'], port=app.config['PORT'])
@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+import pytest
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+from sqlalchemy import event
+from app import create_app
+from models import db, User, Message
+from conversations import record_messages
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on its own migrated SQLite file, with background work left to the test"""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'ASYNC_MODE': 'threading',
+        'SOCKETIO_MESSAGE_QUEUE': None,
+        'LOG_LEVEL': 'WARNING',
+        'BCRYPT_LOG_ROUNDS': 4,
+        'PASSWORD_HASH_WORKERS': 1,
+        'MESSAGE_RETENTION_DAYS': 0,
+        # Flushed explicitly by the tests rather than on a timer
+        'MESSAGE_BATCH_INTERVAL_MS': 60000,
+        'READ_RECEIPT_DELAY_MS': 60000
+    })
+    with app.app_context():
+        upgrade()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+        if 'db_read_engine' in app.extensions:
+            app.extensions['db_read_engine'].dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def socket_client(app):
+    """socket_client(user_id) connects a Socket.IO test client authenticated as user_id"""
+    clients = []
+
+    def connect(user_id=None, **kwargs):
+        if user_id is not None:
+            kwargs.setdefault('auth', {'token': create_access_token(identity=user_id)})
+        socket = app.extensions['socketio'].test_client(app, **kwargs)
+        clients.append(socket)
+        return socket
+
+    yield connect
+    for socket in clients:
+        if socket.is_connected():
+            socket.disconnect()
+
+
+@pytest.fixture
+def make_user(app):
+    """make_user(name) -> (user_id, auth headers), without going through bcrypt"""
+    def make(username):
+        user = User(username=username, email=f'{username}@example.com', password_hash='x' * 60)
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=user.id)
+        return user.id, {'Authorization': f'Bearer {token}'}
+    return make
+
+
+@pytest.fixture
+def make_messages(app):
+    """make_messages([(sender_id, recipient_id, content, timestamp)]) -> ids, summaries included"""
+    def make(rows):
+        messages = [
+            Message(sender_id=sender_id, recipient_id=recipient_id, content=content, timestamp=timestamp)
+            for sender_id, recipient_id, content, timestamp in rows
+        ]
+        db.session.add_all(messages)
+        db.session.flush()
+        record_messages(messages)
+        db.session.commit()
+        return [m.id for m in messages]
+    return make
+
+
+@pytest.fixture
+def queries(app):
+    """
+    `with queries() as statements:` collects every SQL statement the app runs
+    in the block, on the primary and read-only pools alike.
+    """
+    engines = [db.engine]
+    if 'db_read_engine' in app.extensions:
+        engines.append(app.extensions['db_read_engine'])
+
+    @contextmanager
+    def capture():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            for engine in engines:
+                event.remove(engine, 'before_cursor_execute', record)
+
+    return capture
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from archive import archive_messages
+from models import db, Message, ArchivePartition
+from unread import reconcile_unread_counts
+
+
+def walk_back(client, headers, peer, limit):
+    """Every message of the conversation, oldest first, paged with `before`"""
+    seen = []
+    page = client.get(f'/users/{peer}/messages', headers=headers, query_string={'limit': limit}).get_json()
+    while True:
+        seen = [m['id'] for m in page['messages']] + seen
+        if not page['has_more']:
+            return seen
+        page = client.get(f'/users/{peer}/messages', headers=headers,
+                          query_string={'limit': limit, 'before': page['next_cursor']}).get_json()
+
+
+def mark_read(client, headers, peer, up_to_id=None):
+    body = {'up_to_id': up_to_id} if up_to_id else {}
+    return client.post(f'/users/{peer}/messages/read', headers=headers, json=body).get_json()
+
+
+def test_paging_merges_hot_table_and_archive(client, make_user, make_messages):
+    alice, headers = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    # Three months of history, then a few recent messages
+    start = datetime(2025, 1, 20)
+    rows = [((alice, bob) if i % 2 else (bob, alice)) + (f'old {i}', start + timedelta(days=i * 2)) for i in range(30)]
+    rows += [(alice, bob, f'new {i}', datetime.utcnow() - timedelta(minutes=10 - i)) for i in range(5)]
+    ids = make_messages(rows)
+
+    before = walk_back(client, headers, bob, limit=7)
+    assert before == ids
+
+    mark_read(client, headers, bob)
+    mark_read(client, bob_headers, alice)
+    moved = archive_messages(datetime(2025, 6, 1), batch_size=8)
+    assert moved == 30
+    assert Message.query.count() == 5
+    assert sorted(p.name for p in ArchivePartition.query) == [
+        'messages_archive_202501', 'messages_archive_202502', 'messages_archive_202503'
+    ]
+
+    # Same messages, in the same order, with pages straddling the hot table and every partition
+    for limit in (1, 4, 7, 50):
+        assert walk_back(client, headers, bob, limit) == ids
+
+
+def test_summary_message_stays_in_the_hot_table(client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    ids = make_messages([(alice, bob, f'old {i}', datetime(2025, 1, 1) + timedelta(hours=i)) for i in range(3)])
+    mark_read(client, bob_headers, alice)
+
+    assert archive_messages(datetime(2025, 6, 1)) == 2
+    # The inbox preview still points at a live row
+    assert [m.id for m in Message.query] == [ids[-1]]
+    assert db.session.get(ArchivePartition, 'messages_archive_202501').message_count == 2
+
+
+def test_unread_messages_stay_in_the_hot_table(client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    ids = make_messages([(alice, bob, f'old {i}', datetime(2025, 1, 1) + timedelta(hours=i)) for i in range(4)])
+    mark_read(client, bob_headers, alice, up_to_id=ids[0])
+
+    assert archive_messages(datetime(2025, 6, 1)) == 1
+    assert sorted(m.id for m in Message.query) == ids[1:]
+
+    # So marking the rest read and recounting both see every unread message
+    assert mark_read(client, bob_headers, alice)['unread_count'] == 0
+    assert Message.query.filter_by(is_read=False).count() == 0
+    assert reconcile_unread_counts() == 0
+
+
+def test_archived_messages_are_listed_and_deletable(client, make_user, make_messages):
+    alice, headers = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    ids = make_messages([(alice, bob, f'old {i}', datetime(2025, 1, 1) + timedelta(hours=i)) for i in range(4)])
+    mark_read(client, bob_headers, alice)
+    assert archive_messages(datetime(2025, 6, 1)) == 3
+
+    listed = client.get('/messages', headers=bob_headers).get_json()
+    assert [m['id'] for m in listed['messages']] == ids[::-1]
+    assert client.get('/messages?days=30', headers=bob_headers).get_json()['count'] == 0
+
+    assert client.delete(f'/messages/{ids[0]}', headers=bob_headers).status_code == 403
+    assert client.delete(f'/messages/{ids[0]}', headers=headers).status_code == 200
+    assert client.delete(f'/messages/{ids[0]}', headers=headers).status_code == 404
+    assert [m['id'] for m in client.get('/messages', headers=headers).get_json()['messages']] == ids[:0:-1]
+    assert db.session.get(ArchivePartition, 'messages_archive_202501').message_count == 2
+
+    # Deleting the last hot message brings the newest archived one back for the inbox preview
+    assert client.delete(f'/messages/{ids[3]}', headers=headers).status_code == 200
+    inbox = client.get('/conversations', headers=bob_headers).get_json()['conversations']
+    assert inbox[0]['last_message']['id'] == ids[2]
+    assert [m.id for m in Message.query] == [ids[2]]
+    assert walk_back(client, headers, bob, limit=1) == ids[1:3]
+
+
+def test_archived_messages_stay_searchable(client, make_user, make_messages):
+    alice, headers = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    _, carol_headers = make_user('carol')
+    ids = make_messages([(alice, bob, f'walrus {i}', datetime(2025, 1, 1) + timedelta(hours=i)) for i in range(4)])
+    mark_read(client, bob_headers, alice)
+
+    def search(headers):
+        hits = client.get('/messages/search?q=walrus', headers=headers).get_json()['messages']
+        return sorted(h['id'] for h in hits)
+
+    assert archive_messages(datetime(2025, 6, 1)) == 3
+    # Each message found once, whether it's hot or archived, and only by its own conversation
+    assert search(headers) == search(bob_headers) == ids
+    assert search(carol_headers) == []
+    hit = client.get('/messages/search?q=walrus', headers=headers).get_json()['messages'][-1]
+    assert hit['snippet'].startswith('[walrus]') and hit['type'] == 'direct'
+
+    assert client.delete(f'/messages/{ids[0]}', headers=headers).status_code == 200
+    # Unarchives ids[2] for the inbox preview
+    assert client.delete(f'/messages/{ids[3]}', headers=headers).status_code == 200
+    assert search(headers) == ids[1:3]
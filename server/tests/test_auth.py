@@ -0,0 +1,21 @@
+from passwords import hash_rounds
+
+
+def test_unknown_email_costs_a_password_check(app, client, monkeypatch):
+    hasher = app.extensions['password_hasher']
+    check = hasher.check
+    checked = []
+
+    def record(password_hash, password):
+        checked.append(hash_rounds(password_hash))
+        return check(password_hash, password)
+
+    monkeypatch.setattr(hasher, 'check', record)
+    assert client.post('/auth/register', json={
+        'username': 'alice', 'email': 'alice@example.com', 'password': 'secret'}).status_code == 201
+
+    for email in ('alice@example.com', 'nobody@example.com', 'nobody@example.com'):
+        response = client.post('/auth/login', json={'email': email, 'password': 'wrong'})
+        assert response.get_json() == {'message': 'Invalid credentials'}
+    # Same bcrypt work, at the current cost, whether or not the account exists
+    assert checked == [hasher.rounds] * 3
@@ -0,0 +1,16 @@
+from benchmarks.load import compare
+
+BASELINE = {'results': {'send': {'throughput_per_s': 100, 'p50_ms': 1, 'p99_ms': 10}}}
+
+
+def test_baseline_without_fail_over_only_reports():
+    results = {'send': {'throughput_per_s': 50, 'p50_ms': 2, 'p99_ms': 30}}
+    assert compare(results, BASELINE, None) == []
+    assert results['send']['vs_baseline'] == {
+        'throughput_per_s_change_pct': -50.0, 'p50_ms_change_pct': 100.0, 'p99_ms_change_pct': 200.0
+    }
+
+
+def test_fail_over_flags_throughput_and_p99():
+    results = {'send': {'throughput_per_s': 50, 'p50_ms': 2, 'p99_ms': 11}}
+    assert compare(results, BASELINE, 15) == ['send throughput_per_s -50.0%']
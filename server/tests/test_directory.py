@@ -0,0 +1,38 @@
+from directory import DirectoryIndex
+
+
+def test_index_reloads_once_stale():
+    rows = [(1, 'alice')]
+    index = DirectoryIndex(ttl=60)
+    index.set_loader(lambda: list(rows))
+    assert index.search('ali', 10) == [1]
+
+    # Created on another worker: not in this index until it's reloaded
+    rows.append((2, 'alison'))
+    assert index.search('ali', 10) == [1]
+    index.ttl = 0
+    assert index.search('ali', 10) == [1, 2]
+
+
+def test_changes_made_while_the_index_reloads_are_kept():
+    index = DirectoryIndex(ttl=0)
+
+    def loader():
+        # Committed here after these rows were read
+        index.add(3, 'carol')
+        index.remove(2)
+        return [(1, 'alice'), (2, 'bob')]
+
+    index.set_loader(loader)
+    assert index.search('carol', 10) == [3]
+    assert index.search('bob', 10) == []
+    assert index.search('alice', 10) == [1]
+
+
+def test_substring_matches_come_in_name_order():
+    index = DirectoryIndex()
+    index.load([(i, f'{name}-smith') for i, name in enumerate(['zed', 'amy', 'kim', 'bob', 'eve'])])
+    index.add(9, 'smith')
+    # Exact first, then substrings by name, cut at the limit
+    assert index.search('smith', 3) == [9, 1, 3]
+    assert index.search('smith', 10) == [9, 1, 3, 4, 2, 0]
@@ -0,0 +1,179 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from models import db, Group, user_groups
+
+eventlet = pytest.importorskip('eventlet')
+socketio = pytest.importorskip('socketio')
+requests = pytest.importorskip('requests')
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = 6
+DIRECT_MESSAGES = 40
+GROUP_MESSAGES = 10
+
+
+# serve.py, with a hook that logs every wait on a green lock from a thread other than the
+# event loop's: that's a blocking-pool job that can hang, whether or not it does this run
+SERVE = '''
+import runpy, sys, traceback
+import eventlet
+eventlet.monkey_patch()
+from eventlet import patcher
+from eventlet.hubs import hub
+
+get_ident = patcher.original('_thread').get_ident
+main_thread = get_ident()
+switch = hub.BaseHub.switch
+
+def checked_switch(self):
+    if get_ident() != main_thread:
+        sys.stderr.write('Green wait on a pool thread\\n' + ''.join(traceback.format_stack()))
+    return switch(self)
+
+hub.BaseHub.switch = checked_switch
+sys.path.insert(0, '.')
+runpy.run_path('serve.py', run_name='__main__')
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server(app, tmp_path):
+    """serve.py on eventlet, against the app fixture's database; yields (base url, log path)"""
+    port = free_port()
+    log_path = tmp_path / 'server.log'
+    env = dict(os.environ,
+               MESSAGEME_ASYNC_MODE='eventlet',
+               MESSAGEME_SQLALCHEMY_DATABASE_URI=app.config['SQLALCHEMY_DATABASE_URI'],
+               MESSAGEME_HOST='127.0.0.1',
+               MESSAGEME_PORT=str(port),
+               MESSAGEME_BCRYPT_LOG_ROUNDS='4',
+               MESSAGEME_PASSWORD_HASH_WORKERS='1',
+               MESSAGEME_MESSAGE_RATE_BURST='1000',
+               MESSAGEME_GROUP_MESSAGE_RATE_BURST='1000')
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen([sys.executable, '-c', SERVE], cwd=SERVER_DIR, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            assert process.poll() is None, log_path.read_text()
+            try:
+                requests.get(base + '/', timeout=1)
+                break
+            except requests.ConnectionError:
+                assert time.monotonic() < deadline, 'server did not start'
+                time.sleep(0.2)
+        yield base, log_path
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def test_mixed_traffic_on_eventlet(app, make_user, server):
+    """DMs, group messages and REST calls at once: everything is answered and the hub never trips"""
+    base, log_path = server
+    users = [make_user(f'stress{i}') for i in range(USERS)]
+    group = Group(name='stress')
+    db.session.add(group)
+    db.session.flush()
+    db.session.execute(user_groups.insert(), [{'user_id': user_id, 'group_id': group.id} for user_id, _ in users])
+    db.session.commit()
+    group_id = group.id
+
+    failures = []
+    sent = {user_id: 0 for user_id, _ in users}
+    group_received = {user_id: 0 for user_id, _ in users}
+    lock = threading.Lock()
+
+    def chat(index):
+        user_id, headers = users[index]
+        peer_id = users[(index + 1) % USERS][0]
+        client = socketio.Client()
+
+        @client.on('message_sent')
+        def on_sent(data):
+            with lock:
+                sent[user_id] += 1
+
+        @client.on('new_group_message')
+        def on_group(data):
+            with lock:
+                group_received[user_id] += 1
+
+        @client.on('message_error')
+        def on_error(data):
+            failures.append(('message_error', user_id, data))
+
+        client.connect(base, transports=['websocket'], auth={'token': headers['Authorization'][7:]})
+        client.emit('join', {})
+        time.sleep(0.5)
+        for i in range(DIRECT_MESSAGES):
+            client.emit('send_message', {'recipient_id': peer_id, 'content': f'dm {i}'})
+            if i % (DIRECT_MESSAGES // GROUP_MESSAGES) == 0:
+                client.emit('send_group_message', {'group_id': group_id, 'content': f'group {i}'})
+            if i % 10 == 0:
+                client.emit('mark_read', {'peer_id': peer_id})
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            with lock:
+                done = (sent[user_id] == DIRECT_MESSAGES
+                        and group_received[user_id] == USERS * GROUP_MESSAGES)
+            if done:
+                break
+            time.sleep(0.1)
+        client.disconnect()
+
+    def browse(index):
+        user_id, headers = users[index]
+        peer_id = users[(index + 1) % USERS][0]
+        paths = ['/messages', '/conversations', f'/users/{peer_id}/messages', '/groups',
+                 f'/groups/{group_id}/messages', '/unread', '/users', f'/users/{peer_id}']
+        for round_ in range(5):
+            for path in paths:
+                response = requests.get(base + path, headers=headers, timeout=10)
+                if response.status_code != 200:
+                    failures.append((path, response.status_code))
+            # bcrypt goes through its own workers and the commit through the blocking pool
+            response = requests.post(base + '/auth/register', timeout=10, json={
+                'username': f'new{index}_{round_}', 'email': f'new{index}_{round_}@example.com',
+                'password': 'password'})
+            if response.status_code != 201:
+                failures.append(('/auth/register', response.status_code))
+
+    def run(fn, index):
+        try:
+            fn(index)
+        except Exception as e:
+            failures.append((fn.__name__, index, repr(e)))
+
+    threads = [threading.Thread(target=run, args=(chat, i)) for i in range(USERS)]
+    threads += [threading.Thread(target=run, args=(browse, i)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    assert not any(thread.is_alive() for thread in threads), 'server stopped answering'
+
+    log = log_path.read_text()
+    assert 'Cannot switch' not in log
+    assert 'Green wait on a pool thread' not in log
+    assert 'Traceback' not in log
+    assert not failures
+    assert sent == {user_id: DIRECT_MESSAGES for user_id, _ in users}
+    assert group_received == {user_id: USERS * GROUP_MESSAGES for user_id, _ in users}
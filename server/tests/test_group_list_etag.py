@@ -0,0 +1,45 @@
+def test_every_group_change_moves_the_list_etag(client, make_user):
+    _, headers = make_user('alice')
+    _, bob_headers = make_user('bob')
+    seen = []
+
+    def etag():
+        seen.append(client.get('/groups', headers=headers).headers['ETag'])
+        return seen[-1]
+
+    etag()
+    group_id = client.post('/groups', json={'name': 'hikers'}, headers=headers).get_json()['group']['id']
+    etag()
+    # Unchanged listing, unchanged validator
+    assert etag() == seen[-2]
+    client.patch(f'/groups/{group_id}', json={'description': 'weekend walks'}, headers=headers)
+    etag()
+    client.post(f'/groups/{group_id}/members', headers=bob_headers)
+    etag()
+    client.delete(f'/groups/{group_id}/members', headers=bob_headers)
+    etag()
+    client.delete(f'/groups/{group_id}', headers=headers)
+    etag()
+
+    assert len(set(seen)) == len(seen) - 1
+    stale = client.get('/groups', headers={**headers, 'If-None-Match': seen[0]})
+    assert stale.status_code == 200
+
+
+def test_deleting_a_member_moves_the_group_etags(client, make_user):
+    _, headers = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    group_id = client.post('/groups', json={'name': 'hikers'}, headers=headers).get_json()['group']['id']
+    client.post(f'/groups/{group_id}/members', headers=headers)
+    client.post(f'/groups/{group_id}/members', headers=bob_headers)
+    list_etag = client.get('/groups', headers=headers).headers['ETag']
+    group_etag = client.get(f'/groups/{group_id}', headers=headers).headers['ETag']
+
+    assert client.delete(f'/users/{bob}', headers=bob_headers).status_code == 200
+
+    listing = client.get('/groups', headers={**headers, 'If-None-Match': list_etag})
+    assert listing.status_code == 200
+    assert listing.get_json()['groups'][0]['member_count'] == 1
+    group = client.get(f'/groups/{group_id}', headers={**headers, 'If-None-Match': group_etag})
+    assert group.status_code == 200
+    assert group.get_json()['member_count'] == 1
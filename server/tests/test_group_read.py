@@ -0,0 +1,33 @@
+from group_history import save_group_message
+
+
+def make_group(client, headers, name='devs'):
+    """A group with the caller as its only member"""
+    group_id = client.post('/groups', json={'name': name, 'description': ''}, headers=headers).get_json()['group']['id']
+    client.post(f'/groups/{group_id}/members', headers=headers)
+    return group_id
+
+
+def test_read_pointer_is_clamped_to_the_newest_message(client, make_user):
+    alice, alice_headers = make_user('alice')
+    bob, bob_headers = make_user('bob')
+    group_id = make_group(client, alice_headers)
+    client.post(f'/groups/{group_id}/members', headers=bob_headers)
+    ids = [save_group_message(alice, group_id, f'hi {i}')['id'] for i in range(3)]
+
+    response = client.post(f'/groups/{group_id}/read', headers=bob_headers, json={'message_id': 10 ** 9})
+    assert response.get_json()['last_read_message_id'] == ids[-1]
+
+    # So messages sent afterwards still count as unread
+    save_group_message(alice, group_id, 'later')
+    response = client.post(f'/groups/{group_id}/read', headers=bob_headers, json={'message_id': ids[0]})
+    assert response.get_json() == {'group_id': group_id, 'last_read_message_id': ids[-1], 'unread_count': 1}
+
+
+def test_read_pointer_rejects_bad_ids(client, make_user):
+    _, headers = make_user('alice')
+    group_id = make_group(client, headers)
+
+    for message_id in ('abc', -5, True, [1]):
+        response = client.post(f'/groups/{group_id}/read', headers=headers, json={'message_id': message_id})
+        assert response.status_code == 400
@@ -0,0 +1,86 @@
+from models import db, GroupMessage, user_groups
+from memberships import MembershipIndex
+
+
+def received(socket, event):
+    return [packet['args'][0] for packet in socket.get_received() if packet['name'] == event]
+
+
+def make_group(client, headers, name='devs'):
+    """A group with the caller as its only member"""
+    group_id = client.post('/groups', json={'name': name, 'description': ''}, headers=headers).get_json()['group']['id']
+    client.post(f'/groups/{group_id}/members', headers=headers)
+    return group_id
+
+
+def test_group_events_authorize_the_socket_user(app, client, socket_client, make_user):
+    alice, alice_headers = make_user('alice')
+    mallory, _ = make_user('mallory')
+    group_id = make_group(client, alice_headers)
+
+    socket = socket_client(mallory)
+    socket.get_received()
+    # Naming a member in the payload doesn't make the socket one
+    socket.emit('join_group', {'group_id': group_id, 'user_id': alice})
+    socket.emit('send_group_message', {'group_id': group_id, 'sender_id': alice, 'content': 'as alice'})
+    socket.emit('send_group_message', {'group_id': group_id, 'content': 'as myself'})
+
+    assert [e['error'] for e in received(socket, 'message_error')] == [
+        'Not in group', 'Cannot send as another user', 'Not in group'
+    ]
+    assert GroupMessage.query.count() == 0
+
+    alice_socket = socket_client(alice)
+    alice_socket.emit('join_group', {'group_id': group_id})
+    alice_socket.emit('send_group_message', {'group_id': group_id, 'content': 'hello'})
+    assert [m['sender_id'] for m in received(alice_socket, 'new_group_message')] == [alice]
+
+
+def test_stale_membership_is_rechecked(app, client, socket_client, make_user):
+    alice, headers = make_user('alice')
+    group_id = make_group(client, headers)
+    socket = socket_client(alice)
+    socket.emit('join_group', {'group_id': group_id})
+    socket.get_received()
+
+    # Removed by another worker: this one's index still lists the membership
+    db.session.execute(user_groups.delete().where(user_groups.c.group_id == group_id))
+    db.session.commit()
+    index = app.extensions['group_memberships']
+    assert index.is_member(alice, group_id)
+
+    index.ttl = 0
+    socket.emit('send_group_message', {'group_id': group_id, 'content': 'still here?'})
+    assert received(socket, 'message_error') == [{'error': 'Not in group', 'group_id': group_id}]
+    assert not index.is_member(alice, group_id)
+    assert GroupMessage.query.count() == 0
+
+
+def test_fresh_membership_needs_no_query(app, client, socket_client, make_user, queries):
+    alice, headers = make_user('alice')
+    group_id = make_group(client, headers)
+    socket = socket_client(alice)
+    socket.emit('join', {})
+    socket.get_received()
+
+    with queries() as statements:
+        socket.emit('join_group', {'group_id': group_id})
+    assert statements == []
+    assert received(socket, 'joined_group') == [{'group_id': group_id}]
+
+
+def test_changes_made_while_the_index_loads_are_kept():
+    index = MembershipIndex()
+
+    def loader():
+        # Committed after these rows were read, before the load finished
+        index.add(1, 20)
+        index.remove(2, 10)
+        return [(1, 10), (2, 10)]
+
+    index.set_loader(loader)
+    assert sorted(index.groups_of(1)) == [10, 20]
+    assert not index.is_member(2, 10)
+    # Once loaded, changes apply directly
+    index.add(3, 10)
+    assert index.is_member(3, 10)
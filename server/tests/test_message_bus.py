@@ -0,0 +1,147 @@
+"""Several workers in one process, relaying rooms through the message-bus managers"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+import pytest
+from flask_jwt_extended import create_access_token
+from flask_migrate import upgrade
+from app import create_app
+from models import db, User, Group, user_groups
+from metrics import room_fanout
+from message_bus import run_broker
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'not relayed in time'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """workers(url) -> two apps on one database, relaying through the message queue at url"""
+    apps = []
+
+    def build(url, count=2):
+        channel = uuid.uuid4().hex
+        for _ in range(count):
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+                'ASYNC_MODE': 'threading',
+                'SOCKETIO_MESSAGE_QUEUE': url,
+                'SOCKETIO_CHANNEL': channel,
+                'LOG_LEVEL': 'WARNING',
+                'MESSAGE_RETENTION_DAYS': 0
+            })
+            # Normally done on the first connection; starts the listener
+            server = app.extensions['socketio'].server
+            server.manager_initialized = True
+            server.manager.initialize()
+            apps.append(app)
+        with apps[0].app_context():
+            upgrade()
+        return apps[-count:]
+
+    yield build
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def broker():
+    """A message_bus broker on a fresh Unix socket; yields its unix:// URL"""
+    # Unix socket paths are short (about 100 bytes), so not under pytest's tmp_path
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'bus.sock')
+    threading.Thread(target=run_broker, args=(path,), daemon=True).start()
+    wait_until(lambda: os.path.exists(path))
+    yield f'unix://{path}'
+    os.unlink(path)
+    os.rmdir(directory)
+
+
+class Socket:
+    """A connection as the worker's manager sees it, recording what is sent to it"""
+
+    def __init__(self, app, monkeypatch, *rooms):
+        self.server = app.extensions['socketio'].server
+        self.manager = self.server.manager
+        self.eio_sid = uuid.uuid4().hex
+        self.sid = self.manager.connect(self.eio_sid, '/')
+        for room in rooms:
+            self.manager.enter_room(self.sid, '/', room)
+        self.packets = []
+        send = self.server._send_eio_packet
+
+        def record(eio_sid, packet):
+            if eio_sid == self.eio_sid:
+                self.packets.append(packet.data)
+            else:
+                send(eio_sid, packet)
+        monkeypatch.setattr(self.server, '_send_eio_packet', record)
+
+    def events(self):
+        """Names of the events delivered so far"""
+        return [data.split('"')[1] for data in self.packets]
+
+    def rooms(self):
+        return set(self.manager.get_rooms(self.sid, '/'))
+
+
+@pytest.mark.parametrize('bus', ['memory', 'unix'])
+def test_emits_reach_rooms_on_other_workers(request, workers, monkeypatch, bus):
+    url = 'memory://' if bus == 'memory' else request.getfixturevalue('broker')
+    sender, receiver = workers(url)
+    member = Socket(receiver, monkeypatch, 'group_1')
+    outsider = Socket(receiver, monkeypatch, 'group_2')
+    local = Socket(sender, monkeypatch, 'group_1')
+    # The receiver subscribes to the bus on a background thread; wait until it's listening
+    wait_until(lambda: sender.extensions['socketio'].emit('probe', to='group_1') or 'probe' in member.events())
+
+    sender.extensions['socketio'].emit('new_group_message', {'id': 1}, to='group_1')
+    wait_until(lambda: 'new_group_message' in member.events())
+
+    # Delivered once on each worker, only in the room it was sent to
+    assert [e for e in member.events() if e != 'probe'] == ['new_group_message']
+    assert [e for e in local.events() if e != 'probe'] == ['new_group_message']
+    assert outsider.events() == []
+
+
+def test_leaving_a_group_unsubscribes_sockets_on_every_worker(workers, monkeypatch):
+    api, other = workers('memory://')
+    with api.app_context():
+        alice = User(username='alice', email='alice@example.com', password_hash='x' * 60)
+        group = Group(name='hikers')
+        db.session.add_all([alice, group])
+        db.session.flush()
+        db.session.execute(user_groups.insert().values(user_id=alice.id, group_id=group.id))
+        db.session.commit()
+        alice_id, group_id = alice.id, group.id
+        token = create_access_token(identity=alice_id)
+
+    socket = Socket(other, monkeypatch, f'user_{alice_id}', f'group_{group_id}')
+    response = api.test_client().delete(f'/groups/{group_id}/members',
+                                        headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+    wait_until(lambda: f'group_{group_id}' not in socket.rooms())
+    assert f'user_{alice_id}' in socket.rooms()
+
+
+def test_fanout_is_recorded_where_the_emit_is_delivered(workers, monkeypatch):
+    sender, receiver = workers('memory://')
+    Socket(receiver, monkeypatch, 'group_1')
+    Socket(receiver, monkeypatch, 'group_1')
+    event = f'probe_{uuid.uuid4().hex}'
+
+    sender.extensions['socketio'].emit(event, {}, to='group_1')
+
+    # Recorded once, by the worker with the room's two sockets; the sender has none
+    key = (('event', event),)
+    wait_until(lambda: key in room_fanout._series)
+    series = room_fanout._series[key]
+    assert sum(series[:-1]) == 1 and series[-1] == 2
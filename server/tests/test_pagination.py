@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import pytest
+from pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    position = (datetime(2026, 3, 1, 12, 30, 15, 250000), 42)
+    assert decode_cursor(encode_cursor(*position)) == position
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor(datetime(2026, 1, 1), 1)[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def conversation(make_user, make_messages):
+    """Two users and 23 messages, several sharing a timestamp, returned oldest first"""
+    alice, headers = make_user('alice')
+    bob, _ = make_user('bob')
+    start = datetime(2026, 1, 1)
+    rows = []
+    for i in range(23):
+        sender, recipient = (alice, bob) if i % 3 else (bob, alice)
+        # Ties on timestamp must still page by id without skipping or repeating
+        rows.append((sender, recipient, f'message {i}', start + timedelta(seconds=i // 4)))
+    ids = make_messages(rows)
+    return alice, bob, headers, ids
+
+
+def get_page(client, headers, peer, **params):
+    response = client.get(f'/users/{peer}/messages', headers=headers, query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_before_walks_back_through_every_message_once(client, conversation):
+    _, peer, headers, ids = conversation
+
+    seen = []
+    page = get_page(client, headers, peer, limit=5)
+    while True:
+        page_ids = [m['id'] for m in page['messages']]
+        assert page_ids == sorted(page_ids)
+        seen = page_ids + seen
+        if not page['has_more']:
+            break
+        page = get_page(client, headers, peer, limit=5, before=page['next_cursor'])
+
+    assert seen == ids
+
+
+def test_after_walks_forward_from_a_cursor(client, conversation):
+    _, peer, headers, ids = conversation
+    oldest = get_page(client, headers, peer, limit=100)['messages'][0]
+    cursor = encode_cursor(datetime.fromisoformat(oldest['timestamp']), oldest['id'])
+
+    seen = []
+    while cursor:
+        page = get_page(client, headers, peer, limit=6, after=cursor)
+        seen.extend(m['id'] for m in page['messages'])
+        cursor = page['next_cursor']
+
+    assert seen == ids[1:]
+
+
+def test_latest_cursor_picks_up_new_messages(client, conversation, make_messages):
+    alice, peer, headers, _ = conversation
+    latest = get_page(client, headers, peer)['latest_cursor']
+
+    page = get_page(client, headers, peer, after=latest)
+    assert page['messages'] == [] and page['latest_cursor'] == latest
+
+    [new_id] = make_messages([(peer, alice, 'new', datetime(2026, 2, 1))])
+    page = get_page(client, headers, peer, after=latest)
+    assert [m['id'] for m in page['messages']] == [new_id]
+
+
+def test_bad_cursor_params(client, conversation):
+    _, peer, headers, _ = conversation
+    url = f'/users/{peer}/messages'
+    assert client.get(url, headers=headers, query_string={'before': 'junk'}).status_code == 400
+    assert client.get(url, headers=headers, query_string={'before': 'a', 'after': 'b'}).status_code == 400
+
+
+def test_conversation_list_pages_with_a_cursor(client, make_user, make_messages):
+    me, headers = make_user('me')
+    start = datetime(2026, 1, 1)
+    peers = [make_user(f'peer{i}')[0] for i in range(7)]
+    # Two conversations share a last_message_at, so the peer id has to break the tie
+    make_messages([(peer, me, 'hi', start + timedelta(minutes=min(i, 5))) for i, peer in enumerate(peers)])
+
+    seen, cursor = [], None
+    while True:
+        params = {'limit': 2, **({'before': cursor} if cursor else {})}
+        page = client.get('/conversations', headers=headers, query_string=params).get_json()
+        seen += [c['user']['id'] for c in page['conversations']]
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            break
+        cursor = page['next_cursor']
+
+    assert seen == [peers[6], peers[5], peers[4], peers[3], peers[2], peers[1], peers[0]]
+    assert client.get('/conversations?before=junk', headers=headers).status_code == 400
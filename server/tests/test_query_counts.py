@@ -0,0 +1,103 @@
+"""The list and conversation endpoints must cost the same number of queries however much data they return"""
+from datetime import datetime, timedelta
+from itertools import count as counter
+import pytest
+
+
+@pytest.fixture
+def inbox(make_user, make_messages):
+    """inbox(peers, per_peer) -> auth headers of a user with that many conversations"""
+    inboxes = counter()
+
+    def build(peers, per_peer):
+        n = next(inboxes)
+        me, headers = make_user(f'me{n}')
+        start = datetime(2026, 1, 1)
+        rows = []
+        for p in range(peers):
+            peer, _ = make_user(f'peer{n}_{p}')
+            for i in range(per_peer):
+                sender, recipient = (me, peer) if i % 2 else (peer, me)
+                rows.append((sender, recipient, f'message {i}', start + timedelta(minutes=len(rows))))
+        make_messages(rows)
+        return me, headers, peer
+    return build
+
+
+def count(client, queries, url, headers):
+    # Warm the profile cache so only the endpoint's own queries are counted
+    client.get('/unread', headers=headers)
+    with queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('url, expected', [
+    # The messages themselves, and the archive catalog
+    ('/messages', 2),
+    ('/conversations', 1)
+])
+def test_list_endpoints_use_fixed_queries(client, queries, inbox, url, expected):
+    _, small, _ = inbox(peers=2, per_peer=3)
+    _, large, _ = inbox(peers=15, per_peer=12)
+
+    assert count(client, queries, url, small) == expected
+    assert count(client, queries, url, large) == expected
+
+
+@pytest.mark.parametrize('url', ['/groups', '/groups?search=club', '/groups?mode=index&search=club'])
+def test_group_list_uses_fixed_queries(client, queries, make_user, url):
+    _, headers = make_user('owner')
+    members = [make_user(f'member{i}')[1] for i in range(8)]
+
+    def add_groups(groups, size):
+        for _ in range(groups):
+            group_id = client.post('/groups', json={'name': f'club {next(numbers)}'}, headers=headers).get_json()['group']['id']
+            for member in members[:size]:
+                client.post(f'/groups/{group_id}/members', headers=member)
+        # Fill the directory index now, not inside the counted request
+        client.get('/groups?mode=index&search=club', headers=headers)
+
+    numbers = counter()
+    add_groups(2, 1)
+    small = count(client, queries, url, headers)
+    add_groups(20, 8)
+    large = count(client, queries, url, headers)
+    # The list version for the ETag, then every group with its member count in one query
+    assert small == large == 2
+
+
+def test_conversation_page_uses_fixed_queries(client, queries, inbox):
+    _, small, small_peer = inbox(peers=1, per_peer=4)
+    _, large, large_peer = inbox(peers=1, per_peer=150)
+
+    small_count = count(client, queries, f'/users/{small_peer}/messages', small)
+    large_count = count(client, queries, f'/users/{large_peer}/messages?limit=100', large)
+    # Peer profile, summary for the ETag, one range scan per direction, archive boundary
+    assert small_count == large_count == 5
+
+
+def test_conversation_revalidation_is_one_query(client, queries, inbox):
+    _, headers, peer = inbox(peers=1, per_peer=20)
+    url = f'/users/{peer}/messages'
+    etag = client.get(url, headers=headers).headers['ETag']
+
+    with queries() as statements:
+        response = client.get(url, headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert len(statements) == 1
+
+
+def test_group_list_revalidation_reads_one_row(client, queries, make_user):
+    _, headers = make_user('alice')
+    for i in range(5):
+        client.post('/groups', json={'name': f'group {i}'}, headers=headers)
+    etag = client.get('/groups', headers=headers).headers['ETag']
+
+    with queries() as statements:
+        response = client.get('/groups', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    # Neither the groups nor the memberships table is scanned to validate
+    assert len(statements) == 1
+    assert 'list_versions' in statements[0] and 'user_groups' not in statements[0]
@@ -0,0 +1,75 @@
+from datetime import datetime
+from models import db, ConversationSummary, User
+
+
+def received(socket, event):
+    return [packet['args'][0] for packet in socket.get_received() if packet['name'] == event]
+
+
+def unread(user_id, peer_id):
+    db.session.expire_all()
+    return db.session.get(ConversationSummary, (user_id, peer_id)).unread_count
+
+
+def test_mark_read_acts_as_the_socket_user(app, socket_client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    mallory, _ = make_user('mallory')
+    make_messages([(alice, bob, f'hi {i}', datetime.utcnow()) for i in range(3)])
+
+    socket = socket_client(mallory)
+    socket.emit('mark_read', {'user_id': bob, 'peer_id': alice})
+    app.extensions['read_receipts'].flush()
+    assert unread(bob, alice) == 3
+
+    socket = socket_client(bob)
+    socket.emit('mark_read', {'peer_id': alice})
+    app.extensions['read_receipts'].flush()
+    assert unread(bob, alice) == 0
+    assert db.session.get(User, bob).unread_count == 0
+
+
+def test_bad_up_to_id_is_rejected_at_the_handler(app, socket_client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    carol, _ = make_user('carol')
+    ids = make_messages([(alice, bob, 'one', datetime.utcnow()), (alice, carol, 'two', datetime.utcnow())])
+
+    bob_socket = socket_client(bob)
+    carol_socket = socket_client(carol)
+    for bad in ('abc', [1], 1.5, -3):
+        bob_socket.emit('mark_read', {'peer_id': alice, 'up_to_id': bad})
+    carol_socket.emit('mark_read', {'peer_id': alice, 'up_to_id': str(ids[1])})
+    app.extensions['read_receipts'].flush()
+
+    assert received(bob_socket, 'message_error') == [{'error': 'Invalid up_to_id'}] * 4
+    assert unread(bob, alice) == 1
+    assert unread(carol, alice) == 0
+
+
+def test_one_failing_receipt_doesnt_drop_the_rest(app, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    carol, _ = make_user('carol')
+    make_messages([(alice, bob, 'one', datetime.utcnow()), (alice, carol, 'two', datetime.utcnow())])
+
+    receipts = app.extensions['read_receipts']
+    # Past the handler's checks, a value the write can't use
+    receipts.submit(bob, alice, 'abc')
+    receipts.submit(carol, alice)
+    receipts.flush()
+
+    assert unread(bob, alice) == 1
+    assert unread(carol, alice) == 0
+
+
+def test_rest_mark_read_validates_up_to_id(client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, headers = make_user('bob')
+    ids = make_messages([(alice, bob, f'hi {i}', datetime.utcnow()) for i in range(3)])
+
+    response = client.post(f'/users/{alice}/messages/read', json={'up_to_id': 'abc'}, headers=headers)
+    assert response.status_code == 400
+
+    response = client.post(f'/users/{alice}/messages/read', json={'up_to_id': ids[1]}, headers=headers)
+    assert response.get_json() == {'user_id': alice, 'last_read_message_id': ids[1], 'unread_count': 1}
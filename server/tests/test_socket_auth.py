@@ -0,0 +1,108 @@
+import time
+from datetime import datetime
+from flask_jwt_extended import create_access_token, create_refresh_token
+from models import Message
+
+
+def received(socket, event):
+    return [packet['args'][0] for packet in socket.get_received() if packet['name'] == event]
+
+
+def replayed(socket, timeout=5):
+    """new_message events up to catch_up_complete; replay runs as a background task"""
+    packets = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        packets += socket.get_received()
+        if any(packet['name'] == 'catch_up_complete' for packet in packets):
+            break
+        time.sleep(0.01)
+    else:
+        raise AssertionError('replay never completed')
+    return [packet['args'][0] for packet in packets if packet['name'] == 'new_message']
+
+
+def test_connect_needs_a_valid_access_token(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+
+    assert not socket_client().is_connected()
+    assert not socket_client(auth={'token': 'not-a-token'}).is_connected()
+    assert not socket_client(auth='token').is_connected()
+    assert not socket_client(auth={'token': create_refresh_token(identity=alice)}).is_connected()
+    # Signed, but for a user that doesn't exist
+    assert not socket_client(auth={'token': create_access_token(identity=999999)}).is_connected()
+
+    socket = socket_client(alice)
+    assert socket.is_connected()
+    assert received(socket, 'connection_response')
+
+
+def test_revoked_identity_cannot_connect(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+    app.extensions['flask-jwt-extended'].revoke_identity(alice)
+    assert not socket_client(alice).is_connected()
+
+
+def test_join_ignores_the_payload_user(app, socket_client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    mallory, _ = make_user('mallory')
+    make_messages([(bob, alice, 'for alice', datetime.utcnow())])
+
+    socket = socket_client(mallory)
+    # Asks for alice's room and a replay of everything she was sent
+    socket.emit('join', {'user_id': alice, 'last_message_id': 0})
+    assert replayed(socket) == []
+
+    bob_socket = socket_client(bob)
+    bob_socket.emit('join', {})
+    bob_socket.emit('send_message', {'sender_id': bob, 'recipient_id': alice, 'content': 'secret'})
+    app.extensions['message_writer'].flush()
+
+    assert received(socket, 'new_message') == []
+    assert received(bob_socket, 'message_sent')[0]['content'] == 'secret'
+
+
+def test_join_replays_for_the_authenticated_user(app, socket_client, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    first, second = make_messages([
+        (bob, alice, 'one', datetime.utcnow()),
+        (bob, alice, 'two', datetime.utcnow())
+    ])
+
+    socket = socket_client(alice)
+    socket.emit('join', {'user_id': bob, 'last_message_id': first})
+    assert [m['id'] for m in replayed(socket)] == [second]
+
+
+def test_cannot_send_as_another_user(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    mallory, _ = make_user('mallory')
+
+    socket = socket_client(mallory)
+    socket.emit('send_message', {'sender_id': alice, 'recipient_id': bob, 'content': 'from alice, honest'})
+    app.extensions['message_writer'].flush()
+
+    assert received(socket, 'message_error') == [{'error': 'Cannot send as another user'}]
+    assert Message.query.count() == 0
+
+
+def test_join_ignores_malformed_cursors(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    socket = socket_client(alice)
+    socket.emit('join', {'last_message_id': 'abc', 'last_group_message_id': [1]})
+    bob_socket = socket_client(bob)
+    bob_socket.emit('join', {})
+
+    # Live delivery compares ids against the cursor; every message still goes out
+    writer = app.extensions['message_writer']
+    for content in ('one', 'two'):
+        bob_socket.emit('send_message', {'recipient_id': alice, 'content': content})
+        writer.flush()
+
+    assert [m['content'] for m in received(bob_socket, 'message_sent')] == ['one', 'two']
+    assert [m['content'] for m in received(socket, 'new_message')] == ['one', 'two']
+    assert not writer._pending
@@ -0,0 +1,78 @@
+import queue
+
+
+def received(socket, event):
+    return [packet['args'][0] for packet in socket.get_received() if packet['name'] == event]
+
+
+def test_rate_limit_follows_the_user_across_sockets(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    app.extensions['message_rate_limiter'].limits['send_message'] = (2, 0.01)
+
+    first = socket_client(alice)
+    for i in range(3):
+        first.emit('send_message', {'recipient_id': bob, 'content': f'hi {i}'})
+    assert len(received(first, 'rate_limited')) == 1
+
+    # A new connection doesn't come with a new bucket
+    second = socket_client(alice)
+    second.emit('send_message', {'recipient_id': bob, 'content': 'again'})
+    assert len(received(second, 'rate_limited')) == 1
+
+    other = socket_client(bob)
+    other.emit('send_message', {'recipient_id': alice, 'content': 'hello'})
+    assert received(other, 'rate_limited') == []
+
+
+class SlowSocket:
+    """Stands in for an Engine.IO socket whose client isn't reading"""
+    closed = False
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def send(self, pkt):
+        self.queue.put(pkt)
+
+    def drain(self):
+        packets = []
+        while not self.queue.empty():
+            packets.append(self.queue.get_nowait().data)
+        return packets
+
+
+def test_lagging_connection_drops_and_coalesces(app):
+    socketio = app.extensions['socketio']
+    limiter = app.extensions['outbound_limiter']
+    limiter.queue_limit = 4
+    slow = SlowSocket()
+    socketio.server.eio.sockets['slow'] = slow
+    sid = socketio.server.manager.connect('slow', '/')
+
+    for i in range(4):
+        socketio.emit('new_message', {'id': i}, to=sid)
+    # Over the limit: messages dropped, read state coalesced, errors still delivered
+    socketio.emit('messages_read', {'reader_id': 7, 'up_to_id': 1}, to=sid)
+    socketio.emit('new_message', {'id': 5}, to=sid)
+    socketio.emit('messages_read', {'reader_id': 7, 'up_to_id': 2}, to=sid)
+    socketio.emit('message_error', {'error': 'x'}, to=sid)
+
+    assert slow.queue.qsize() == 5
+    assert limiter.stats() == {'lagging': 1, 'held_packets': 1}
+
+    # Still backed up: nothing is released
+    limiter.flush()
+    assert limiter.stats()['lagging'] == 1
+
+    assert len(slow.drain()) == 5
+    limiter.flush()
+    assert slow.drain() == [
+        '2["resync",{"dropped":1}]',
+        '2["messages_read",{"reader_id":7,"up_to_id":2}]'
+    ]
+    assert limiter.stats() == {'lagging': 0, 'held_packets': 0}
+
+    socketio.emit('new_message', {'id': 6}, to=sid)
+    assert slow.drain() == ['2["new_message",{"id":6}]']
+    del socketio.server.eio.sockets['slow']
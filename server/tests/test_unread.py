@@ -0,0 +1,24 @@
+from datetime import datetime
+from models import db, Message, ConversationSummary, User
+from conversations import forget_message
+
+
+def test_deleting_an_unread_message_keeps_concurrent_counts(app, make_user, make_messages):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    first, _ = make_messages([(alice, bob, 'one', datetime.utcnow()), (alice, bob, 'two', datetime.utcnow())])
+
+    # Loaded here, then a batch insert elsewhere counts another unread message
+    summary = db.session.get(ConversationSummary, (bob, alice))
+    assert summary.unread_count == 2
+    db.session.query(ConversationSummary).filter_by(user_id=bob, peer_id=alice).update(
+        {'unread_count': ConversationSummary.unread_count + 1}, synchronize_session=False
+    )
+
+    message = db.session.get(Message, first)
+    forget_message(message)
+    db.session.delete(message)
+    db.session.commit()
+
+    assert db.session.get(ConversationSummary, (bob, alice)).unread_count == 2
+    assert db.session.get(User, bob).unread_count == 1
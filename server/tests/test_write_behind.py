@@ -0,0 +1,160 @@
+import time
+from models import db, Message, ConversationSummary, User
+
+
+def received(socket, event):
+    return [packet['args'][0] for packet in socket.get_received() if packet['name'] == event]
+
+
+def wait_for(socket, event, timeout=5):
+    """Events of one name, waiting for the background writer to emit at least one"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        events = received(socket, event)
+        if events:
+            return events
+        time.sleep(0.01)
+    return []
+
+
+def test_socket_messages_are_written_in_one_batch(app, socket_client, make_user, queries):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    carol, _ = make_user('carol')
+    alice_socket = socket_client(alice)
+    alice_socket.emit('join', {})
+    bob_socket = socket_client(bob)
+    bob_socket.emit('join', {})
+    alice_socket.get_received()
+    bob_socket.get_received()
+
+    for i in range(5):
+        alice_socket.emit('send_message', {'sender_id': alice, 'recipient_id': bob, 'content': f'hi {i}'})
+    alice_socket.emit('send_message', {'sender_id': alice, 'recipient_id': carol, 'content': 'hi carol'})
+
+    with queries() as statements:
+        app.extensions['message_writer'].flush()
+
+    inserts = [s for s in statements if s.startswith('INSERT INTO messages')]
+    assert len(inserts) == 1
+
+    acks = received(alice_socket, 'message_sent')
+    assert [m['content'] for m in acks] == [f'hi {i}' for i in range(5)] + ['hi carol']
+    assert [m['id'] for m in acks] == sorted(m['id'] for m in acks)
+    assert [m['id'] for m in received(bob_socket, 'new_message')] == [m['id'] for m in acks[:5]]
+
+    # Summaries and unread counters are maintained by the same batch
+    assert Message.query.count() == 6
+    assert db.session.get(ConversationSummary, (bob, alice)).unread_count == 5
+    assert db.session.get(ConversationSummary, (carol, alice)).unread_count == 1
+    assert db.session.get(User, bob).unread_count == 5
+
+
+def test_nothing_queued_writes_nothing(app, queries):
+    with queries() as statements:
+        app.extensions['message_writer'].flush()
+    assert statements == []
+
+
+def test_a_failing_row_only_fails_its_sender(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    alice_socket = socket_client(alice)
+    alice_socket.emit('join', {})
+    bob_socket = socket_client(bob)
+    bob_socket.emit('join', {})
+    alice_socket.get_received()
+    bob_socket.get_received()
+
+    writer = app.extensions['message_writer']
+    alice_socket.emit('send_message', {'sender_id': alice, 'recipient_id': bob, 'content': 'first'})
+    # Past the handler's checks, a row the database rejects (content is NOT NULL)
+    bob_sid = app.extensions['socketio'].server.manager.sid_from_eio_sid(bob_socket.eio_sid, '/')
+    writer.submit(bob, alice, None, bob_sid)
+    alice_socket.emit('send_message', {'sender_id': alice, 'recipient_id': bob, 'content': 'second'})
+    writer.flush()
+
+    assert [m['content'] for m in received(alice_socket, 'message_sent')] == ['first', 'second']
+    assert received(alice_socket, 'message_error') == []
+    errors = received(bob_socket, 'message_error')
+    assert errors == [{'error': 'Message could not be sent', 'recipient_id': alice}]
+    assert [m.content for m in Message.query.order_by(Message.id)] == ['first', 'second']
+
+
+def test_send_message_rejects_bad_payloads(app, socket_client, make_user):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    alice_socket = socket_client(alice)
+    alice_socket.emit('join', {})
+    alice_socket.get_received()
+
+    bad = [
+        {'sender_id': bob, 'recipient_id': alice, 'content': 'hi'},
+        {'sender_id': alice, 'recipient_id': 'abc', 'content': 'hi'},
+        {'sender_id': alice, 'recipient_id': [bob], 'content': 'hi'},
+        {'sender_id': alice, 'recipient_id': bob, 'content': {'text': 'hi'}},
+        {'sender_id': alice, 'recipient_id': alice, 'content': 'hi'},
+        {'sender_id': alice, 'recipient_id': 999999, 'content': 'hi'}
+    ]
+    for payload in bad:
+        alice_socket.emit('send_message', payload)
+    app.extensions['message_writer'].flush()
+
+    assert len(received(alice_socket, 'message_error')) == len(bad)
+    assert received(alice_socket, 'message_sent') == []
+    assert Message.query.count() == 0
+
+
+def test_writer_survives_a_failed_flush(app, socket_client, make_user, monkeypatch):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    alice_socket = socket_client(alice)
+    alice_socket.emit('join', {})
+    alice_socket.get_received()
+
+    # The first flush fails after its commit, on the background task rather than in the test
+    tracker = app.extensions['delivery_tracker']
+    delivered = tracker.delivered
+    calls = []
+
+    def fail_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        delivered(*args)
+
+    monkeypatch.setattr(tracker, 'delivered', fail_once)
+    writer = app.extensions['message_writer']
+    monkeypatch.setattr(writer, 'batch_size', 1)
+
+    acks = []
+    for content in ('first', 'second'):
+        alice_socket.emit('send_message', {'recipient_id': bob, 'content': content})
+        acks += wait_for(alice_socket, 'message_sent')
+
+    assert [m['content'] for m in acks] == ['first', 'second']
+    assert not writer._pending
+
+
+def test_cached_recipient_is_checked_without_the_pool(app, socket_client, make_user, monkeypatch):
+    alice, _ = make_user('alice')
+    bob, _ = make_user('bob')
+    alice_socket = socket_client(alice)
+    alice_socket.emit('join', {})
+
+    pool = app.extensions['blocking_pool']
+    run = pool.run_in_app_context
+    jobs = []
+
+    def record(fn, *args, **kwargs):
+        jobs.append(getattr(fn, '__name__', fn))
+        return run(fn, *args, **kwargs)
+
+    monkeypatch.setattr(pool, 'run_in_app_context', record)
+    cache = app.extensions['user_cache']
+    cache.clear()
+    alice_socket.emit('send_message', {'recipient_id': bob, 'content': 'miss'})
+    assert jobs == ['load']
+    alice_socket.emit('send_message', {'recipient_id': bob, 'content': 'hit'})
+    assert jobs == ['load']
+    assert cache.stats()['hits'] >= 1
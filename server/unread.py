@@ -0,0 +1,99 @@
+import logging
+from sqlalchemy import func, select
+from models import db, User, Message, ConversationSummary
+from blocking import blocking_pool
+from extensions import app_service
+
+logger = logging.getLogger(__name__)
+
+
+def adjust_unread(deltas):
+    """
+    Apply {user_id: delta} to users.unread_count, never going below zero.
+
+    Each is a single atomic UPDATE, so concurrent writers can't lose counts.
+    Runs in the caller's transaction.
+    """
+    for user_id, delta in deltas.items():
+        if not delta:
+            continue
+        User.query.filter(User.id == user_id).update(
+            {User.unread_count: func.max(User.unread_count + delta, 0)},
+            synchronize_session=False
+        )
+
+
+def reconcile_unread_counts(batch_size=500):
+    """
+    Recount unread messages from the messages table and repair any counter
+    that has drifted. Walks users in id order, committing per batch so the
+    write lock is never held for long. Returns how many counters changed.
+    """
+    repaired = 0
+    last_id = 0
+    while True:
+        user_ids = [row.id for row in db.session.query(User.id).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(batch_size)]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        actual = select(func.count(Message.id)).where(
+            Message.sender_id == ConversationSummary.peer_id,
+            Message.recipient_id == ConversationSummary.user_id,
+            Message.is_read == False
+        ).scalar_subquery()
+        repaired += ConversationSummary.query.filter(
+            ConversationSummary.user_id.in_(user_ids),
+            ConversationSummary.unread_count != actual
+        ).update({ConversationSummary.unread_count: actual}, synchronize_session=False)
+
+        total = select(func.coalesce(func.sum(ConversationSummary.unread_count), 0)).where(
+            ConversationSummary.user_id == User.id
+        ).scalar_subquery()
+        repaired += User.query.filter(
+            User.id.in_(user_ids),
+            User.unread_count != total
+        ).update({User.unread_count: total}, synchronize_session=False)
+
+        db.session.commit()
+    return repaired
+
+
+class UnreadReconciler:
+    """Runs reconcile_unread_counts in the background every UNREAD_RECONCILE_INTERVAL seconds"""
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.interval = 3600
+        self._started = False
+        if app is not None and socketio is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.extensions['unread_reconciler'] = self
+        self.interval = app.config.get('UNREAD_RECONCILE_INTERVAL', self.interval)
+
+    def start(self):
+        if self._started or not self.interval:
+            return
+        self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self.socketio.sleep(self.interval)
+                try:
+                    repaired = blocking_pool.run_in_app_context(reconcile_unread_counts)
+                    if repaired:
+                        logger.info('Unread reconciliation repaired %d counters', repaired)
+                except Exception as e:
+                    logger.error('Error reconciling unread counts: %s', e)
+
+
+unread_reconciler = app_service('unread_reconciler')
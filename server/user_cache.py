@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from models import db, User
+from blocking import os_lock
+from extensions import app_service
+
+
+class UserCache:
+    """
+    In-process LRU cache of user profiles (id -> id/username/email) with a TTL.
+
+    Entries are dropped explicitly when a profile changes or is deleted; the
+    TTL only bounds staleness for changes made by other processes.
+    """
+
+    def __init__(self, app=None, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = os_lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['user_cache'] = self
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+
+    def get(self, user_id):
+        """Profile dict for user_id, or None if there's no such user"""
+        profile = self.cached(user_id)
+        if profile is not None:
+            return profile
+        return self.load(user_id)
+
+    def cached(self, user_id):
+        """The cached profile for user_id, or None on a miss; never queries"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+        return None
+
+    def load(self, user_id):
+        """Read user_id's profile from the database and cache it (None if there's no such user)"""
+        with self._lock:
+            self.misses += 1
+
+        row = db.session.query(User.id, User.username, User.email).filter(User.id == user_id).first()
+        if not row:
+            return None
+
+        profile = {'id': row.id, 'username': row.username, 'email': row.email}
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return profile
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+user_cache = app_service('user_cache')
@@ -0,0 +1,144 @@
+import atexit
+import logging
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import insert
+from models import db, Message
+from conversations import record_messages
+from blocking import blocking_pool, os_lock
+from delivery import delivery_tracker
+from extensions import app_service
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Write-behind queue for direct messages coming in over the socket.
+
+    Handlers call submit() and return straight away. A background task drains
+    the queue every `flush_interval_ms` (or as soon as `batch_size` messages
+    are waiting), inserts the whole batch in a single transaction, and only
+    then emits `new_message` / `message_sent` with the real ids. If the batch
+    insert fails its messages are retried one at a time, so one bad row only
+    fails its own sender.
+    """
+
+    def __init__(self, app=None, socketio=None):
+        self.app = None
+        self.socketio = None
+        self.batch_size = 100
+        self.flush_interval = 0.02
+        self._pending = []
+        self._lock = os_lock()
+        self._wakeup = None
+        self._worker_started = False
+        if app is not None and socketio is not None:
+            self.init_app(app, socketio)
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        app.extensions['message_writer'] = self
+        self.batch_size = app.config.get('MESSAGE_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('MESSAGE_BATCH_INTERVAL_MS', 20) / 1000.0
+        # An event from the server's async mode, so waiting on it never blocks the event loop
+        self._wakeup = socketio.server.eio.create_event()
+        atexit.register(self._flush_at_exit)
+
+    def submit(self, sender_id, recipient_id, content, sid):
+        """Queue a message; the sender's socket `sid` gets the ack once it's committed"""
+        # Stamped now, so the timestamp is when it was sent, not when the batch was written
+        timestamp = datetime.utcnow()
+        with self._lock:
+            self._pending.append((sender_id, recipient_id, content, timestamp, sid))
+            full = len(self._pending) >= self.batch_size
+            start = not self._worker_started
+            self._worker_started = True
+        if start:
+            self.socketio.start_background_task(self._run)
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    # Keep draining: one failed flush mustn't stall every later message
+                    logger.exception('Error flushing queued messages')
+
+    def _flush_at_exit(self):
+        with self.app.app_context():
+            self.flush()
+
+    def flush(self):
+        """Write out everything queued so far and notify both ends of each message"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        try:
+            # The insert and commit run on the blocking pool, off the event loop
+            saved = blocking_pool.run_in_app_context(self._write, batch)
+        except Exception as e:
+            logger.warning('Batch of %d messages failed (%s), writing them one by one', len(batch), e)
+            saved = [self._write_one(message) for message in batch]
+
+        for message_data, (_, recipient_id, _, _, sid) in zip(saved, batch):
+            if message_data is None:
+                # Only the sender of the failed message hears about it, and never the database error
+                self.socketio.emit('message_error', {'error': 'Message could not be sent',
+                                                     'recipient_id': recipient_id}, to=sid)
+                continue
+            self.socketio.emit('new_message', message_data, room=f'user_{message_data["recipient_id"]}')
+            self.socketio.emit('message_sent', message_data, to=sid)
+            delivery_tracker.delivered(message_data['recipient_id'], message_data['id'])
+
+    def _write_one(self, message):
+        try:
+            return blocking_pool.run_in_app_context(self._write, [message])[0]
+        except Exception:
+            logger.exception('Error writing message from user %s to user %s', message[0], message[1])
+            return None
+
+    def _write(self, batch):
+        table = Message.__table__
+        try:
+            # A Core executemany is one multi-row INSERT ... RETURNING for the whole batch
+            # (the ORM's add_all + flush falls back to a statement per row on SQLite)
+            rows = db.session.execute(
+                insert(table).returning(table.c.id, table.c.sender_id, table.c.recipient_id,
+                                        table.c.content, table.c.timestamp),
+                [{'sender_id': sender_id, 'recipient_id': recipient_id, 'content': content,
+                  'timestamp': timestamp, 'is_read': False}
+                 for sender_id, recipient_id, content, timestamp, _ in batch]
+            ).all()
+            record_messages(rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # RETURNING order isn't guaranteed, so rows are matched back to the batch by value;
+        # rows that agree on every column are interchangeable
+        by_value = defaultdict(list)
+        for row in sorted(rows, key=lambda row: row.id, reverse=True):
+            by_value[(row.sender_id, row.recipient_id, row.content, row.timestamp)].append(row)
+        saved = [by_value[(sender_id, recipient_id, content, timestamp)].pop()
+                 for sender_id, recipient_id, content, timestamp, _ in batch]
+
+        return [{
+            'id': row.id,
+            'sender_id': row.sender_id,
+            'recipient_id': row.recipient_id,
+            'content': row.content,
+            'timestamp': row.timestamp.isoformat()
+        } for row in saved]
+
+
+message_writer = app_service('message_writer')